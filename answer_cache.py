@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import re
+
+from cache import TTLCache
+from lorebook_index import fold_text
+
+_WORD_RE = re.compile(r"\w+")
+# Artigos, preposições e o verbo de ligação: as únicas palavras que uma pergunta quase igual
+# pode ter ou não ter. Interrogativas, negação e o resto precisam ser as mesmas.
+FILLER_WORDS = set("""
+o a os as um uma uns umas e eh de do da dos das em no na nos nas pra para pro ao aos
+""".split())
+
+def normalize_question(question: str) -> str:
+    """Forma canônica da pergunta: sem acento, caixa e pontuação ('Qual é o jogo?' -> 'qual e o jogo').
+
+    Não usa o tokenize do lorebook: ele tira palavras vazias como qual/quando/como e 'não',
+    o que faria perguntas diferentes caírem na mesma chave.
+    """
+    return " ".join(_WORD_RE.findall(fold_text(question)))
+
+def _content_words(normalized: str) -> tuple:
+    """(palavras de conteúdo, números na ordem): quase-iguais só contam se os dois baterem."""
+    words = normalized.split()
+    return frozenset(word for word in words if word not in FILLER_WORDS), tuple(word for word in words if word.isdigit())
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class AnswerCache:
+    """Cache de respostas da IA para perguntas repetidas no chat.
+
+    A chave é (versão do contexto, pergunta normalizada). A versão do contexto deve mudar
+    sempre que algo que entra no prompt mudar (canal, lorebook, memórias globais), o que
+    invalida as respostas antigas sem precisar limpar o cache. Com `similarity_threshold`,
+    perguntas quase iguais (similaridade de trigramas de caracteres) também contam como acerto,
+    desde que tenham as mesmas palavras de conteúdo e os mesmos números: a diferença só pode
+    estar em pontuação, espaços, acento, caixa ou palavras de FILLER_WORDS ('2022' != '2018',
+    'mim' != 'min').
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 300.0, similarity_threshold: float = 0.8):
+        self._cache = TTLCache(max_entries, ttl_seconds)
+        self.similarity_threshold = similarity_threshold
+
+    def get(self, question: str, context_version):
+        normalized = normalize_question(question)
+        answer = self._cache.get((context_version, normalized))
+        if answer is not None or not self.similarity_threshold: return answer
+        query_grams, query_words = _trigrams(normalized), _content_words(normalized)
+        best_score, best_answer = 0.0, None
+        for (version, cached_question), cached_answer in self._cache.items():
+            if version != context_version or _content_words(cached_question) != query_words: continue
+            grams = _trigrams(cached_question)
+            score = len(query_grams & grams) / len(query_grams | grams)
+            if score > best_score: best_score, best_answer = score, cached_answer
+        if best_score >= self.similarity_threshold:
+            self._cache.record_hit(); return best_answer
+        return None
+
+    def put(self, question: str, context_version, answer: str):
+        self._cache.set((context_version, normalize_question(question)), answer)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+# Benchmark offline (python -m bench.run --help).
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""Substitutos em processo do cliente Supabase, dos modelos do google-generativeai e do DDGS."""
+import itertools
+import json
+import random
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from bench.latency import CallCounter, LatencyModel
+
+# --- Supabase ---
+
+def _column_value(row: dict, column: str):
+    """Lê uma coluna, incluindo o atalho JSON 'metadata->>chave' usado nos filtros."""
+    if '->>' in column:
+        base, _, key = column.partition('->>')
+        value = (row.get(base) or {}).get(key)
+        return None if value is None else str(value)
+    return row.get(column)
+
+class FakeSupabaseClient:
+    """Tabelas em memória com o subconjunto do query builder do supabase-py que o bot usa.
+
+    Cada `execute()` espera uma amostra de `latency` e é contado em `counter` como
+    'db.<tabela>.<operação>'. `upsert` casa pela coluna 'id' ou, sem ela, pela primeira
+    coluna do registro (ex.: twitch_username). `max_rows` imita o limite de linhas por
+    resposta do PostgREST.
+    """
+
+    def __init__(self, tables: dict = None, latency: LatencyModel = None, counter: CallCounter = None, max_rows: int = None):
+        self.max_rows = max_rows
+        self.tables = {name: [dict(row) for row in rows] for name, rows in (tables or {}).items()}
+        self.latency = latency or LatencyModel("0")
+        self.counter = counter or CallCounter()
+        self._lock = threading.Lock()
+        self._ids = {}
+
+    def table(self, name: str):
+        return _FakeQuery(self, name)
+
+    def _next_id(self, name: str) -> int:
+        if name not in self._ids:
+            self._ids[name] = itertools.count(max((row.get('id', 0) for row in self.tables.get(name, [])), default=0) + 1)
+        return next(self._ids[name])
+
+class _FakeQuery:
+    def __init__(self, client: FakeSupabaseClient, name: str):
+        self._client, self._name = client, name
+        self._operation, self._payload = 'select', None
+        self._columns, self._count = '*', None
+        self._filters, self._order, self._limit, self._single = [], None, None, False
+
+    def select(self, columns: str = '*', count: str = None):
+        self._columns, self._count = columns, count; return self
+
+    def insert(self, payload):
+        self._operation, self._payload = 'insert', payload; return self
+
+    def update(self, payload):
+        self._operation, self._payload = 'update', payload; return self
+
+    def upsert(self, payload):
+        self._operation, self._payload = 'upsert', payload; return self
+
+    def delete(self):
+        self._operation = 'delete'; return self
+
+    def eq(self, column, value): self._filters.append(lambda row: _column_value(row, column) == value); return self
+    def in_(self, column, values): values = set(values); self._filters.append(lambda row: _column_value(row, column) in values); return self
+    def gte(self, column, value): self._filters.append(lambda row: _column_value(row, column) is not None and _column_value(row, column) >= value); return self
+    def lte(self, column, value): self._filters.append(lambda row: _column_value(row, column) is not None and _column_value(row, column) <= value); return self
+    def gt(self, column, value): self._filters.append(lambda row: _column_value(row, column) is not None and _column_value(row, column) > value); return self
+    def lt(self, column, value): self._filters.append(lambda row: _column_value(row, column) is not None and _column_value(row, column) < value); return self
+
+    def order(self, column, desc: bool = False):
+        self._order = (column, desc); return self
+
+    def limit(self, n: int):
+        self._limit = n; return self
+
+    def single(self):
+        self._single = True; return self
+
+    def _matches(self, row) -> bool:
+        return all(check(row) for check in self._filters)
+
+    def execute(self):
+        client = self._client
+        client.latency.wait()
+        client.counter.count(f"db.{self._name}.{self._operation}")
+        with client._lock:
+            rows = client.tables.setdefault(self._name, [])
+            if self._operation == 'select': return self._select(rows)
+            payload = self._payload if isinstance(self._payload, list) else [self._payload]
+            if self._operation == 'insert':
+                created = []
+                for record in payload:
+                    row = {'id': client._next_id(self._name), 'created_at': datetime.now(timezone.utc).isoformat()}
+                    row.update(record); rows.append(row); created.append(dict(row))
+                return SimpleNamespace(data=created, count=None)
+            if self._operation == 'upsert':
+                result = []
+                for record in payload:
+                    key = 'id' if 'id' in record else next(iter(record))
+                    row = next((r for r in rows if r.get(key) == record[key]), None)
+                    if row is None:
+                        row = {'id': client._next_id(self._name), 'created_at': datetime.now(timezone.utc).isoformat()}; rows.append(row)
+                    row.update(record); result.append(dict(row))
+                return SimpleNamespace(data=result, count=None)
+            matched = [row for row in rows if self._matches(row)]
+            if self._operation == 'update':
+                for row in matched: row.update(self._payload)
+            else:
+                client.tables[self._name] = [row for row in rows if not self._matches(row)]
+            return SimpleNamespace(data=[dict(row) for row in matched], count=None)
+
+    def _select(self, rows):
+        matched = [row for row in rows if self._matches(row)]
+        total = len(matched)
+        if self._order:
+            column, desc = self._order
+            matched.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+        if self._limit is not None: matched = matched[:self._limit]
+        if self._client.max_rows is not None: matched = matched[:self._client.max_rows]
+        if self._columns.strip() != '*':
+            columns = [c.strip() for c in self._columns.split(',')]
+            matched = [{c: row.get(c) for c in columns} for row in matched]
+        else:
+            matched = [dict(row) for row in matched]
+        if self._single:
+            if len(matched) != 1: raise Exception(f"JSON object requested, multiple (or no) rows returned ({len(matched)})")
+            return SimpleNamespace(data=matched[0], count=total if self._count else None)
+        return SimpleNamespace(data=matched, count=total if self._count else None)
+
+def seed_tables(lorebook_entries: int = 40, long_term_per_user: int = 2, hierarchical_per_level: int = 3, master: str = "bench_master") -> dict:
+    """Dados iniciais plausíveis para o bot subir: settings, usuários, lorebook e memórias."""
+    now = datetime.now(timezone.utc).isoformat()
+    topics = ["jogo", "música", "clima", "comida", "filme", "anime", "futebol", "programação", "viagem", "livro"]
+    lorebook = [{'id': i + 1, 'entry': f"{'[FIXO] ' if i < 2 else ''}Fato {i} sobre {topics[i % len(topics)]}: a streamer gosta de {topics[(i * 3) % len(topics)]}.",
+                 'created_by': master, 'created_at': now} for i in range(lorebook_entries)]
+    hierarchical = [{'id': i + 1, 'memory_level': level, 'summary': f"Resumo {level} {n}: o chat falou de {topics[n % len(topics)]}.", 'metadata': {}, 'created_at': now}
+                    for i, (level, n) in enumerate((level, n) for level in ("daily", "weekly", "monthly") for n in range(hierarchical_per_level))]
+    return {
+        'settings': [{'id': 1, 'personality_prompt': "Você é a AI_Yuh, uma IA divertida do chat.", 'lorebook_prompt': "Fatos que você sabe:",
+                      'interaction_model': "bench-interaction", 'archivist_model': "bench-archivist", 'temperature': 0.9,
+                      'memory_expiration_minutes': 5, 'global_buffer_max_messages': 40, 'global_buffer_max_minutes': 15}],
+        'users': [{'id': 1, 'twitch_username': master, 'permission_level': 'master'}],
+        'lorebook': lorebook,
+        'long_term_memory': [{'id': i + 1, 'username': f"asker{i // long_term_per_user}", 'summary': f"O usuário perguntou sobre {topics[i % len(topics)]}.", 'created_at': now}
+                             for i in range(50 * long_term_per_user)],
+        'hierarchical_memory': hierarchical,
+        'bot_status': [{'id': 1, 'status_value': 'Offline'}, {'id': 23, 'status_value': ''}],
+        'live_logs': [],
+    }
+
+def seed_sqlite_storage(storage, tables: dict):
+    """Grava os dados de `seed_tables` num storage.SqliteStorage novo."""
+    settings = dict(tables['settings'][0]); storage.update_settings(settings.pop('id'), settings)
+    for user in tables['users']: storage.upsert_user(user['twitch_username'], user['permission_level'])
+    for row in tables['lorebook']: storage.insert_lorebook(row['entry'], row['created_by'])
+    storage.insert_long_term_memories(tables['long_term_memory'])
+    for row in tables['hierarchical_memory']: storage.insert_hierarchical_memory(row['memory_level'], row['summary'], row['metadata'])
+    return storage
+
+class CountingStorage:
+    """Envolve um backend de storage contando cada chamada como 'db.<método>' (latência real do backend)."""
+
+    def __init__(self, storage, counter: CallCounter):
+        self._storage, self._counter = storage, counter
+        self.name = storage.name
+
+    def __getattr__(self, name):
+        method = getattr(self._storage, name)
+        def counted(*args, **kwargs):
+            self._counter.count(f"db.{name}")
+            return method(*args, **kwargs)
+        return counted
+
+# --- Gemini ---
+
+def _estimate_tokens(*texts) -> int:
+    return sum(len(str(text)) for text in texts) // 4 + 1
+
+class _FakeResponse:
+    def __init__(self, text: str, prompt_tokens: int):
+        self.text = text
+        self.parts = [text] if text else []
+        self.usage_metadata = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=_estimate_tokens(text), cached_content_token_count=0)
+
+def make_fake_model_class(latency: LatencyModel, counter: CallCounter, search_rate: float = 0.0, stream_chunks: int = 4, rng: random.Random = None):
+    """Cria uma classe com a interface de genai.GenerativeModel usada pelo bot.
+
+    A primeira resposta de um chat é `[SEARCH]...[/SEARCH]` com probabilidade `search_rate`.
+    Em stream, a latência sorteada é repartida entre `stream_chunks` pedaços (o primeiro
+    chega depois de metade dela, como um tempo até o primeiro token).
+    """
+    rng = rng or random.Random()
+
+    class FakeGenerativeModel:
+        def __init__(self, model_name: str = "fake", system_instruction: str = None, **kwargs):
+            self.model_name, self.system_instruction = model_name, system_instruction or ""
+
+        @classmethod
+        def from_cached_content(cls, cached_content, **kwargs):
+            return cls(getattr(cached_content, 'model', 'fake'))
+
+        def start_chat(self, history=None, **kwargs):
+            return _FakeChatSession(self, list(history or []))
+
+        def generate_content(self, prompt, **kwargs):
+            counter.count("llm.generate_content")
+            latency.wait()
+            if (kwargs.get('generation_config') or {}).get('response_mime_type') == "application/json":
+                conversations = str(prompt).count("### Conversa ")
+                text = json.dumps({str(i): f"Resumo simulado da conversa {i}." for i in range(1, conversations + 1)}, ensure_ascii=False)
+                return _FakeResponse(text, _estimate_tokens(self.system_instruction, prompt))
+            return _FakeResponse(f"Resumo simulado de {len(str(prompt))} caracteres: o chat conversou sobre vários assuntos.", _estimate_tokens(self.system_instruction, prompt))
+
+    class _FakeChatSession:
+        def __init__(self, model, history):
+            self.model, self.history = model, history
+
+        def send_message(self, content, stream: bool = False, **kwargs):
+            counter.count("llm.send_message")
+            first_turn = not any(turn.get('role') == 'user' and turn.get('bench_question') for turn in self.history)
+            question = content if isinstance(content, str) else " ".join(str(part)[:60] for part in content)
+            if isinstance(content, str) and first_turn and rng.random() < search_rate:
+                text = f"[SEARCH]{question[:40]}[/SEARCH]"
+            else:
+                text = f"Resposta simulada para: {question[:40]}. Uma segunda frase para testar o envio em partes! E uma terceira, só por garantia."
+            prompt_tokens = _estimate_tokens(self.model.system_instruction, *(part for turn in self.history for part in turn.get('parts', [])), question)
+            self.history += [{'role': 'user', 'parts': [question], 'bench_question': True}, {'role': 'model', 'parts': [text]}]
+            if not stream:
+                latency.wait()
+                return _FakeResponse(text, prompt_tokens)
+            return self._stream(text, prompt_tokens)
+
+        def _stream(self, text, prompt_tokens):
+            total = latency.sample_ms() / 1000.0
+            size = max(1, len(text) // stream_chunks + 1)
+            for i in range(0, len(text), size):
+                threading.Event().wait(total / 2 if i == 0 else total / 2 / stream_chunks)
+                yield _FakeResponse(text[i:i + size], prompt_tokens if i == 0 else 0)
+
+    return FakeGenerativeModel
+
+def make_fake_ddgs_class(latency: LatencyModel, counter: CallCounter):
+    class FakeDDGS:
+        def news(self, query, max_results=3):
+            counter.count("web.news"); latency.wait()
+            return [{'title': f"Notícia {i} sobre {query}", 'source': "bench", 'body': f"Conteúdo simulado {i} sobre {query}."} for i in range(max_results)]
+
+        def text(self, query, max_results=3):
+            counter.count("web.text"); latency.wait()
+            return [{'title': f"Página {i} sobre {query}", 'body': f"Texto simulado {i} sobre {query}."} for i in range(max_results)]
+    return FakeDDGS
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Servidor IRC local que imita a Twitch: aceita o login, responde PING e toca um roteiro de chat."""
+import random
+import re
+import socket
+import threading
+import time
+
+_PRIVMSG = re.compile(r"^PRIVMSG #(\S+) :(.*)$")
+
+def synthetic_chat(channels: list, rate: float, duration: float, ask_ratio: float = 0.1,
+                   raid_at: float = None, raid_size: int = 0, raid_seconds: float = 2.0, rng: random.Random = None) -> list:
+    """Roteiro (segundos desde o início, canal, usuário, texto) com chat a `rate` msgs/s.
+
+    Uma fração `ask_ratio` das mensagens é `!ask`, cada uma de um usuário único ('askerN')
+    para casar a resposta do bot. Com `raid_at`, `raid_size` mensagens extras chegam em
+    `raid_seconds` (uma raid despejando gente no chat).
+    """
+    rng = rng or random.Random()
+    words = ["kkkk", "que jogada", "oi chat", "gg", "boa noite", "alguém viu isso?", "LUL", "PogChamp", "essa música é boa", "primeira vez aqui"]
+    questions = ["qual o jogo de hoje?", "você gosta de anime?", "quem ganhou o jogo ontem?", "me conta uma piada", "qual a sua comida favorita?", "o que é um buraco negro?"]
+    times = [i / rate for i in range(int(rate * duration))]
+    if raid_at is not None and raid_size:
+        times += [raid_at + raid_seconds * i / raid_size for i in range(raid_size)]
+    script, asks = [], 0
+    for t in sorted(times):
+        channel = rng.choice(channels)
+        if rng.random() < ask_ratio:
+            script.append((t, channel, f"asker{asks}", f"!ask {rng.choice(questions)}")); asks += 1
+        else:
+            script.append((t, channel, f"viewer{rng.randrange(500)}", rng.choice(words)))
+    return script
+
+def load_replay(path: str, channels: list, rate: float) -> list:
+    """Roteiro a partir de um log gravado: linhas IRC cruas (':user!... PRIVMSG #canal :texto') ou 'usuário: texto'.
+
+    O ritmo original não é preservado; as mensagens são tocadas a `rate` msgs/s.
+    """
+    script = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            if ' PRIVMSG #' in line:
+                source, _, rest = line.partition(' PRIVMSG #')
+                channel, _, text = rest.partition(' :')
+                user = source.lstrip(':').split('!')[0]
+            else:
+                user, _, text = line.partition(': ')
+                channel = channels[0]
+            if text: script.append((len(script) / rate, channel.lower(), user.strip(), text))
+    return script
+
+class FakeTwitchServer:
+    """Aceita uma conexão por vez, faz o papel da Twitch e registra o que o bot envia.
+
+    `sent` guarda (instante, canal, usuário) das mensagens tocadas; `received` guarda
+    (instante, canal, texto) das PRIVMSG do bot. Os instantes são time.monotonic().
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((host, port)); self._server.listen()
+        self.host, self.port = self._server.getsockname()
+        self.sent, self.received = [], []
+        self.joined = set()
+        self.connected = threading.Event()
+        self._conn = None
+        self._send_lock = threading.Lock()
+        threading.Thread(target=self._accept_loop, name="fake-twitch", daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            conn, _ = self._server.accept()
+            self._conn = conn
+            threading.Thread(target=self._read_loop, args=(conn,), name="fake-twitch-reader", daemon=True).start()
+
+    def _write(self, line: str):
+        with self._send_lock: self._conn.sendall(f"{line}\r\n".encode('utf-8'))
+
+    def _read_loop(self, conn):
+        for raw in conn.makefile('rb'):
+            line = raw.decode('utf-8', errors='replace').strip()
+            if line.startswith('NICK'):
+                self._write(":tmi.twitch.tv 001 bot :Welcome, GLHF!")
+            elif line.startswith('PING'):
+                self._write(f":tmi.twitch.tv PONG{line[4:]}")
+            elif line.startswith('JOIN'):
+                self.joined.update(c.lstrip('#') for c in line[5:].split(','))
+                self.connected.set()
+            else:
+                match = _PRIVMSG.match(line)
+                if match: self.received.append((time.monotonic(), match.group(1), match.group(2)))
+
+    def wait_joined(self, channels: list, timeout: float = 30.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if set(channels) <= self.joined: return True
+            time.sleep(0.05)
+        return False
+
+    def say(self, channel: str, user: str, text: str):
+        self._write(f":{user}!{user}@{user}.tmi.twitch.tv PRIVMSG #{channel} :{text}")
+        self.sent.append((time.monotonic(), channel, user))
+
+    def play(self, script: list):
+        """Toca o roteiro respeitando os instantes (bloqueia até a última mensagem)."""
+        started = time.monotonic()
+        for offset, channel, user, text in script:
+            delay = started + offset - time.monotonic()
+            if delay > 0: time.sleep(delay)
+            self.say(channel, user, text)
+        return time.monotonic() - started
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import math
+import random
+import threading
+import time
+from collections import Counter
+
+class LatencyModel:
+    """Distribuição de latência (em ms) descrita por texto, para injetar nos serviços falsos.
+
+    Formatos: "0" (sem espera), "const:40", "uniform:20,80", "lognormal:40,0.6"
+    (mediana em ms e sigma) e "lognormal:40,0.6,2000" (com teto em ms).
+    """
+
+    def __init__(self, spec: str = "0", rng: random.Random = None):
+        self.spec = spec
+        self._rng = rng or random.Random()
+        kind, _, args = spec.partition(':')
+        self._kind = kind if args else "const"
+        self._args = [float(a) for a in (args or kind).split(',')]
+        if self._kind not in ("const", "uniform", "lognormal"): raise ValueError(f"Distribuição de latência desconhecida: {spec}")
+
+    def sample_ms(self) -> float:
+        if self._kind == "const": return self._args[0]
+        if self._kind == "uniform": return self._rng.uniform(self._args[0], self._args[1])
+        value = self._rng.lognormvariate(math.log(max(self._args[0], 0.001)), self._args[1])
+        return min(value, self._args[2]) if len(self._args) > 2 else value
+
+    def wait(self) -> float:
+        """Dorme uma amostra da distribuição e retorna quanto dormiu (s)."""
+        seconds = self.sample_ms() / 1000.0
+        if seconds > 0: time.sleep(seconds)
+        return seconds
+
+    def __repr__(self):
+        return f"LatencyModel({self.spec!r})"
+
+class CallCounter:
+    """Contador thread-safe de chamadas aos serviços falsos ('db.lorebook.select', 'llm.send_message', ...)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def count(self, key: str, amount: int = 1):
+        with self._lock: self._counts[key] += amount
+
+    def snapshot(self) -> Counter:
+        with self._lock: return Counter(self._counts)
+
+    def total(self, prefix: str) -> int:
+        with self._lock: return sum(value for key, value in self._counts.items() if key.startswith(prefix))
+
+def percentile(values: list, q: float) -> float:
+    """Percentil por interpolação linear (q entre 0 e 100)."""
+    if not values: return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
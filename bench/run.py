@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Benchmark offline do bot: Twitch, Gemini, DDGS e Supabase falsos, caminho real do main_bot.
+
+Uso (na raiz do repositório):
+    python -m bench.run --rate 10 --duration 30 --ask-ratio 0.2 --llm-latency lognormal:800,0.4
+    python -m bench.run --raid-at 10 --raid-size 300 --rate-profile normal
+    python -m bench.run --replay chat.log --rate 20 --json
+
+Mede mensagens/s processadas pelo loop de leitura, latência ponta a ponta do !ask (da
+mensagem enviada à primeira resposta do bot com @usuário) e chamadas ao banco/IA por mensagem.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from bench.fake_services import CountingStorage, FakeSupabaseClient, make_fake_ddgs_class, make_fake_model_class, seed_sqlite_storage, seed_tables
+from bench.fake_twitch import FakeTwitchServer, load_replay, synthetic_chat
+from bench.latency import CallCounter, LatencyModel, percentile
+
+MASTER = "bench_master"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline do AI_Yuh.")
+    parser.add_argument("--channels", default="bench_a", help="canais separados por vírgula")
+    parser.add_argument("--rate", type=float, default=5.0, help="mensagens por segundo no chat")
+    parser.add_argument("--duration", type=float, default=20.0, help="duração do chat sintético (s)")
+    parser.add_argument("--ask-ratio", type=float, default=0.2, help="fração das mensagens que são !ask")
+    parser.add_argument("--raid-at", type=float, default=None, help="instante (s) da raid")
+    parser.add_argument("--raid-size", type=int, default=0, help="mensagens extras na raid")
+    parser.add_argument("--raid-seconds", type=float, default=2.0, help="duração da raid (s)")
+    parser.add_argument("--replay", default=None, help="arquivo de chat gravado para tocar em vez do sintético")
+    parser.add_argument("--storage", default="supabase", choices=["supabase", "sqlite"], help="Supabase falso em memória ou SQLite real em arquivo temporário")
+    parser.add_argument("--db-latency", default="lognormal:40,0.5,1000", help="latência de cada chamada ao Supabase (ms)")
+    parser.add_argument("--llm-latency", default="lognormal:800,0.4,8000", help="latência de cada chamada ao Gemini (ms)")
+    parser.add_argument("--web-latency", default="lognormal:500,0.5,5000", help="latência de cada busca DDGS (ms)")
+    parser.add_argument("--search-rate", type=float, default=0.1, help="probabilidade de a IA pedir [SEARCH]")
+    parser.add_argument("--rate-profile", default="unlimited", choices=["normal", "mod", "unlimited"], help="limite de envio da fila de saída")
+    parser.add_argument("--stream", action="store_true", help="ativa STREAM_RESPONSES")
+    parser.add_argument("--drain", type=float, default=30.0, help="espera máxima (s) pelas respostas depois do chat")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", action="store_true", help="imprime o relatório em JSON")
+    return parser.parse_args(argv)
+
+def prepare_environment(args, server: FakeTwitchServer):
+    """Variáveis lidas na importação dos módulos do bot; credenciais vazias impedem o uso de serviços reais."""
+    os.environ.update({
+        'TTV_CHANNELS': args.channels, 'TTV_IRC_HOST': server.host, 'TTV_IRC_PORT': str(server.port), 'TTV_IRC_TLS': 'false',
+        'TTV_TOKEN': 'oauth:bench', 'BOT_NICK': 'ai_yuh', 'METRICS_PORT': '0', 'BOT_STATUS_SOCKET': '', 'TOOL_CACHE_DB': '',
+        'SUPABASE_URL': '', 'SUPABASE_KEY': '', 'GEMINI_API_KEY': 'bench', 'STORAGE_BACKEND': 'supabase',
+        'STREAM_RESPONSES': 'true' if args.stream else 'false',
+    })
+
+def install_fakes(args, counter: CallCounter, rng: random.Random):
+    import google.generativeai as genai
+    import database_handler
+    import gemini_handler
+    import outbound_queue
+    from storage import SqliteStorage, SupabaseStorage
+    if args.storage == "sqlite":
+        database_handler.storage = CountingStorage(seed_sqlite_storage(SqliteStorage(os.path.join(tempfile.mkdtemp(prefix="ai_yuh_bench_"), "bench.db")), seed_tables(master=MASTER)), counter)
+    else:
+        database_handler.storage = SupabaseStorage(FakeSupabaseClient(seed_tables(master=MASTER), LatencyModel(args.db_latency, rng), counter))
+    database_handler.DB_ENABLED = True
+    genai.GenerativeModel = make_fake_model_class(LatencyModel(args.llm_latency, rng), counter, args.search_rate, rng=rng)
+    gemini_handler.DDGS = make_fake_ddgs_class(LatencyModel(args.web_latency, rng), counter)
+    gemini_handler.GEMINI_ENABLED = True
+    outbound_queue.RATE_LIMITS['unlimited'] = {'messages': 1_000_000, 'per_seconds': 1.0, 'min_interval': 0.0}
+
+def wait_for(predicate, timeout: float, interval: float = 0.05) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate(): return True
+        time.sleep(interval)
+    return predicate()
+
+def processed_count(metrics) -> int:
+    return sum(h['count'] for h in metrics.registry.snapshot()['histograms'] if h['name'] == 'stage_seconds' and h['labels'].get('stage') == 'process_message')
+
+def ask_latencies(server: FakeTwitchServer) -> tuple[list, int]:
+    """Casa cada !ask (usuário askerN) com a primeira resposta do bot que menciona @askerN."""
+    sent = {(channel, user): t for t, channel, user in server.sent if user.startswith("asker")}
+    answered = {}
+    for t, channel, text in list(server.received):
+        for (ask_channel, user), sent_at in sent.items():
+            if ask_channel == channel and (channel, user) not in answered and f"@{user} " in text and t >= sent_at:
+                answered[(channel, user)] = t - sent_at
+    return list(answered.values()), len(sent)
+
+def run(args) -> dict:
+    rng = random.Random(args.seed)
+    channels = [c.strip().lower() for c in args.channels.split(',') if c.strip()]
+    server = FakeTwitchServer()
+    prepare_environment(args, server)
+    counter = CallCounter()
+    install_fakes(args, counter, rng)
+    import main_bot
+    import metrics
+    main_bot.CHAT_RATE_PROFILE = args.rate_profile
+    threading.Thread(target=main_bot.main, name="bench-bot", daemon=True).start()
+    if not server.wait_joined(channels): raise RuntimeError("O bot não entrou nos canais do servidor falso.")
+
+    for channel in channels: server.say(channel, MASTER, "!awake")
+    if not wait_for(lambda: all(ctx.state == 'AWAKE' for ctx in main_bot.CHANNELS.values()), 10):
+        raise RuntimeError("O bot não acordou com !awake.")
+
+    script = load_replay(args.replay, channels, args.rate) if args.replay else synthetic_chat(
+        channels, args.rate, args.duration, args.ask_ratio, args.raid_at, args.raid_size, args.raid_seconds, rng)
+    baseline_calls, baseline_processed = counter.snapshot(), processed_count(metrics)
+    started = time.monotonic()
+    server.sent.clear(); server.received.clear()
+    play_seconds = server.play(script)
+
+    target = baseline_processed + len(script)
+    wait_for(lambda: processed_count(metrics) >= target, args.drain)
+    processing_seconds = time.monotonic() - started
+    processed = processed_count(metrics) - baseline_processed
+    wait_for(lambda: len(ask_latencies(server)[0]) >= sum(1 for _, _, user in server.sent if user.startswith("asker")), args.drain, interval=0.25)
+    latencies, asks = ask_latencies(server)
+
+    calls = counter.snapshot(); calls.subtract(baseline_calls)
+    calls = {key: value for key, value in sorted(calls.items()) if value}
+    db_calls = sum(v for k, v in calls.items() if k.startswith("db."))
+    llm_calls = sum(v for k, v in calls.items() if k.startswith("llm."))
+    stages = {h['labels'].get('stage'): {'count': h['count'], 'p50': h['p50'], 'p95': h['p95']}
+              for h in metrics.registry.snapshot()['histograms'] if h['name'] == 'stage_seconds'}
+    return {
+        'messages': len(script), 'processed': processed, 'play_seconds': round(play_seconds, 2),
+        'processed_per_second': round(processed / processing_seconds, 2) if processing_seconds else 0.0,
+        'asks': asks, 'answered': len(latencies),
+        'ask_latency_seconds': {'p50': round(percentile(latencies, 50), 3), 'p95': round(percentile(latencies, 95), 3),
+                                'p99': round(percentile(latencies, 99), 3), 'max': round(max(latencies, default=0.0), 3)},
+        'db_calls_per_message': round(db_calls / len(script), 3) if script else 0.0,
+        'llm_calls_per_ask': round(llm_calls / asks, 3) if asks else 0.0,
+        'bot_messages': len(server.received),
+        'calls': calls, 'stages': stages,
+    }
+
+def print_report(report: dict):
+    latency = report['ask_latency_seconds']
+    print(f"Mensagens: {report['messages']} tocadas em {report['play_seconds']}s | processadas: {report['processed']} ({report['processed_per_second']} msgs/s)")
+    print(f"!ask: {report['answered']}/{report['asks']} respondidos | latência p50 {latency['p50']}s, p95 {latency['p95']}s, p99 {latency['p99']}s, máx {latency['max']}s")
+    print(f"Chamadas ao banco por mensagem: {report['db_calls_per_message']} | chamadas à IA por !ask: {report['llm_calls_per_ask']} | mensagens do bot: {report['bot_messages']}")
+    print("Chamadas por tipo:")
+    for key, value in report['calls'].items(): print(f"  {key}: {value}")
+    print("Etapas do bot (p50 / p95, s):")
+    for stage, info in sorted(report['stages'].items()): print(f"  {stage}: {info['p50']} / {info['p95']} ({info['count']} amostras)")
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    if args.json: print(json.dumps(report, ensure_ascii=False, indent=2))
+    else: print_report(report)
+    sys.stdout.flush()
+    os._exit(0)  # o bot roda em threads que não terminam sozinhas
+
+if __name__ == "__main__":
+    main()
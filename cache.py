@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+_MISSING = object()
+
+class TTLCache:
+    """Cache LRU em memória com expiração por TTL e contadores de acerto/erro (thread-safe)."""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] < time.monotonic():
+                del self._data[key]; self._stats["expirations"] += 1
+                entry = _MISSING
+            if entry is _MISSING:
+                self._stats["misses"] += 1; return default
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def set(self, key, value, ttl_seconds: float = None):
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False); self._stats["evictions"] += 1
+
+    def items(self) -> list:
+        """Cópia dos pares (chave, valor) ainda válidos, do menos para o mais recente."""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value) for key, (expires_at, value) in self._data.items() if expires_at >= now]
+
+    def record_hit(self):
+        """Contabiliza um acerto obtido fora de `get` (ex.: busca por similaridade)."""
+        with self._lock:
+            self._stats["hits"] += 1; self._stats["misses"] -= 1
+
+    def clear(self):
+        with self._lock: self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(self._stats, size=len(self._data), hit_rate=round(self._stats["hits"] / lookups, 3) if lookups else 0.0)
+
+class SqliteCacheTier:
+    """Camada opcional em disco (SQLite, valores comprimidos com zlib) que sobrevive a reinícios."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS cache (namespace TEXT, key TEXT, expires_at REAL, value BLOB, PRIMARY KEY (namespace, key))")
+            self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+    def get(self, namespace: str, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires_at >= ?", (namespace, key, time.time())).fetchone()
+        return zlib.decompress(row[0]).decode('utf-8') if row else None
+
+    def set(self, namespace: str, key: str, value: str, ttl_seconds: float):
+        blob = zlib.compress(value.encode('utf-8'))
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", (namespace, key, time.time() + ttl_seconds, blob))
+
+class SingleFlight:
+    """Garante que chamadas concorrentes com a mesma chave executem a função uma única vez."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # chave -> (evento, [resultado, exceção])
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader: call = self._calls[key] = (threading.Event(), [None, None])
+        event, outcome = call
+        if not leader:
+            event.wait()
+        else:
+            try: outcome[0] = fn()
+            except Exception as e: outcome[1] = e
+            finally:
+                with self._lock: self._calls.pop(key, None)
+                event.set()
+        if outcome[1] is not None: raise outcome[1]
+        return outcome[0]
+
+class ToolResultCache:
+    """Cache de resultados de ferramentas: memória (LRU/TTL) -> disco opcional -> busca única por chave."""
+
+    def __init__(self, namespace: str, ttl_seconds: float, max_entries: int = 256, disk_tier: SqliteCacheTier = None):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self._memory = TTLCache(max_entries, ttl_seconds)
+        self._disk = disk_tier
+        self._flight = SingleFlight()
+
+    def get_or_compute(self, key: str, compute, should_cache=lambda value: True):
+        """Retorna (valor, veio_do_cache). `compute()` só roda se a chave não estiver em cache."""
+        value = self._memory.get(key)
+        if value is not None: return value, True
+        if self._disk is not None:
+            value = self._disk.get(self.namespace, key)
+            if value is not None:
+                self._memory.set(key, value); self._memory.record_hit()
+                return value, True
+
+        def compute_and_store():
+            result = compute()
+            if result is not None and should_cache(result):
+                self._memory.set(key, result)
+                if self._disk is not None: self._disk.set(self.namespace, key, result, self.ttl_seconds)
+            return result
+        return self._flight.do(key, compute_and_store), False
+
+    def stats(self) -> dict:
+        return self._memory.stats()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from expiry_heap import ExpiryHeap
+
+# Valores usados quando as settings (globais ou do canal) não definem o parâmetro.
+DEFAULT_GLOBAL_BUFFER_MAX_MESSAGES = 40
+DEFAULT_GLOBAL_BUFFER_MAX_MINUTES = 15
+DEFAULT_MEMORY_EXPIRATION_MINUTES = 5
+
+class ChannelContext:
+    """Estado de um canal da Twitch atendido pelo bot.
+
+    Guarda tudo o que antes era global em main_bot (estado AWAKE/ASLEEP, memória de curto
+    prazo, buffer do chat, instantes das últimas tarefas periódicas) e as settings efetivas
+    do canal: as settings globais com as sobrescritas de `settings['channel_settings'][canal]`.
+    Clientes de IA e banco, o pool de perguntas e a fila de saída continuam compartilhados.
+    """
+
+    def __init__(self, name: str, base_settings: dict, memory_scope: str = None):
+        self.name = name.lower()
+        # Em modo multi-canal as memórias globais são marcadas/filtradas pelo canal;
+        # com um único canal fica None e os dados existentes continuam valendo.
+        self.memory_scope = memory_scope
+        self.state = 'ASLEEP'
+        self.short_term_memory = {}
+        self.short_term_memory_lock = threading.Lock()
+        # Prazo (time.monotonic) de cada usuário da memória de curto prazo; protegido pelo mesmo lock.
+        self.short_term_expiry = ExpiryHeap()
+        self.global_chat_buffer = []
+        self.last_global_summary = time.time()
+        self.update_settings(base_settings)
+
+    def update_settings(self, base_settings: dict):
+        overrides = (base_settings.get('channel_settings') or {}).get(self.name, {})
+        self.settings = dict(base_settings, **overrides)
+
+    @property
+    def global_buffer_max_messages(self) -> int:
+        return int(self.settings.get('global_buffer_max_messages') or DEFAULT_GLOBAL_BUFFER_MAX_MESSAGES)
+
+    @property
+    def global_buffer_max_minutes(self) -> int:
+        return int(self.settings.get('global_buffer_max_minutes') or DEFAULT_GLOBAL_BUFFER_MAX_MINUTES)
+
+    @property
+    def memory_expiration_minutes(self) -> int:
+        return int(self.settings.get('memory_expiration_minutes') or DEFAULT_MEMORY_EXPIRATION_MINUTES)
+
+    def memory_metadata(self, metadata: dict = None) -> dict:
+        """Metadata para memórias globais deste canal (acrescenta o canal em modo multi-canal)."""
+        if not self.memory_scope: return metadata
+        return dict(metadata or {}, channel=self.memory_scope)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# Orçamento de tokens do contexto enviado à IA a cada pergunta.
+DEFAULT_CONTEXT_TOKEN_BUDGET = 2000
+# Fração do orçamento reservada a cada fonte; o que sobrar é redistribuído por prioridade.
+DEFAULT_CONTEXT_SHARES = {'lorebook': 0.35, 'history': 0.35, 'personal': 0.15, 'global': 0.15}
+# Abaixo disso não vale a pena mandar um item cortado.
+MIN_TRUNCATED_TOKENS = 24
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa barata (~4 caracteres por token), suficiente para limitar o tamanho do prompt."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars: return text
+    cut = text[:max_chars - 1]
+    return (cut.rsplit(' ', 1)[0] if ' ' in cut else cut) + "…"
+
+class ContextBudget:
+    """Distribui um orçamento de tokens entre as fontes de contexto de uma pergunta.
+
+    As fontes são registradas em ordem de prioridade e cada uma lista seus itens do mais
+    para o menos valioso. Primeiro cada fonte usa a sua fração do orçamento; a sobra vai
+    para as fontes em ordem de prioridade. Um item que não cabe encerra a fonte (os
+    seguintes valem menos); se a fonte souber cortar itens (`truncate`), o último ainda
+    entra encurtado na segunda rodada.
+    """
+
+    def __init__(self, budget_tokens: int = DEFAULT_CONTEXT_TOKEN_BUDGET, shares: dict = None):
+        self.budget_tokens = budget_tokens
+        self.shares = dict(DEFAULT_CONTEXT_SHARES, **(shares or {}))
+        self._sources = []
+
+    def add(self, name: str, items: list, text=lambda item: item, truncate=None):
+        """`text(item)` dá o texto do item; `truncate(item, max_tokens)` devolve uma versão menor."""
+        self._sources.append({'name': name, 'items': list(items), 'text': text, 'truncate': truncate,
+                              'kept': [], 'tokens': 0, 'truncated': 0, 'closed': False})
+
+    def _fill(self, source, limit: int, allow_truncate: bool) -> int:
+        used = 0
+        while not source['closed'] and len(source['kept']) < len(source['items']):
+            item = source['items'][len(source['kept'])]
+            cost = estimate_tokens(source['text'](item))
+            if cost <= limit - used:
+                source['kept'].append(item); used += cost; continue
+            if allow_truncate:
+                if source['truncate'] and limit - used >= MIN_TRUNCATED_TOKENS:
+                    item = source['truncate'](item, limit - used)
+                    source['kept'].append(item); source['truncated'] += 1
+                    used += estimate_tokens(source['text'](item))
+                source['closed'] = True
+            break
+        source['tokens'] += used
+        return used
+
+    def assemble(self) -> dict:
+        """Retorna {fonte: itens incluídos}, na mesma ordem de valor em que foram registrados."""
+        remaining = self.budget_tokens
+        for source in self._sources:
+            remaining -= self._fill(source, int(self.budget_tokens * self.shares.get(source['name'], 0)), False)
+        for source in self._sources:
+            if remaining <= 0: break
+            remaining -= self._fill(source, remaining, True)
+        return {source['name']: source['kept'] for source in self._sources}
+
+    def report(self) -> dict:
+        return {source['name']: {'kept': len(source['kept']), 'total': len(source['items']), 'tokens': source['tokens'], 'truncated': source['truncated']}
+                for source in self._sources}
+
+    def summary(self) -> str:
+        """Linha curta para o status de depuração: 'lorebook 3/8 (410t), history 4/6 (380t, 1 cortado) | 790/2000t'."""
+        parts = []
+        for name, info in self.report().items():
+            extra = f", {info['truncated']} cortado" if info['truncated'] else ""
+            parts.append(f"{name} {info['kept']}/{info['total']} ({info['tokens']}t{extra})")
+        used = sum(source['tokens'] for source in self._sources)
+        return f"{', '.join(parts)} | {used}/{self.budget_tokens}t"
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import metrics
+from cache import TTLCache
+
+class ContextFetcher:
+    """Busca as fontes de contexto de uma pergunta em paralelo, cada uma com seu prazo.
+
+    Uma fonte que estoura o prazo (ou falha) recebe o último resultado bom da mesma chave,
+    ou o valor padrão se não houver. A busca atrasada continua rodando no pool e, quando
+    termina, atualiza esse último resultado bom para as próximas perguntas.
+    """
+
+    def __init__(self, max_workers: int = 8, fallback_ttl_seconds: float = 1800.0, max_fallbacks: int = 1024):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="context")
+        self._last_good = TTLCache(max_fallbacks, fallback_ttl_seconds)
+        self._lock = threading.Lock()
+        self._stats = {"ok": 0, "timeouts": 0, "errors": 0, "fallbacks": 0}
+
+    def _run(self, name, fn, fallback_key):
+        with metrics.timer('stage_seconds', stage=f"context_{name}"): result = fn()
+        self._last_good.set(fallback_key, result)
+        return result
+
+    def fetch(self, sources: dict) -> tuple[dict, dict]:
+        """`sources`: nome -> (função, prazo em s, chave do fallback, padrão).
+
+        Retorna (resultados, situação por fonte). A espera total é o maior prazo, não a soma.
+        """
+        started = time.monotonic()
+        futures = {name: self._executor.submit(self._run, name, fn, key) for name, (fn, _, key, _) in sources.items()}
+        results, status = {}, {}
+        for name, (_, timeout, key, default) in sources.items():
+            try:
+                results[name] = futures[name].result(timeout=max(0.0, started + timeout - time.monotonic()))
+                status[name] = "ok"; self._count("ok")
+                continue
+            except FutureTimeout:
+                status[name] = "timeout"; self._count("timeouts")
+            except Exception as e:
+                logging.error(f"Erro ao buscar contexto '{name}': {e}")
+                status[name] = "erro"; self._count("errors")
+            cached = self._last_good.get(key)
+            if cached is not None:
+                results[name] = cached; status[name] += "→cache"; self._count("fallbacks")
+            else:
+                results[name] = default
+        return results, status
+
+    def _count(self, key: str):
+        with self._lock: self._stats[key] += 1
+        metrics.inc('context_fetch_total', result=key)
+
+    def stats(self) -> dict:
+        with self._lock: return dict(self._stats)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+from collections import deque
+
+class ConversationArchiver:
+    """Transforma conversas expiradas da memória de curto prazo em memórias pessoais, em segundo plano.
+
+    `submit` só enfileira. Uma thread junta até `batch_size` conversas (ou o que houver
+    depois de `max_wait_seconds`), resume todas com `summarize_batch(históricos) -> [resumo
+    ou None]` e grava os resumos com uma única chamada a `save_batch([(usuário, resumo)])`.
+    Conversas sem resumo no lote são tentadas uma a uma com `summarize_one`; se ainda
+    falharem, são descartadas e contabilizadas (não vira memória um texto de erro).
+    """
+
+    def __init__(self, summarize_batch, save_batch, summarize_one=None, batch_size: int = 8,
+                 max_wait_seconds: float = 5.0, max_pending: int = 500, on_event=None):
+        self._summarize_batch, self._save_batch, self._summarize_one = summarize_batch, save_batch, summarize_one
+        self.batch_size, self.max_wait_seconds, self.max_pending = batch_size, max_wait_seconds, max_pending
+        self._on_event = on_event or (lambda message: None)
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._busy = False
+        self._flushing = 0
+        self._stats = {"submitted": 0, "archived": 0, "failed": 0, "dropped": 0, "batches": 0}
+        self._thread = threading.Thread(target=self._run, name="ConversationArchiver", daemon=True)
+        self._thread.start()
+
+    def submit(self, username: str, history: list) -> bool:
+        if not history: return False
+        with self._cond:
+            if self._closed: return False
+            if len(self._pending) >= self.max_pending:
+                self._pending.popleft(); self._stats["dropped"] += 1
+            self._pending.append((username, history, time.monotonic()))
+            self._stats["submitted"] += 1
+            if len(self._pending) >= self.batch_size: self._cond.notify()
+        return True
+
+    def _take_batch(self):
+        """Bloqueia até haver um lote pronto. Retorna None ao fechar com a fila vazia."""
+        with self._cond:
+            while True:
+                if self._pending:
+                    wait = self._pending[0][2] + self.max_wait_seconds - time.monotonic()
+                    if len(self._pending) >= self.batch_size or wait <= 0 or self._closed or self._flushing: break
+                    self._cond.wait(wait)
+                elif self._closed: return None
+                else: self._cond.wait()
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            self._busy = True
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None: return
+            try: self._archive(batch)
+            except Exception as e:
+                logging.error(f"Erro ao arquivar conversas: {e}", exc_info=True)
+                with self._cond: self._stats["failed"] += len(batch)
+            finally:
+                with self._cond: self._busy = False; self._cond.notify_all()
+
+    def _archive(self, batch: list):
+        histories = [history for _, history, _ in batch]
+        summaries = self._summarize_batch(histories) if len(batch) > 1 or not self._summarize_one else [None]
+        rows, failed = [], 0
+        for (username, history, _), summary in zip(batch, summaries):
+            if not summary and self._summarize_one: summary = self._summarize_one(history)
+            if summary: rows.append((username, summary))
+            else: failed += 1
+        if rows: self._save_batch(rows)
+        with self._cond:
+            self._stats["archived"] += len(rows); self._stats["failed"] += failed; self._stats["batches"] += 1
+        self._on_event(f"{len(rows)} conversa(s) arquivada(s) em memória pessoal ({failed} sem resumo).")
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Espera a fila esvaziar (e o lote em andamento terminar), sem aguardar o intervalo de agrupamento."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._flushing += 1; self._cond.notify_all()
+            try:
+                while self._pending or self._busy:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0: return False
+                    self._cond.wait(remaining)
+            finally: self._flushing -= 1
+        return True
+
+    def stats(self) -> dict:
+        with self._cond: return dict(self._stats, queued=len(self._pending))
+
+    def close(self, timeout: float = 30.0):
+        """Para de aceitar conversas, arquiva as pendentes (sem esperar o agrupamento) e encerra a thread."""
+        with self._cond:
+            self._closed = True; self._cond.notify_all()
+        self._thread.join(timeout)
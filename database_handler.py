@@ -1,121 +1,251 @@
 # -*- coding: utf-8 -*-
 import os
+import threading
+import time
+from collections import deque
 from datetime import datetime, timedelta
 import pytz
-from supabase import create_client, Client
 import logging
+from lorebook_index import LorebookIndex
+from storage import create_storage
+import status_channel
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 DB_ENABLED = False
-supabase_client: Client = None
+# Backend de armazenamento (storage.py): Supabase por padrão, SQLite local com STORAGE_BACKEND=sqlite.
+storage = None
 try:
-    SUPABASE_URL = os.getenv("SUPABASE_URL")
-    SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-    if not SUPABASE_URL or not SUPABASE_KEY: raise ValueError("Credenciais do Supabase não encontradas")
-    supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    logging.info("Módulo de Banco de Dados inicializado com sucesso.")
+    storage = create_storage()
+    logging.info(f"Módulo de Banco de Dados inicializado com sucesso ({storage.name}).")
     DB_ENABLED = True
 except Exception as e:
-    logging.critical(f"Não foi possível conectar ao Supabase. Erro: {e}")
+    logging.critical(f"Não foi possível conectar ao banco de dados. Erro: {e}")
 
 def load_initial_data():
     if not DB_ENABLED: return None, []
     try:
         logging.info("Carregando dados iniciais do banco de dados...")
-        settings_response = supabase_client.table('settings').select("*").limit(1).single().execute()
-        settings = settings_response.data
+        settings = storage.get_settings()
         logging.info("Configurações carregadas.")
         
-        lorebook_response = supabase_client.table('lorebook').select("entry").execute()
-        lorebook = [item['entry'] for item in lorebook_response.data]
+        refresh_lorebook(force=True)
+        lorebook = get_current_lorebook()
         logging.info(f"Lorebook carregado com {len(lorebook)} entradas.")
+        refresh_user_permissions()
         return settings, lorebook
     except Exception as e:
         logging.error(f"Erro ao carregar dados iniciais: {e}"); return None, []
 
+# --- Cache de permissões ---
+# A tabela 'users' é pequena e quase todo mundo é 'normal': ela é carregada inteira no
+# início e recarregada pelo agendador. Com o cache completo, usuário ausente = 'normal'
+# sem ida ao banco. Se a carga completa falhar, cada usuário é buscado uma vez e o
+# resultado (inclusive o negativo) fica em cache por PERMISSION_CACHE_TTL_SECONDS.
+PERMISSION_CACHE_TTL_SECONDS = int(os.getenv("PERMISSION_CACHE_TTL_SECONDS", 300))
+_permission_cache = {}
+_permission_cache_complete = False
+_permission_cache_lock = threading.Lock()
+
+def refresh_user_permissions() -> bool:
+    """Recarrega toda a tabela 'users' para o cache de permissões."""
+    global _permission_cache, _permission_cache_complete
+    if not DB_ENABLED: return False
+    try:
+        users = storage.list_users()
+        now = time.monotonic()
+        cache = {row['twitch_username'].lower(): (row.get('permission_level') or 'normal', now) for row in users if row.get('twitch_username')}
+        with _permission_cache_lock:
+            _permission_cache = cache; _permission_cache_complete = True
+        logging.info(f"Cache de permissões carregado com {len(cache)} usuários.")
+        return True
+    except Exception as e:
+        logging.error(f"Erro ao carregar cache de permissões: {e}"); return False
+
+def _fetch_user_permission(username: str) -> str:
+    try: return storage.get_user_permission(username) or 'normal'
+    except Exception: return 'normal'
+
 def get_user_permission(username: str) -> str:
     if not DB_ENABLED: return 'normal'
+    username = username.lower()
+    with _permission_cache_lock:
+        cached = _permission_cache.get(username)
+        if _permission_cache_complete: return cached[0] if cached else 'normal'
+        if cached and time.monotonic() - cached[1] < PERMISSION_CACHE_TTL_SECONDS: return cached[0]
+    permission = _fetch_user_permission(username)
+    with _permission_cache_lock: _permission_cache[username] = (permission, time.monotonic())
+    return permission
+
+def invalidate_user_permission(username: str):
+    """Descarta a permissão em cache de um usuário e a busca novamente no banco.
+
+    O bot registra esta função como comando do canal local; é assim que uma mudança
+    feita pelo painel (outro processo) chega ao cache do bot sem esperar o TTL.
+    """
+    if not DB_ENABLED: return
+    username = username.lower()
+    permission = _fetch_user_permission(username)
+    with _permission_cache_lock: _permission_cache[username] = (permission, time.monotonic())
+
+def set_user_permission(username: str, permission: str) -> bool:
+    """Cria/atualiza o usuário na tabela 'users', atualiza o cache local e avisa o bot pelo canal local.
+
+    Retorna False se o bot não recebeu o aviso (parado ou sem canal); nesse caso ele vê a
+    mudança na próxima recarga do cache. Levanta exceção se a gravação falhar.
+    """
+    username = username.lower()
+    storage.upsert_user(username, permission)
+    with _permission_cache_lock: _permission_cache[username] = (permission, time.monotonic())
+    return status_channel.send_command('invalidate_user_permission', username)
+
+# --- Lorebook em memória ---
+# O lorebook fica em memória (id -> fato) junto com uma "versão" (maior id, total de linhas).
+# A versão é sondada no banco no máximo a cada LOREBOOK_PROBE_SECONDS com uma consulta de
+# tamanho constante; só quando ela muda os ids são comparados e apenas os fatos novos são
+# baixados. Inserções/remoções feitas por este processo atualizam o cache na hora.
+# Sincronizações e escritas locais passam por _lorebook_sync_lock, uma de cada vez: quem
+# chega com uma sincronização já em andamento usa o resultado dela em vez de repeti-la, e
+# uma cópia antiga nunca substitui uma mais nova.
+LOREBOOK_PROBE_SECONDS = float(os.getenv("LOREBOOK_PROBE_SECONDS", 30))
+_lorebook_entries = {}
+_lorebook_version = None
+_lorebook_checked_at = 0.0
+_lorebook_lock = threading.Lock()
+_lorebook_sync_lock = threading.Lock()
+_lorebook_index = LorebookIndex()
+
+def refresh_lorebook(force: bool = False) -> bool:
+    """Sincroniza o lorebook em memória com o banco se a versão mudou. Retorna True se houve mudança.
+
+    Sem `force`, retorna False na hora se outra sincronização já estiver rodando.
+    """
+    global _lorebook_version, _lorebook_checked_at
+    if not DB_ENABLED: return False
+    if not _lorebook_sync_lock.acquire(blocking=force): return False
     try:
-        user_response = supabase_client.table('users').select("permission_level").eq("twitch_username", username.lower()).single().execute()
-        return user_response.data.get('permission_level', 'normal') if user_response.data else 'normal'
-    except Exception: return 'normal'
+        _lorebook_checked_at = time.monotonic()
+        version = storage.lorebook_version()
+        if not force and version == _lorebook_version: return False
+        remote_ids = storage.lorebook_ids()
+        with _lorebook_lock: missing_ids = sorted(remote_ids - _lorebook_entries.keys())
+        new_entries = storage.lorebook_entries(missing_ids) if missing_ids else {}
+        with _lorebook_lock:
+            for entry_id in [i for i in _lorebook_entries if i not in remote_ids]: _lorebook_entries.pop(entry_id)
+            for entry_id in sorted(new_entries): _lorebook_entries[entry_id] = new_entries[entry_id]
+            _lorebook_version = version
+            snapshot = dict(_lorebook_entries)
+        _lorebook_index.sync(snapshot)
+        return True
+    except Exception as e:
+        logging.error(f"Erro ao sincronizar o lorebook: {e}"); return False
+    finally:
+        _lorebook_sync_lock.release()
 
 def add_lorebook_entry(entry: str, user: str) -> bool:
     if not DB_ENABLED: return False
     try:
-        supabase_client.table('lorebook').insert({"entry": entry, "created_by": user}).execute()
+        with _lorebook_sync_lock:
+            created = storage.insert_lorebook(entry, user)
+            with _lorebook_lock:
+                for item in created: _lorebook_entries[item['id']] = item['entry']
+            for item in created: _lorebook_index.add(item['id'], item['entry'])
         return True
     except Exception as e:
         logging.error(f"Erro ao adicionar entrada no lorebook: {e}"); return False
-        
+
 def get_current_lorebook() -> list[str]:
+    """Retorna os fatos do lorebook em memória, sondando a versão no banco se o intervalo expirou."""
     if not DB_ENABLED: return []
-    try:
-        response = supabase_client.table('lorebook').select("entry").execute()
-        return [item['entry'] for item in response.data]
-    except Exception as e:
-        logging.error(f"Erro ao buscar o lorebook atual: {e}"); return []
+    if time.monotonic() - _lorebook_checked_at >= LOREBOOK_PROBE_SECONDS: refresh_lorebook()
+    with _lorebook_lock: return list(_lorebook_entries.values())
+
+def search_lorebook(question: str, top_k: int = 8, max_chars: int = 1500, include_pinned: bool = True) -> list[str]:
+    """Fatos fixados + os fatos mais relevantes para a pergunta (BM25), dentro do orçamento."""
+    if not DB_ENABLED: return []
+    if time.monotonic() - _lorebook_checked_at >= LOREBOOK_PROBE_SECONDS: refresh_lorebook()
+    return _lorebook_index.search(question, top_k, max_chars, include_pinned)
+
+def get_pinned_lorebook() -> list[str]:
+    """Fatos [FIXO] do lorebook, que entram no prefixo estável do prompt."""
+    if not DB_ENABLED: return []
+    if time.monotonic() - _lorebook_checked_at >= LOREBOOK_PROBE_SECONDS: refresh_lorebook()
+    return _lorebook_index.pinned()
+
+def get_lorebook_version() -> tuple:
+    """Versão (maior id, total) do lorebook em memória, para invalidar caches derivados dele."""
+    with _lorebook_lock: return (max(_lorebook_entries, default=0), len(_lorebook_entries))
 
 def save_long_term_memory(username: str, summary: str):
     if not DB_ENABLED: return
     try:
-        supabase_client.table('long_term_memory').insert({"username": username, "summary": summary}).execute()
+        storage.insert_long_term_memories([{"username": username, "summary": summary}])
     except Exception as e:
         logging.error(f"Erro ao salvar memória pessoal para {username}: {e}")
 
+def save_long_term_memories(memories: list[tuple[str, str]]):
+    """Grava vários resumos (usuário, resumo) num único insert."""
+    if not DB_ENABLED or not memories: return
+    try:
+        storage.insert_long_term_memories([{"username": username, "summary": summary} for username, summary in memories])
+    except Exception as e:
+        logging.error(f"Erro ao salvar {len(memories)} memórias pessoais: {e}")
+
 def search_long_term_memory(username: str, limit: int = 5) -> list[str]:
     if not DB_ENABLED: return []
     try:
-        response = supabase_client.table('long_term_memory').select("summary").eq("username", username).order("created_at", desc=True).limit(limit).execute()
-        return [item['summary'] for item in response.data]
+        return [item['summary'] for item in storage.search_long_term_memory(username, limit)]
     except Exception as e:
         logging.error(f"Erro ao buscar memória pessoal para {username}: {e}"); return []
 
-def save_hierarchical_memory(level: str, summary: str, metadata: dict = None):
-    if not DB_ENABLED: return
+def save_hierarchical_memory(level: str, summary: str, metadata: dict = None) -> bool:
+    if not DB_ENABLED: return False
     try:
-        supabase_client.table('hierarchical_memory').insert({"memory_level": level, "summary": summary, "metadata": metadata}).execute()
+        storage.insert_hierarchical_memory(level, summary, metadata); return True
     except Exception as e:
-        logging.error(f"Erro ao salvar memória hierárquica: {e}")
+        logging.error(f"Erro ao salvar memória hierárquica: {e}"); return False
 
-def search_hierarchical_memory(limit: int = 3) -> list[str]:
+def search_hierarchical_memory(limit: int = 3, channel: str = None) -> list[str]:
     if not DB_ENABLED: return []
     try:
-        response = supabase_client.table('hierarchical_memory').select("summary, metadata").order("created_at", desc=True).limit(limit).execute()
-        return response.data
+        return storage.recent_hierarchical_memories(limit, channel)
     except Exception as e:
         logging.error(f"Erro ao buscar memória hierárquica: {e}"); return []
 
-def get_memories_for_consolidation(level: str, start_time: datetime = None, end_time: datetime = None) -> list:
+def get_memories_for_consolidation(level: str, start_time: datetime = None, end_time: datetime = None, channel: str = None) -> list:
     if not DB_ENABLED: return []
     try:
-        query = supabase_client.table('hierarchical_memory').select("id, summary, metadata").eq("memory_level", level).order("created_at", desc=False)
-        if start_time and end_time:
-            query = query.gte("created_at", start_time.isoformat()).lte("created_at", end_time.isoformat())
-        response = query.execute()
-        return response.data
+        return storage.memories_for_consolidation(level, start_time, end_time, channel)
     except Exception as e:
         logging.error(f"Erro ao buscar memórias '{level}' para consolidação: {e}"); return []
 
 def delete_memories_by_ids(ids: list):
     if not DB_ENABLED or not ids: return
     try:
-        supabase_client.table('hierarchical_memory').delete().in_('id', ids).execute()
+        storage.delete_hierarchical_memories(ids)
     except Exception as e:
         logging.error(f"Erro ao deletar memórias antigas: {e}")
 
 def delete_lorebook_entry(entry_id: int):
     if not DB_ENABLED: return
     try:
-        supabase_client.table('lorebook').delete().eq('id', entry_id).execute()
+        with _lorebook_sync_lock:
+            storage.delete_lorebook(entry_id)
+            with _lorebook_lock: _lorebook_entries.pop(int(entry_id), None)
+            _lorebook_index.remove(int(entry_id))
     except Exception as e:
         logging.error(f"Erro ao deletar entrada do lorebook (ID: {entry_id}): {e}")
 
+# O estado corrente vai pelo canal local (status_channel); no banco a linha de status só
+# é regravada quando o valor muda (o heartbeat não gera escrita).
+_last_saved_status = None
+
 def update_bot_status(status: str):
-    if not DB_ENABLED: return
+    global _last_saved_status
+    status_channel.set_value('status', status)
+    if not DB_ENABLED or status == _last_saved_status: return
     try:
         # Atualiza a linha de status principal (ID 1)
-        supabase_client.table('bot_status').update({"status_value": status}).eq('id', 1).execute()
+        storage.set_bot_status(1, status); _last_saved_status = status
         logging.info(f"Status do bot atualizado para: {status}")
     except Exception as e:
         logging.error(f"Erro ao atualizar status do bot: {e}")
@@ -124,24 +254,116 @@ def update_bot_debug_status(debug_message: str):
     """Atualiza a linha de status de depuração (ID 23, como na sua imagem)."""
     if not DB_ENABLED: return
     try:
-        supabase_client.table('bot_status').update({"status_value": debug_message}).eq('id', 23).execute()
+        storage.set_bot_status(23, debug_message)
     except Exception as e:
         logging.error(f"Erro ao atualizar status de debug do bot: {e}")
 
-def add_live_log(log_type: str, message: str):
-    """Adiciona uma nova entrada de log à sua tabela 'live_logs'."""
-    if not DB_ENABLED: return
+# post_bot_debug_status não espera o Supabase: uma thread grava só a mensagem mais recente
+# (as intermediárias são substituídas enquanto uma gravação está em andamento). Com o canal
+# local ativo o painel lê a depuração por ele e nada é gravado no banco.
+_debug_status_lock = threading.Lock()
+_debug_status_pending = None
+_debug_status_writing = False
+
+def post_bot_debug_status(debug_message: str):
+    global _debug_status_pending, _debug_status_writing
+    status_channel.set_value('debug', debug_message)
+    if not DB_ENABLED or status_channel.server_running(): return
+    with _debug_status_lock:
+        _debug_status_pending = debug_message
+        if _debug_status_writing: return
+        _debug_status_writing = True
+    threading.Thread(target=_write_pending_debug_status, name="debug-status", daemon=True).start()
+
+def _write_pending_debug_status():
+    global _debug_status_pending, _debug_status_writing
+    while True:
+        with _debug_status_lock:
+            debug_message, _debug_status_pending = _debug_status_pending, None
+            if debug_message is None:
+                _debug_status_writing = False; return
+        update_bot_debug_status(debug_message)
+
+# --- Sink de logs ao vivo ---
+# add_live_log apenas enfileira; uma thread de fundo grava em lotes (insert multi-linha)
+# quando o lote enche ou o intervalo expira. Política de overflow: com a fila cheia,
+# o log MAIS ANTIGO é descartado (o painel sempre mostra o que é mais recente).
+LIVE_LOG_QUEUE_MAX = int(os.getenv("LIVE_LOG_QUEUE_MAX", 2000))
+LIVE_LOG_BATCH_SIZE = int(os.getenv("LIVE_LOG_BATCH_SIZE", 50))
+LIVE_LOG_FLUSH_SECONDS = float(os.getenv("LIVE_LOG_FLUSH_SECONDS", 2.0))
+LIVE_LOG_STATS = {"enqueued": 0, "flushed": 0, "dropped": 0, "failed": 0, "batches": 0}
+_live_log_queue = deque()
+_live_log_cond = threading.Condition()
+_live_log_thread = None
+
+def _ensure_live_log_worker():
+    global _live_log_thread
+    if _live_log_thread is not None: return
+    with _live_log_cond:
+        if _live_log_thread is not None: return
+        _live_log_thread = threading.Thread(target=_live_log_worker, name="LiveLogSink", daemon=True)
+        _live_log_thread.start()
+
+def _take_live_log_batch() -> list:
+    with _live_log_cond:
+        batch = []
+        while _live_log_queue and len(batch) < LIVE_LOG_BATCH_SIZE:
+            batch.append(_live_log_queue.popleft())
+        return batch
+
+def _write_live_log_batch(batch: list):
+    if not batch: return
     try:
-        supabase_client.table('live_logs').insert({"log_type": log_type, "message": message}).execute()
+        storage.insert_live_logs(batch)
+        with _live_log_cond:
+            LIVE_LOG_STATS["flushed"] += len(batch); LIVE_LOG_STATS["batches"] += 1
     except Exception as e:
-        print(f"ERRO DE LOGGING NO DB: {e}")
+        # Logs não são críticos: o lote com falha é descartado e contabilizado.
+        with _live_log_cond: LIVE_LOG_STATS["failed"] += len(batch)
+        print(f"ERRO DE LOGGING NO DB ({len(batch)} logs descartados): {e}")
+
+def _live_log_worker():
+    while True:
+        with _live_log_cond:
+            deadline = time.monotonic() + LIVE_LOG_FLUSH_SECONDS
+            while len(_live_log_queue) < LIVE_LOG_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: break
+                _live_log_cond.wait(remaining)
+        _write_live_log_batch(_take_live_log_batch())
+
+def add_live_log(log_type: str, message: str):
+    """Enfileira uma entrada de log para a tabela 'live_logs' (gravada em lote, sem bloquear)."""
+    status_channel.event(log_type, message)
+    if not DB_ENABLED: return
+    _ensure_live_log_worker()
+    row = {"log_type": log_type, "message": message, "created_at": datetime.now(pytz.utc).isoformat()}
+    with _live_log_cond:
+        if len(_live_log_queue) >= LIVE_LOG_QUEUE_MAX:
+            _live_log_queue.popleft(); LIVE_LOG_STATS["dropped"] += 1
+        _live_log_queue.append(row); LIVE_LOG_STATS["enqueued"] += 1
+        if len(_live_log_queue) >= LIVE_LOG_BATCH_SIZE: _live_log_cond.notify()
+
+def flush_live_logs():
+    """Grava imediatamente tudo o que está na fila de logs (usado no desligamento)."""
+    if not DB_ENABLED: return
+    while True:
+        batch = _take_live_log_batch()
+        if not batch: break
+        _write_live_log_batch(batch)
+    logging.info(f"Sink de logs esvaziado. Estatísticas: {get_live_log_stats()}")
+
+def get_live_log_stats() -> dict:
+    """Retorna uma cópia dos contadores do sink de logs, incluindo a profundidade atual da fila."""
+    with _live_log_cond:
+        return dict(LIVE_LOG_STATS, queued=len(_live_log_queue))
 
-def get_live_logs(limit: int = 150) -> list:
-    """Busca as últimas entradas de log da sua tabela 'live_logs'."""
+def get_live_logs(limit: int = 150, after_id: int = None) -> list:
+    """Últimas `limit` entradas de 'live_logs' (mais novas primeiro) ou, com `after_id`, até `limit` entradas com id maior (mais antigas primeiro)."""
     if not DB_ENABLED: return []
     try:
-        response = supabase_client.table('live_logs').select("*").order("created_at", desc=True).limit(limit).execute()
-        return response.data
+        if after_id is None: return storage.list_page('live_logs', "id, log_type, message, created_at", limit)
+        return storage.list_page('live_logs', "id, log_type, message, created_at", limit, desc=False, after=after_id)
     except Exception as e:
         print(f"ERRO AO BUSCAR LOGS DO DB: {e}"); return []
 
@@ -149,8 +371,7 @@ def delete_old_logs():
     """Deleta logs da tabela 'live_logs' com mais de 24 horas."""
     if not DB_ENABLED: return
     try:
-        time_threshold = (datetime.now(pytz.utc) - timedelta(hours=24)).isoformat()
-        supabase_client.table('live_logs').delete().lt('created_at', time_threshold).execute()
+        storage.delete_live_logs_before(datetime.now(pytz.utc) - timedelta(hours=24))
         logging.info("Limpeza de logs antigos da tabela 'live_logs' executada.")
         add_live_log("STATUS", "Limpeza de logs antigos executada.")
     except Exception as e:
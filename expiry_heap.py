@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import heapq
+import itertools
+
+class ExpiryHeap:
+    """Prazo de expiração por chave; achar as vencidas custa O(vencidas · log n), sem varrer tudo.
+
+    Reagendar (`touch`) só registra o novo prazo e empilha outra entrada; as entradas
+    antigas são descartadas quando chegam ao topo. O heap é reconstruído se as entradas
+    obsoletas passarem a dominar. Não é thread-safe: quem usa protege com o próprio lock.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._deadlines = {}
+        self._seq = itertools.count()
+
+    def touch(self, key, deadline: float):
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._seq), key))
+        if len(self._heap) > 2 * len(self._deadlines) + 64: self._compact()
+
+    def discard(self, key):
+        self._deadlines.pop(key, None)
+
+    def pop_expired(self, now: float) -> list:
+        """Remove e retorna as chaves com prazo <= `now`, da que venceu primeiro para a última."""
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) == deadline:
+                del self._deadlines[key]; expired.append(key)
+        return expired
+
+    def _compact(self):
+        self._heap = [(deadline, next(self._seq), key) for key, deadline in self._deadlines.items()]
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, key):
+        return key in self._deadlines
@@ -1,14 +1,26 @@
 # -*- coding: utf-8 -*-
+import codecs
+import json
 import os
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 import google.generativeai as genai
 from ddgs import DDGS
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 import database_handler
+import metrics
 import requests
-from bs4 import BeautifulSoup
+from cache import SqliteCacheTier, ToolResultCache
+from html_text import VisibleTextExtractor, detect_encoding
+from lorebook_index import fold_text
+from response_stream import SentenceStreamer, clean_response_text, parse_tool_call
+from prompt_prefix import PromptPrefixCache, SystemInstructionBackend, CachedContentBackend, LocalPrefixBackend, is_missing_cache_error
 
 GEMINI_ENABLED = False
+# Respostas de contingência de generate_interactive_response (não devem ir para caches).
+FALLBACK_RESPONSES = {"Erro: Modelo de interação indisponível.", "Minha resposta foi bloqueada por segurança.", "Ocorreu um erro ao pensar."}
 interaction_model = None
+interaction_model_name = None
 summarizer_model = None
 safety_settings = {
     HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
@@ -17,6 +29,34 @@ safety_settings = {
     HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
 }
 
+# --- Cache de resultados das ferramentas (busca na web e leitura de URL) ---
+# Notícias envelhecem rápido; páginas mudam pouco. TOOL_CACHE_DB (caminho de um arquivo
+# SQLite) ativa a camada em disco, que sobrevive a reinícios do bot.
+TOOL_CACHE_SEARCH_TTL_SECONDS = float(os.getenv('TOOL_CACHE_SEARCH_TTL_SECONDS', 600))
+TOOL_CACHE_PAGE_TTL_SECONDS = float(os.getenv('TOOL_CACHE_PAGE_TTL_SECONDS', 6 * 3600))
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv('TOOL_CACHE_MAX_ENTRIES', 256))
+_tool_cache_disk = None
+try:
+    if os.getenv('TOOL_CACHE_DB'): _tool_cache_disk = SqliteCacheTier(os.getenv('TOOL_CACHE_DB'))
+except Exception as e:
+    print(f"ERRO ao abrir o cache de ferramentas em disco: {e}")
+search_cache = ToolResultCache("search", TOOL_CACHE_SEARCH_TTL_SECONDS, TOOL_CACHE_MAX_ENTRIES, _tool_cache_disk)
+page_cache = ToolResultCache("page", TOOL_CACHE_PAGE_TTL_SECONDS, TOOL_CACHE_MAX_ENTRIES, _tool_cache_disk)
+# --- Prefixo estável do prompt (personalidade + regras de ferramentas) ---
+# PROMPT_CACHE_MODE: 'system' (system_instruction, padrão), 'cached_content' (cache de
+# contexto do Gemini) ou 'local' (prefixo como turnos do histórico, para testes).
+PROMPT_CACHE_MODE = os.getenv('PROMPT_CACHE_MODE', 'system').lower()
+PROMPT_CACHE_TTL_MINUTES = int(os.getenv('PROMPT_CACHE_TTL_MINUTES', 60))
+_prompt_backends = {'system': SystemInstructionBackend, 'cached_content': lambda: CachedContentBackend(PROMPT_CACHE_TTL_MINUTES), 'local': LocalPrefixBackend}
+prompt_prefix_cache = PromptPrefixCache(_prompt_backends.get(PROMPT_CACHE_MODE, SystemInstructionBackend)())
+# Com STREAM_RESPONSES=true a resposta vai para o chat frase a frase enquanto é gerada.
+STREAM_RESPONSES = os.getenv('STREAM_RESPONSES', 'false').lower() == 'true'
+STREAM_MIN_CHUNK_CHARS = int(os.getenv('STREAM_MIN_CHUNK_CHARS', 120))
+PAGE_MAX_BYTES = int(os.getenv('PAGE_MAX_BYTES', 2 * 1024 * 1024))
+PAGE_MAX_CHARS = 4000
+PAGE_TEXT_CONTENT_TYPES = ('text/html', 'application/xhtml', 'text/plain')
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|igshid|si|ref|ref_src)$")
+
 try:
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
     genai.configure(api_key=GEMINI_API_KEY)
@@ -26,18 +66,38 @@ except Exception as e:
     print(f"ERRO CRÍTICO: Não foi possível inicializar o módulo Gemini. Erro: {e}")
 
 def load_models_from_settings(settings: dict):
-    global interaction_model, summarizer_model
+    global interaction_model, interaction_model_name, summarizer_model
     try:
         interaction_model_name = settings.get('interaction_model', 'gemini-1.5-flash-latest')
         archivist_model_name = settings.get('archivist_model', 'gemini-1.5-flash-latest')
         interaction_model = genai.GenerativeModel(model_name=interaction_model_name)
+        prompt_prefix_cache.clear()
         summarizer_model = genai.GenerativeModel(model_name=archivist_model_name)
         print(f"Modelo de interação '{interaction_model_name}' carregado.")
         print(f"Modelo arquivista '{archivist_model_name}' carregado.")
     except Exception as e:
         print(f"ERRO ao carregar modelos de IA: {e}"); global GEMINI_ENABLED; GEMINI_ENABLED = False
 
+def normalize_search_query(query: str) -> str:
+    return " ".join(fold_text(query).split())
+
+def canonicalize_url(url: str) -> str:
+    """URL canônica para o cache: esquema/host em minúsculas, sem fragmento, porta padrão ou parâmetros de rastreio."""
+    parts = urlsplit(url.strip())
+    netloc = parts.netloc.lower()
+    if (parts.scheme.lower(), netloc.rsplit(':', 1)[-1]) in (('http', '80'), ('https', '443')): netloc = netloc.rsplit(':', 1)[0]
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _TRACKING_PARAMS.match(k)])
+    return urlunsplit((parts.scheme.lower(), netloc, parts.path or '/', query, ''))
+
 def web_search_ddgs(query: str, num_results: int = 5) -> str:
+    result, cached = search_cache.get_or_compute(
+        f"{num_results}:{normalize_search_query(query)}", lambda: _web_search_ddgs_uncached(query, num_results),
+        should_cache=lambda text: not text.startswith("Erro")
+    )
+    if cached: database_handler.add_live_log("IA PENSANDO", f"Resultado da busca por '{query}' reaproveitado do cache.")
+    return result
+
+def _web_search_ddgs_uncached(query: str, num_results: int) -> str:
     database_handler.add_live_log("IA PENSANDO", f"Executando busca DDGS por: '{query}'")
     try:
         news_results = DDGS().news(query, max_results=num_results)
@@ -57,23 +117,39 @@ def web_search_ddgs(query: str, num_results: int = 5) -> str:
         print(f"Erro na busca DDGS: {e}"); return "Erro ao tentar buscar na web."
 
 def read_url_content(url: str) -> str:
+    result, cached = page_cache.get_or_compute(
+        canonicalize_url(url), lambda: _read_url_content_uncached(url), should_cache=lambda text: not text.startswith("Erro")
+    )
+    if cached: database_handler.add_live_log("IA PENSANDO", f"Conteúdo da URL {url} reaproveitado do cache.")
+    return result
+
+def _read_url_content_uncached(url: str) -> str:
     database_handler.add_live_log("IA PENSANDO", f"Tentando ler o conteúdo da URL: {url}")
     try:
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'}
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        for script_or_style in soup(["script", "style"]):
-            script_or_style.decompose()
+        # Download em streaming: só baixa até PAGE_MAX_BYTES e para assim que o extrator
+        # juntou PAGE_MAX_CHARS de texto visível, independente do tamanho da página.
+        with requests.get(url, headers=headers, timeout=10, stream=True) as response:
+            response.raise_for_status()
+            content_type = response.headers.get('Content-Type', '').lower()
+            if content_type and not any(kind in content_type for kind in PAGE_TEXT_CONTENT_TYPES):
+                return f"Erro: A URL não é uma página de texto (tipo: {content_type.split(';')[0]})."
+            content_length = response.headers.get('Content-Length')
+            if content_length and content_length.isdigit() and int(content_length) > PAGE_MAX_BYTES:
+                database_handler.add_live_log("IA PENSANDO", f"Página com {int(content_length) // 1024} KB; lendo apenas os primeiros {PAGE_MAX_BYTES // 1024} KB.")
+            # A codificação sai do cabeçalho, do BOM ou do <meta charset> do primeiro pedaço.
+            declared = response.encoding if 'charset=' in content_type else None
+            decoder, extractor = None, VisibleTextExtractor(PAGE_MAX_CHARS)
+            downloaded = 0
+            for chunk in response.iter_content(chunk_size=16 * 1024):
+                if decoder is None: decoder = codecs.getincrementaldecoder(detect_encoding(chunk, declared))(errors='replace')
+                downloaded += len(chunk)
+                extractor.feed(decoder.decode(chunk))
+                if extractor.done or downloaded >= PAGE_MAX_BYTES: break
+            if decoder: extractor.feed(decoder.decode(b'', final=True))
+            extractor.close()
 
-        text = soup.get_text()
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = '\n'.join(chunk for chunk in chunks if chunk)
-
-        return f"Conteúdo da página '{url}':\n\n{text[:4000]}"
+        return f"Conteúdo da página '{url}':\n\n{extractor.text()}"
 
     except requests.RequestException as e:
         print(f"Erro ao acessar a URL {url}: {e}")
@@ -82,24 +158,57 @@ def read_url_content(url: str) -> str:
         print(f"Erro ao processar a URL {url}: {e}")
         return "Erro: Não foi possível processar o conteúdo da página."
 
-def generate_interactive_response(question: str, history: list, settings: dict, lorebook: list, long_term_memories: list, hierarchical_memories: list) -> str:
+# ==============================================================================
+#                      PROMPT RESTAURADO E APRIMORADO
+# ==============================================================================
+SEARCH_INSTRUCTIONS = (
+    "\n\n**REGRAS CRÍTICAS DE FERRAMENTAS:**\n"
+    "1. **Para buscas gerais:** Se a pergunta do usuário exigir conhecimento externo ou atual (notícias, eventos, fatos, cotações, etc.) que não esteja na sua memória, sua PRIMEIRA E ÚNICA resposta DEVE ser `[SEARCH]termo de busca otimizado[/SEARCH]`.\n"
+    "2. **Para ler uma página específica:** Se o usuário fornecer uma URL e pedir explicitamente para você ler ou resumir seu conteúdo, sua PRIMEIRA E ÚNICA resposta DEVE ser `[READ_URL]https://url.completa/aqui[/READ_URL]`.\n"
+    "**NÃO tente responder de outra forma. NÃO se desculpe. NÃO adicione texto extra. A falha em seguir estas regras resultará em um erro.**"
+)
+
+def build_prompt_prefix(settings: dict, pinned_lorebook: list) -> str:
+    """Parte do prompt que só muda com as configurações ou os fatos fixados; vai para o modelo em cache."""
+    prefix = settings.get('personality_prompt', '') + SEARCH_INSTRUCTIONS
+    if pinned_lorebook:
+        pinned_text = "\n".join(f"- {fact}" for fact in pinned_lorebook)
+        prefix += f"\n\n{settings.get('lorebook_prompt', '')}\n{pinned_text}"
+    return prefix
+
+def _send_message(chat, content, streamer: SentenceStreamer = None, stage: str = 'gemini_first'):
+    """Envia `content` ao chat da IA e retorna o texto da resposta (None se bloqueada).
+
+    Com `streamer`, a resposta é pedida em stream e as frases vão para o chat enquanto chegam.
+    """
+    with metrics.timer('stage_seconds', stage=stage):
+        if streamer is None:
+            response = chat.send_message(content, safety_settings=safety_settings)
+            record_usage('interaction', response)
+            return response.text.strip() if response.parts else None
+        response = chat.send_message(content, safety_settings=safety_settings, stream=True)
+        for chunk in response:
+            if chunk.parts: streamer.feed(chunk.text)
+        streamer.finish()
+    record_usage('interaction', response)
+    return streamer.text.strip() or None
+
+def record_usage(role: str, response):
+    """Soma os tokens de `usage_metadata` da resposta nos contadores de métricas."""
+    metrics.inc('gemini_calls_total', model=role)
+    usage = getattr(response, 'usage_metadata', None)
+    if not usage: return
+    for kind, field in (('prompt', 'prompt_token_count'), ('output', 'candidates_token_count'), ('cached', 'cached_content_token_count')):
+        metrics.inc('gemini_tokens_total', getattr(usage, field, 0) or 0, model=role, kind=kind)
+
+def generate_interactive_response(question: str, history: list, settings: dict, lorebook: list, long_term_memories: list, hierarchical_memories: list, on_text=None) -> str:
+    """Gera a resposta do !ask. Com STREAM_RESPONSES e `on_text`, os trechos já são entregues
+    a `on_text` durante a geração; o texto completo é retornado do mesmo jeito."""
     if not GEMINI_ENABLED or not interaction_model: return "Erro: Modelo de interação indisponível."
     
     full_history = []
-    personality_prompt = settings.get('personality_prompt', '')
-    
-    # ==============================================================================
-    #                      PROMPT RESTAURADO E APRIMORADO
-    # ==============================================================================
-    search_instructions = (
-        "\n\n**REGRAS CRÍTICAS DE FERRAMENTAS:**\n"
-        "1. **Para buscas gerais:** Se a pergunta do usuário exigir conhecimento externo ou atual (notícias, eventos, fatos, cotações, etc.) que não esteja na sua memória, sua PRIMEIRA E ÚNICA resposta DEVE ser `[SEARCH]termo de busca otimizado[/SEARCH]`.\n"
-        "2. **Para ler uma página específica:** Se o usuário fornecer uma URL e pedir explicitamente para você ler ou resumir seu conteúdo, sua PRIMEIRA E ÚNICA resposta DEVE ser `[READ_URL]https://url.completa/aqui[/READ_URL]`.\n"
-        "**NÃO tente responder de outra forma. NÃO se desculpe. NÃO adicione texto extra. A falha em seguir estas regras resultará em um erro.**"
-    )
-    full_history.append({'role': 'user', 'parts': [personality_prompt + search_instructions]})
-    full_history.append({'role': 'model', 'parts': ["REGRAS COMPREENDIDAS. Minha única resposta inicial para perguntas que exigem conhecimento externo será `[SEARCH]query[/SEARCH]` ou `[READ_URL]url[/READ_URL]`."]})
-    # ==============================================================================
+    prefix = build_prompt_prefix(settings, database_handler.get_pinned_lorebook())
+    model = prompt_prefix_cache.get_model(interaction_model_name, prefix)
 
     if lorebook:
         lorebook_text = "\n".join(f"- {fact}" for fact in lorebook)
@@ -115,30 +224,38 @@ def generate_interactive_response(question: str, history: list, settings: dict,
         full_history.append({'role': 'model', 'parts': ["Memórias do chat assimiladas."]})
         
     full_history.extend(history)
-    chat = interaction_model.start_chat(history=full_history)
+    chat = model.start_chat(history=full_history)
     
     try:
         database_handler.add_live_log("IA PENSANDO", f"Pergunta para IA: '{question}'")
-        response = chat.send_message(question, safety_settings=safety_settings)
-        initial_text = response.text.strip()
+        stream = STREAM_RESPONSES and on_text is not None
+        try: initial_text = _send_message(chat, question, SentenceStreamer(on_text, STREAM_MIN_CHUNK_CHARS) if stream else None)
+        except Exception as e:
+            # O CachedContent do prefixo pode ter sido apagado do lado do Gemini: recria uma vez e repete.
+            if not is_missing_cache_error(e): raise
+            database_handler.add_live_log("IA PENSANDO", "Cache de contexto do Gemini não existe mais; recriando.")
+            prompt_prefix_cache.invalidate(interaction_model_name, prefix)
+            chat = prompt_prefix_cache.get_model(interaction_model_name, prefix).start_chat(history=full_history)
+            initial_text = _send_message(chat, question, SentenceStreamer(on_text, STREAM_MIN_CHUNK_CHARS) if stream else None)
+        if initial_text is None: return "Minha resposta foi bloqueada por segurança."
         database_handler.add_live_log("IA PENSANDO", f"Resposta bruta da IA: '{initial_text}'")
         
-        if initial_text.startswith("[SEARCH]") and initial_text.endswith("[/SEARCH]"):
-            query = initial_text.split("[SEARCH]")[1].split("[/SEARCH]")[0].strip()
-            context = web_search_ddgs(query)
+        final_text = initial_text
+        tool_call = parse_tool_call(initial_text)
+        if tool_call and tool_call[0] == "[SEARCH]":
+            with metrics.timer('stage_seconds', stage='tool_search'): context = web_search_ddgs(tool_call[1])
             database_handler.add_live_log("IA PENSANDO", f"Contexto da BUSCA retornado para a IA.")
             prompt_parts = ["Com base nos resultados da pesquisa a seguir, formule sua resposta final.", context]
-            response = chat.send_message(prompt_parts, safety_settings=safety_settings)
+            final_text = _send_message(chat, prompt_parts, SentenceStreamer(on_text, STREAM_MIN_CHUNK_CHARS) if stream else None, 'gemini_second')
 
-        elif initial_text.startswith("[READ_URL]") and initial_text.endswith("[/READ_URL]"):
-            url = initial_text.split("[READ_URL]")[1].split("[/READ_URL]")[0].strip()
-            context = read_url_content(url)
+        elif tool_call and tool_call[0] == "[READ_URL]":
+            with metrics.timer('stage_seconds', stage='tool_read_url'): context = read_url_content(tool_call[1])
             database_handler.add_live_log("IA PENSANDO", f"Contexto da LEITURA DE URL retornado para a IA.")
             prompt_parts = ["Você recebeu o conteúdo da página web. Com base neste texto, formule sua resposta final.", context]
-            response = chat.send_message(prompt_parts, safety_settings=safety_settings)
+            final_text = _send_message(chat, prompt_parts, SentenceStreamer(on_text, STREAM_MIN_CHUNK_CHARS) if stream else None, 'gemini_second')
             
-        if not response.parts: return "Minha resposta foi bloqueada por segurança."
-        final_text = response.text.replace('*', '').replace('`', '').strip()
+        if final_text is None: return "Minha resposta foi bloqueada por segurança."
+        final_text = clean_response_text(final_text)
         database_handler.add_live_log("IA PENSANDO", f"Resposta final para o usuário: '{final_text}'")
         return final_text
         
@@ -150,16 +267,36 @@ def summarize_conversation(conversation_history):
     try:
         transcript = "\n".join(f"{msg['role']}: {msg['parts'][0]}" for msg in conversation_history)
         prompt = f"Resuma os pontos principais da conversa a seguir em uma frase impessoal:\n\n{transcript}\n\nResumo:"
-        response = summarizer_model.generate_content(prompt)
+        with metrics.timer('stage_seconds', stage='summarize_conversation'): response = summarizer_model.generate_content(prompt)
+        record_usage('archivist', response)
         return response.text.strip()
     except Exception as e:
         print(f"Erro ao sumarizar conversa: {e}"); return "Erro de sumarização."
 
+def summarize_conversations(conversation_histories: list) -> list:
+    """Resume várias conversas numa só chamada ao arquivista. Retorna um resumo por conversa, na mesma ordem (None se faltar)."""
+    if not conversation_histories: return []
+    if not GEMINI_ENABLED or not summarizer_model: return [None] * len(conversation_histories)
+    try:
+        transcripts = "\n\n".join(f"### Conversa {i}\n" + "\n".join(f"{msg['role']}: {msg['parts'][0]}" for msg in history)
+                                   for i, history in enumerate(conversation_histories, 1))
+        prompt = ("Resuma os pontos principais de cada conversa a seguir em uma frase impessoal. Responda só com um objeto JSON "
+                  "que leve o número de cada conversa ao seu resumo, por exemplo {\"1\": \"...\", \"2\": \"...\"}.\n\n" + transcripts)
+        with metrics.timer('stage_seconds', stage='summarize_conversation_batch'):
+            response = summarizer_model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
+        record_usage('archivist', response)
+        text = response.text.strip()
+        summaries = json.loads(text[text.find('{'):text.rfind('}') + 1])
+        return [str(summaries.get(str(i)) or '').strip() or None for i in range(1, len(conversation_histories) + 1)]
+    except Exception as e:
+        print(f"Erro ao sumarizar conversas em lote: {e}"); return [None] * len(conversation_histories)
+
 def summarize_global_chat(chat_transcript: str) -> str:
     if not GEMINI_ENABLED or not summarizer_model: return "Erro: Modelo arquivista indisponível."
     try:
         prompt = f"A seguir está uma transcrição do chat de uma live. Resuma os eventos, piadas e tópicos mais importantes. Ignore spam.\n\n{chat_transcript}\n\nResumo dos Eventos:"
-        response = summarizer_model.generate_content(prompt)
+        with metrics.timer('stage_seconds', stage='summarize_global'): response = summarizer_model.generate_content(prompt)
+        record_usage('archivist', response)
         return response.text.strip()
     except Exception as e:
         print(f"Erro ao sumarizar chat global: {e}"); return "Erro de sumarização global."
\ No newline at end of file
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import threading
+import time
+
+import metrics
+
+class GlobalSummaryQueue:
+    """Sumariza em segundo plano os buffers globais já selados pelo loop de leitura.
+
+    Cada lote é um dict serializável em JSON ({'label', 'messages', 'transcript', 'metadata', 'sealed_at'}).
+    A thread chama `summarize(transcript) -> resumo ou None` e `save(resumo, metadata) -> bool`,
+    com o 'sealed_at' do lote (hora ISO em que o buffer foi selado) copiado para os metadados;
+    se algum falhar, o lote volta para a fila com espera exponencial (`retry_seconds`,
+    dobrando até `max_retry_seconds`). Depois de `max_attempts` tentativas, ou quando a
+    fila passa de `max_pending` lotes (o mais antigo sai), o lote vai para o diário
+    `journal_path` (JSON Lines), que é recarregado na próxima inicialização.
+    Sem diário configurado, o lote é descartado com log.
+    """
+
+    def __init__(self, summarize, save, journal_path: str = None, max_pending: int = 20, max_attempts: int = 5,
+                 retry_seconds: float = 5.0, max_retry_seconds: float = 300.0, on_event=None):
+        self._summarize, self._save = summarize, save
+        self.journal_path, self.max_pending, self.max_attempts = journal_path, max_pending, max_attempts
+        self.retry_seconds, self.max_retry_seconds = retry_seconds, max_retry_seconds
+        self._on_event = on_event or (lambda message: None)
+        self._pending = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._busy = False
+        self._stats = {"submitted": 0, "saved": 0, "retries": 0, "spilled": 0, "dropped": 0, "replayed": 0}
+        self._replay_journal()
+        self._thread = threading.Thread(target=self._run, name="GlobalSummaryQueue", daemon=True)
+        self._thread.start()
+
+    def submit(self, batch: dict) -> bool:
+        with self._cond:
+            if self._closed: return False
+            self._stats["submitted"] += 1
+            self._pending.append(dict(batch, attempts=batch.get('attempts', 0), next_attempt=0.0))
+            overflow = self._pending[:-self.max_pending] if len(self._pending) > self.max_pending else []
+            del self._pending[:len(overflow)]
+            self._cond.notify()
+        for old in overflow: self._spill(old, "fila de sumarização global cheia")
+        return True
+
+    def _next_ready(self):
+        """Bloqueia até algum lote poder ser tentado. Retorna None ao fechar."""
+        with self._cond:
+            while not self._closed:
+                now = time.monotonic()
+                ready = next((batch for batch in self._pending if batch['next_attempt'] <= now), None)
+                if ready is not None:
+                    self._pending.remove(ready); self._busy = True
+                    return ready
+                wait = min((batch['next_attempt'] for batch in self._pending), default=now + 60) - now
+                self._cond.wait(max(wait, 0.01))
+            return None
+
+    def _run(self):
+        while True:
+            batch = self._next_ready()
+            if batch is None: return
+            try: self._process(batch)
+            except Exception as e:
+                logging.error(f"Erro na sumarização global em segundo plano: {e}", exc_info=True)
+                self._retry(batch)
+            finally:
+                with self._cond: self._busy = False; self._cond.notify_all()
+
+    def _process(self, batch: dict):
+        summary = self._summarize(batch['transcript'])
+        metadata = dict(batch.get('metadata') or {}, sealed_at=batch['sealed_at']) if batch.get('sealed_at') else batch.get('metadata')
+        if not summary or not self._save(summary, metadata):
+            self._retry(batch); return
+        with self._cond: self._stats["saved"] += 1
+        metrics.inc('global_summary_total', result='saved')
+        self._on_event(f"{batch.get('label', '')}Buffer global sumarizado ({batch.get('messages', '?')} mensagens).")
+
+    def _retry(self, batch: dict):
+        batch['attempts'] += 1
+        if batch['attempts'] >= self.max_attempts:
+            self._spill(batch, f"{batch['attempts']} tentativas sem sucesso"); return
+        delay = min(self.retry_seconds * 2 ** (batch['attempts'] - 1), self.max_retry_seconds)
+        with self._cond:
+            if self._closed:
+                spill = True
+            else:
+                spill = False; batch['next_attempt'] = time.monotonic() + delay
+                self._pending.append(batch); self._stats["retries"] += 1; self._cond.notify()
+        if spill: self._spill(batch, "desligando"); return
+        metrics.inc('global_summary_total', result='retry')
+        self._on_event(f"{batch.get('label', '')}Sumarização global falhou (tentativa {batch['attempts']}); nova tentativa em {delay:.0f}s.")
+
+    def _spill(self, batch: dict, reason: str):
+        """Grava o lote no diário local para a próxima inicialização (ou descarta sem diário)."""
+        record = {key: value for key, value in batch.items() if key != 'next_attempt'}
+        record['attempts'] = 0
+        try:
+            if not self.journal_path: raise OSError("diário desativado")
+            with open(self.journal_path, 'a', encoding='utf-8') as journal: journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+            result = "spilled"; message = f"Lote de sumarização global salvo no diário ({reason})."
+        except OSError as e:
+            result = "dropped"; message = f"Lote de sumarização global descartado ({reason}; {e})."
+            logging.error(message)
+        with self._cond: self._stats[result] += 1
+        metrics.inc('global_summary_total', result=result)
+        self._on_event(f"{batch.get('label', '')}{message}")
+
+    def _replay_journal(self):
+        if not self.journal_path or not os.path.exists(self.journal_path): return
+        try:
+            with open(self.journal_path, encoding='utf-8') as journal: lines = journal.read().splitlines()
+            os.remove(self.journal_path)
+        except OSError as e:
+            logging.error(f"Erro ao ler o diário de sumarização global: {e}"); return
+        batches = []
+        for line in lines:
+            try: batches.append(json.loads(line))
+            except ValueError: logging.error(f"Linha inválida no diário de sumarização global: {line[:80]}")
+        # Os mais recentes ficam na fila; o excedente volta direto para o diário.
+        for batch in batches[:-self.max_pending] if len(batches) > self.max_pending else []: self._spill(batch, "fila de sumarização global cheia")
+        for batch in batches[-self.max_pending:]:
+            self._pending.append(dict(batch, attempts=0, next_attempt=0.0)); self._stats["replayed"] += 1
+        if batches: logging.info(f"{len(batches)} lote(s) de sumarização global recuperados do diário.")
+
+    def stats(self) -> dict:
+        with self._cond: return dict(self._stats, queued=len(self._pending) + self._busy)
+
+    def close(self, timeout: float = 30.0):
+        """Para a thread (depois do lote em andamento) e grava no diário o que ainda estava na fila."""
+        with self._cond:
+            self._closed = True; self._cond.notify_all()
+        self._thread.join(timeout)
+        with self._cond: remaining, self._pending = self._pending, []
+        for batch in remaining: self._spill(batch, "desligando")
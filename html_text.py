@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import codecs
+import re
+from html.parser import HTMLParser
+
+# Conteúdo destas tags nunca é texto visível.
+SKIPPED_TAGS = {'script', 'style', 'noscript', 'template', 'svg'}
+# Quantos bytes do início da página são procurados por <meta charset>.
+META_CHARSET_SCAN_BYTES = 4096
+_BOMS = ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'))
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_.:-]+)""", re.IGNORECASE)
+
+def _known(encoding):
+    try: name = codecs.lookup(encoding.decode('ascii') if isinstance(encoding, bytes) else encoding).name
+    except (LookupError, UnicodeDecodeError): return None
+    # Como nos navegadores, páginas "latin-1"/"ascii" são lidas como windows-1252.
+    return 'cp1252' if name in ('iso8859-1', 'ascii') else name
+
+def detect_encoding(head: bytes, declared: str = None) -> str:
+    """Codificação de uma página pelo começo dos bytes, na ordem do navegador.
+
+    BOM, depois o charset do cabeçalho HTTP (`declared`), depois <meta charset> / http-equiv
+    no início do HTML. Sem nada disso, UTF-8 se o começo for UTF-8 válido, senão cp1252.
+    """
+    for bom, encoding in _BOMS:
+        if head.startswith(bom): return encoding
+    encoding = _known(declared) if declared else None
+    if encoding: return encoding
+    match = _META_CHARSET_RE.search(head[:META_CHARSET_SCAN_BYTES])
+    encoding = _known(match.group(1)) if match else None
+    if encoding: return encoding
+    try: head.decode('utf-8'); return 'utf-8'
+    except UnicodeDecodeError as e:
+        # Um caractere cortado no fim do pedaço não conta como UTF-8 inválido.
+        return 'utf-8' if e.start >= len(head) - 3 and e.reason == 'unexpected end of data' else 'cp1252'
+
+class VisibleTextExtractor(HTMLParser):
+    """Extrai o texto visível de um HTML recebido aos pedaços, parando em `max_chars`.
+
+    Cada pedaço de texto vira uma linha (sem espaços nas pontas, quebrando em espaços
+    duplos), como o antigo get_text + splitlines. Depois que `done` fica True, os
+    pedaços seguintes são ignorados, então quem chama pode parar o download.
+    """
+
+    def __init__(self, max_chars: int = 4000):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.done = False
+        self._chunks = []
+        self._length = 0
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS: self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS and self._skip_depth: self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if self.done or self._skip_depth: return
+        for line in data.splitlines():
+            for phrase in line.split("  "):
+                phrase = phrase.strip()
+                if not phrase: continue
+                self._chunks.append(phrase)
+                self._length += len(phrase) + 1
+                if self._length >= self.max_chars:
+                    self.done = True; return
+
+    def feed(self, data):
+        if not self.done: super().feed(data)
+
+    def text(self) -> str:
+        return "\n".join(self._chunks)[:self.max_chars]
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import concurrent.futures
+import logging
+import queue
+import random
+import ssl
+import threading
+
+CONNECT_TIMEOUT_SECONDS = 15.0
+PING_INTERVAL_SECONDS = 60.0
+PONG_TIMEOUT_SECONDS = 15.0
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+MAX_LINE_BYTES = 64 * 1024
+# A Twitch aceita 20 JOINs a cada 10 s por conta (contas comuns).
+JOIN_BATCH_SIZE = 20
+JOIN_BATCH_INTERVAL_SECONDS = 10.5
+
+class _ReconnectRequested(Exception):
+    pass
+
+class TwitchIRCConnection:
+    """Conexão IRC com a Twitch rodando num loop asyncio em thread própria.
+
+    Cuida de conexão, login e JOIN (refeitos a cada reconexão), responde PINGs do servidor,
+    envia PINGs de liveness e reconecta com backoff exponencial com jitter quando a conexão
+    cai, trava ou a Twitch envia RECONNECT. As linhas recebidas vão para a fila thread-safe
+    `inbound` (compartilhada entre várias conexões); `send_line` pode ser chamada de
+    qualquer outra thread.
+    """
+
+    def __init__(self, host: str, port: int, nick: str, token: str, channels: list[str], use_tls: bool = True, on_event=None, max_pending_lines: int = 5000, inbound: queue.Queue = None):
+        self.host, self.port, self.nick, self.token = host, port, nick, token
+        self.channels = list(channels)
+        self.use_tls = use_tls
+        self._on_event = on_event or (lambda message: None)
+        self._lines = inbound if inbound is not None else queue.Queue(maxsize=max_pending_lines)
+        self._connected = threading.Event()
+        self._loop = None
+        self._writer = None
+        self._main_task = None
+        self._thread = None
+        self._stopping = False
+        self._stats = {"connects": 0, "disconnects": 0, "lines_in": 0, "lines_dropped": 0, "lines_out": 0, "last_error": None}
+
+    # --- API usada pelas outras threads ---
+
+    def start(self):
+        self._thread = threading.Thread(target=self._thread_main, name="IRCConnection", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping = True
+        if self._loop and self._main_task: self._loop.call_soon_threadsafe(self._main_task.cancel)
+        if self._thread: self._thread.join(timeout)
+
+    def wait_connected(self, timeout: float = None) -> bool:
+        return self._connected.wait(timeout)
+
+    def send_line(self, line: str, timeout: float = 5.0):
+        """Envia uma linha crua sem esperar reconexão: sem conexão, ou com ela fechando, levanta ConnectionError na hora."""
+        loop = self._loop
+        if not self._connected.is_set() or loop is None: raise ConnectionError("Sem conexão com o IRC da Twitch.")
+        try: written = asyncio.run_coroutine_threadsafe(self._write(line), loop).result(timeout)
+        except (RuntimeError, concurrent.futures.TimeoutError) as e: raise ConnectionError(f"Loop do IRC indisponível: {e}")
+        if not written: raise ConnectionError("Conexão com o IRC fechando; linha não enviada.")
+
+    def stats(self) -> dict:
+        return dict(self._stats, connected=self._connected.is_set(), pending_lines=self._lines.qsize())
+
+    # --- Internos (rodam no loop asyncio) ---
+
+    def _thread_main(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._main_task = self._loop.create_task(self._run_forever())
+        try: self._loop.run_until_complete(self._main_task)
+        except asyncio.CancelledError: pass
+        finally: self._loop.close()
+
+    async def _write(self, line: str) -> bool:
+        if self._writer is None or self._writer.is_closing(): return False
+        self._writer.write(f"{line}\r\n".encode('utf-8'))
+        self._stats["lines_out"] += 1
+        return True
+
+    async def _run_forever(self):
+        attempt = 0
+        while not self._stopping:
+            connects_before = self._stats["connects"]
+            try:
+                await self._session()
+            except _ReconnectRequested:
+                self._on_event("Twitch solicitou RECONNECT. Reconectando...")
+                attempt = 0
+                continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["last_error"] = str(e)
+                self._on_event(f"Conexão com o IRC perdida: {e}")
+                logging.error(f"Conexão com o IRC perdida: {e}")
+            if self._stopping: break
+            if self._stats["connects"] > connects_before: attempt = 0
+            delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+            attempt += 1
+            self._on_event(f"Reconectando ao IRC em {delay:.1f}s (tentativa {attempt}).")
+            await asyncio.sleep(delay)
+
+    async def _session(self):
+        ssl_context = ssl.create_default_context() if self.use_tls else None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ssl_context, limit=MAX_LINE_BYTES), CONNECT_TIMEOUT_SECONDS
+        )
+        self._writer = writer
+        self._last_received = self._loop.time()
+        writer.write(f"PASS {self.token}\r\nNICK {self.nick}\r\n".encode('utf-8'))
+        await writer.drain()
+        liveness = asyncio.ensure_future(self._liveness(writer))
+        joins = asyncio.ensure_future(self._join_channels(writer))
+        try:
+            while True:
+                # readuntil acumula os bytes no buffer interno do StreamReader: linhas parciais
+                # ficam lá até o CRLF chegar, sem concatenação de strings a cada chunk.
+                raw = await reader.readuntil(b'\r\n')
+                self._last_received = self._loop.time()
+                self._handle_line(raw[:-2].decode('utf-8', errors='ignore'), writer)
+        except asyncio.IncompleteReadError:
+            raise ConnectionError("Servidor encerrou a conexão.")
+        finally:
+            liveness.cancel(); joins.cancel()
+            if self._connected.is_set(): self._stats["disconnects"] += 1
+            self._connected.clear(); self._writer = None
+            writer.close()
+
+    def _handle_line(self, line: str, writer):
+        if not line: return
+        if line.startswith('PING'):
+            writer.write(f"PONG{line[4:]}\r\n".encode('utf-8')); return
+        parts = line.split(' ', 2)
+        command = parts[1] if line.startswith(':') and len(parts) > 1 else parts[0]
+        if command == 'PONG': return
+        if command == 'RECONNECT': raise _ReconnectRequested()
+        if command == '001':
+            self._stats["connects"] += 1
+            self._connected.set()
+            self._on_event(f"Conectado ao IRC da Twitch ({self.host}:{self.port}, canais: {', '.join(self.channels)}).")
+        try:
+            self._lines.put_nowait(line); self._stats["lines_in"] += 1
+        except queue.Full:
+            self._stats["lines_dropped"] += 1
+
+    async def _join_channels(self, writer):
+        """Entra nos canais em lotes, respeitando o limite de JOINs da Twitch."""
+        for start in range(0, len(self.channels), JOIN_BATCH_SIZE):
+            if start: await asyncio.sleep(JOIN_BATCH_INTERVAL_SECONDS)
+            batch = self.channels[start:start + JOIN_BATCH_SIZE]
+            writer.write(f"JOIN {','.join('#' + channel for channel in batch)}\r\n".encode('utf-8'))
+
+    async def _liveness(self, writer):
+        """PING próprio quando a conexão fica ociosa; sem resposta a tempo, derruba a conexão para reconectar."""
+        while True:
+            await asyncio.sleep(PING_INTERVAL_SECONDS / 2)
+            if self._loop.time() - self._last_received < PING_INTERVAL_SECONDS: continue
+            sent_at = self._loop.time()
+            writer.write(b"PING :tmi.twitch.tv\r\n")
+            await asyncio.sleep(PONG_TIMEOUT_SECONDS)
+            if self._last_received < sent_at:
+                self._on_event(f"Sem resposta ao PING em {PONG_TIMEOUT_SECONDS:.0f}s. Forçando reconexão.")
+                writer.transport.abort()
+                return
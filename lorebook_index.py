@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import math
+import re
+import threading
+import unicodedata
+
+# Fatos que começam com este marcador entram SEMPRE no prompt (o marcador é removido).
+PINNED_PREFIX = "[FIXO]"
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = set("""
+a ao aos as ate com como da das de dela dele deles do dos e ela elas ele eles em entre era
+essa esse esta estao este eu foi for ha isso isto ja la lhe mais mas me mesmo meu minha muito
+na nas nao nem no nos nossa nosso num numa o os ou para pela pelas pelo pelos por qual quando
+que quem se sem ser seu sua sao so sobre tambem te tem ter teu tua um uma umas uns voce voces
+""".split())
+_TOKEN_RE = re.compile(r"\w+")
+
+def fold_text(text: str) -> str:
+    """Minúsculas e sem acentos ('Ação' -> 'acao')."""
+    normalized = unicodedata.normalize('NFKD', text.lower())
+    return "".join(ch for ch in normalized if not unicodedata.combining(ch))
+
+def tokenize(text: str) -> list[str]:
+    return [tok for tok in _TOKEN_RE.findall(fold_text(text)) if len(tok) > 1 and tok not in STOPWORDS]
+
+def is_pinned(fact: str) -> bool:
+    return fact.lstrip().startswith(PINNED_PREFIX)
+
+def strip_pin(fact: str) -> str:
+    return fact.lstrip()[len(PINNED_PREFIX):].strip() if is_pinned(fact) else fact
+
+class LorebookIndex:
+    """Índice BM25 incremental (lista invertida esparsa) sobre os fatos do lorebook."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._facts = {}      # id -> texto original
+        self._doc_terms = {}  # id -> {termo: frequência}
+        self._postings = {}   # termo -> {id: frequência}
+        self._doc_lengths = {}
+        self._pinned = set()
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._facts)
+
+    def add(self, entry_id, fact: str):
+        with self._lock:
+            self._remove_locked(entry_id)
+            self._facts[entry_id] = fact
+            if is_pinned(fact): self._pinned.add(entry_id); return
+            terms = {}
+            for tok in tokenize(fact): terms[tok] = terms.get(tok, 0) + 1
+            self._doc_terms[entry_id] = terms
+            self._doc_lengths[entry_id] = sum(terms.values())
+            self._total_length += self._doc_lengths[entry_id]
+            for term, freq in terms.items(): self._postings.setdefault(term, {})[entry_id] = freq
+
+    def remove(self, entry_id):
+        with self._lock: self._remove_locked(entry_id)
+
+    def _remove_locked(self, entry_id):
+        if self._facts.pop(entry_id, None) is None: return
+        self._pinned.discard(entry_id)
+        terms = self._doc_terms.pop(entry_id, {})
+        self._total_length -= self._doc_lengths.pop(entry_id, 0)
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(entry_id, None)
+            if not postings: del self._postings[term]
+
+    def sync(self, entries: dict):
+        """Aplica apenas a diferença entre o índice e `entries` (id -> fato)."""
+        for entry_id in [i for i in list(self._facts) if i not in entries]: self.remove(entry_id)
+        for entry_id, fact in entries.items():
+            if self._facts.get(entry_id) != fact: self.add(entry_id, fact)
+
+    def _score(self, query: str) -> dict:
+        n_docs = len(self._doc_terms)
+        if not n_docs: return {}
+        avg_len = self._total_length / n_docs or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings: continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for entry_id, freq in postings.items():
+                norm = freq + BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[entry_id] / avg_len)
+                scores[entry_id] = scores.get(entry_id, 0.0) + idf * freq * (BM25_K1 + 1) / norm
+        return scores
+
+    def pinned(self) -> list[str]:
+        """Fatos fixados (sem o prefixo), em ordem de id."""
+        with self._lock: return [strip_pin(self._facts[i]) for i in sorted(self._pinned)]
+
+    def search(self, query: str, top_k: int = 8, max_chars: int = 1500, include_pinned: bool = True) -> list[str]:
+        """Fatos fixados + os `top_k` fatos mais relevantes para `query`, dentro de `max_chars`.
+
+        Se o lorebook inteiro já cabe no orçamento (descontados os fixados), todos os fatos
+        são retornados. Com `include_pinned=False` os fixados ficam de fora do resultado,
+        mas continuam descontando do orçamento (quem chama os envia por outro caminho).
+        """
+        with self._lock:
+            pinned = [strip_pin(self._facts[i]) for i in sorted(self._pinned)]
+            others = [i for i in self._facts if i not in self._pinned]
+            budget = max_chars - sum(len(f) for f in pinned)
+            if len(others) <= top_k and sum(len(self._facts[i]) for i in others) <= budget:
+                return (pinned if include_pinned else []) + [self._facts[i] for i in others]
+            scores = self._score(query)
+            ranked = sorted(scores, key=lambda i: (-scores[i], i))[:top_k]
+            selected = []
+            for entry_id in ranked:
+                fact = self._facts[entry_id]
+                if len(fact) > budget: continue
+                selected.append(fact); budget -= len(fact)
+            return (pinned if include_pinned else []) + selected
@@ -1,8 +1,8 @@
 # -*- coding: utf-8 -*-
 import os
-import socket
+import queue
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 import threading
 import schedule
 import pytz
@@ -13,217 +13,215 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(threadName)s] - %
 load_dotenv()
 import gemini_handler
 import database_handler
+from worker_pool import KeyedWorkerPool
+from outbound_queue import OutboundChatQueue
+from irc_connection import TwitchIRCConnection
+from channel_context import ChannelContext
+from answer_cache import AnswerCache
+from context_budget import ContextBudget, DEFAULT_CONTEXT_TOKEN_BUDGET, truncate_text
+from context_fetch import ContextFetcher
+from transcript_compaction import compact_transcript
+from conversation_archiver import ConversationArchiver
+from global_summary_queue import GlobalSummaryQueue
+from memory_consolidation import ConsolidationEngine, build_levels
+import metrics
+import status_channel
 
 # --- Configurações & Variáveis Globais ---
 TTV_TOKEN = os.getenv('TTV_TOKEN')
 BOT_NICK = os.getenv('BOT_NICK', 'ai_yuh').lower()
-TTV_CHANNEL = os.getenv('TTV_CHANNEL').lower()
-HOST = "irc.chat.twitch.tv"
-PORT = 6667
+# Um ou mais canais separados por vírgula (TTV_CHANNELS tem precedência sobre TTV_CHANNEL).
+TTV_CHANNELS = [c.strip().lstrip('#').lower() for c in (os.getenv('TTV_CHANNELS') or os.getenv('TTV_CHANNEL') or '').split(',') if c.strip()]
+CHANNELS_PER_CONNECTION = int(os.getenv('TTV_CHANNELS_PER_CONNECTION', 50))
+HOST = os.getenv('TTV_IRC_HOST', "irc.chat.twitch.tv")
+IRC_USE_TLS = os.getenv('TTV_IRC_TLS', 'true').lower() == 'true'
+PORT = int(os.getenv('TTV_IRC_PORT', 6697 if IRC_USE_TLS else 6667))
 BOT_SETTINGS = {}
-LOREBOOK = []
-short_term_memory = {}
-global_chat_buffer = []
-GLOBAL_BUFFER_MAX_MESSAGES = 40
-GLOBAL_BUFFER_MAX_MINUTES = 15
-MEMORY_EXPIRATION_MINUTES = 5
 MAX_HISTORY_LENGTH = 10
 TIMEZONE = pytz.timezone('America/Sao_Paulo')
+ASK_WORKERS = int(os.getenv('ASK_WORKERS', 4))
+ASK_QUEUE_MAX = int(os.getenv('ASK_QUEUE_MAX', 20))
+CHAT_RATE_PROFILE = 'mod' if os.getenv('TTV_BOT_IS_MOD', 'false').lower() == 'true' else 'normal'
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv('ANSWER_CACHE_TTL_SECONDS', 300))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', 256))
+ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY', 0.8))
+# Prazos (s) de cada fonte de contexto do !ask; quem estoura usa o último resultado bom.
+CONTEXT_FETCH_WORKERS = int(os.getenv('CONTEXT_FETCH_WORKERS', 8))
+CONTEXT_TIMEOUT_LOREBOOK = float(os.getenv('CONTEXT_TIMEOUT_LOREBOOK', 1.0))
+CONTEXT_TIMEOUT_PERSONAL = float(os.getenv('CONTEXT_TIMEOUT_PERSONAL', 1.5))
+CONTEXT_TIMEOUT_GLOBAL = float(os.getenv('CONTEXT_TIMEOUT_GLOBAL', 1.5))
+MEMORY_SUMMARY_BATCH_SIZE = int(os.getenv('MEMORY_SUMMARY_BATCH_SIZE', 8))
+MEMORY_SUMMARY_MAX_WAIT_SECONDS = float(os.getenv('MEMORY_SUMMARY_MAX_WAIT_SECONDS', 10))
+ARCHIVER_SHUTDOWN_TIMEOUT_SECONDS = 30.0
+GLOBAL_SUMMARY_MAX_PENDING = int(os.getenv('GLOBAL_SUMMARY_MAX_PENDING', 20))
+GLOBAL_SUMMARY_MAX_ATTEMPTS = int(os.getenv('GLOBAL_SUMMARY_MAX_ATTEMPTS', 5))
+GLOBAL_SUMMARY_RETRY_SECONDS = float(os.getenv('GLOBAL_SUMMARY_RETRY_SECONDS', 5))
+GLOBAL_SUMMARY_JOURNAL = os.getenv('GLOBAL_SUMMARY_JOURNAL', 'global_summary_journal.jsonl')
+CONSOLIDATION_WORKERS = int(os.getenv('CONSOLIDATION_WORKERS', 4))
+CONSOLIDATION_CHUNK_CHARS = int(os.getenv('CONSOLIDATION_CHUNK_CHARS', 12000))
+CHANNELS = {}
+context_fetcher = ContextFetcher(CONTEXT_FETCH_WORKERS)
+answer_cache = AnswerCache(ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_SIMILARITY)
+ask_pool = None
+outbound_queue = None
+conversation_archiver = None
+global_summary_queue = None
+memory_consolidator = None
+irc_connections = []
+connection_by_channel = {}
+inbound_lines = queue.Queue(maxsize=10000)
 
-# Nova variável de estado do bot
-BOT_STATE = 'ASLEEP'
-
-def consolidate_weekly_memories():
-    database_handler.add_live_log("SUMARIZAÇÃO GLOBAL", "Verificando memórias 'daily' para consolidação semanal.")
-    daily_memories = database_handler.get_memories_for_consolidation("daily")
-    if len(daily_memories) < 7:
-        database_handler.add_live_log("STATUS", f"Apenas {len(daily_memories)}/7 memórias diárias. Aguardando.")
-        return
-    memories_to_summarize = daily_memories[:7]
-    database_handler.add_live_log("SUMARIZAÇÃO GLOBAL", "7 memórias diárias encontradas. Sumarizando para memória semanal...")
-    full_text = "\n\n".join([f"Eventos de {datetime.fromisoformat(mem['metadata']['date']).strftime('%A, %d/%m/%Y')}:\n{mem['summary']}" for mem in memories_to_summarize if mem.get('metadata') and mem['metadata'].get('date')])
-    weekly_summary = gemini_handler.summarize_global_chat(f"Resuma os eventos mais importantes da semana a seguir:\n{full_text}")
-    start_date = memories_to_summarize[0]['metadata']['date']
-    end_date = memories_to_summarize[-1]['metadata']['date']
-    metadata = {"start_date": start_date, "end_date": end_date}
-    database_handler.save_hierarchical_memory("weekly", weekly_summary, metadata)
-    ids_to_delete = [mem['id'] for mem in memories_to_summarize]
-    database_handler.delete_memories_by_ids(ids_to_delete)
-    database_handler.add_live_log("MEMÓRIA GLOBAL", "Memória semanal consolidada e memórias diárias limpas.")
-
-def consolidate_monthly_memories():
-    database_handler.add_live_log("SUMARIZAÇÃO GLOBAL", "Verificando memórias 'weekly' para consolidação mensal.")
-    weekly_memories = database_handler.get_memories_for_consolidation("weekly")
-    if len(weekly_memories) < 4:
-        database_handler.add_live_log("STATUS", f"Apenas {len(weekly_memories)}/4 memórias semanais. Aguardando.")
-        return
-    memories_to_summarize = weekly_memories[:4]
-    database_handler.add_live_log("SUMARIZAÇÃO GLOBAL", "4 memórias semanais encontradas. Sumarizando...")
-    full_text = "\n\n".join([f"Resumo da semana de {mem['metadata']['start_date']} a {mem['metadata']['end_date']}:\n{mem['summary']}" for mem in memories_to_summarize if mem.get('metadata') and mem['metadata'].get('start_date')])
-    monthly_summary = gemini_handler.summarize_global_chat(f"Resuma os eventos mais importantes do mês a seguir:\n{full_text}")
-    month_name = datetime.fromisoformat(memories_to_summarize[0]['metadata']['start_date']).strftime('%B de %Y')
-    metadata = {"month": month_name}
-    database_handler.save_hierarchical_memory("monthly", monthly_summary, metadata)
-    ids_to_delete = [mem['id'] for mem in memories_to_summarize]
-    database_handler.delete_memories_by_ids(ids_to_delete)
-    database_handler.add_live_log("MEMÓRIA GLOBAL", "Memória mensal consolidada e memórias semanais limpas.")
-
-def consolidate_yearly_memories():
-    database_handler.add_live_log("SUMARIZAÇÃO GLOBAL", "Verificando memórias 'monthly' para consolidação anual.")
-    monthly_memories = database_handler.get_memories_for_consolidation("monthly")
-    if len(monthly_memories) < 12:
-        database_handler.add_live_log("STATUS", f"Apenas {len(monthly_memories)}/12 memórias mensais. Aguardando.")
-        return
-    memories_to_summarize = monthly_memories[:12]
-    database_handler.add_live_log("SUMARIZAÇÃO GLOBAL", "12 memórias mensais encontradas. Sumarizando...")
-    full_text = "\n\n".join([f"Resumo de {mem['metadata']['month']}:\n{mem['summary']}" for mem in memories_to_summarize if mem.get('metadata') and mem['metadata'].get('month')])
-    year_summary = gemini_handler.summarize_global_chat(f"Resuma os eventos mais importantes do ano a seguir:\n{full_text}")
-    year_number = datetime.now(TIMEZONE).year - 1
-    metadata = {"year": year_number}
-    database_handler.save_hierarchical_memory("yearly", year_summary, metadata)
-    ids_to_delete = [mem['id'] for mem in memories_to_summarize]
-    database_handler.delete_memories_by_ids(ids_to_delete)
-    database_handler.add_live_log("MEMÓRIA GLOBAL", "Memória anual consolidada e memórias mensais limpas.")
-
-def consolidate_secular_memories():
-    database_handler.add_live_log("SUMARIZAÇÃO GLOBAL", "Verificando memórias 'yearly' para consolidação secular.")
-    yearly_memories = database_handler.get_memories_for_consolidation("yearly")
-    if len(yearly_memories) < 100:
-        database_handler.add_live_log("STATUS", f"Apenas {len(yearly_memories)}/100 memórias anuais. Aguardando.")
-        return
-    memories_to_summarize = yearly_memories[:100]
-    database_handler.add_live_log("SUMARIZAÇÃO GLOBAL", "100 memórias anuais encontradas. Sumarizando para memória secular...")
-    full_text = "\n\n".join([f"Resumo do ano {mem['metadata']['year']}:\n{mem['summary']}" for mem in memories_to_summarize if mem.get('metadata') and mem['metadata'].get('year')])
-    century_summary = gemini_handler.summarize_global_chat(f"Resuma os eventos mais importantes do século a seguir:\n{full_text}")
-    start_year = memories_to_summarize[0]['metadata']['year']
-    end_year = memories_to_summarize[-1]['metadata']['year']
-    metadata = {"start_year": start_year, "end_year": end_year}
-    database_handler.save_hierarchical_memory("century", century_summary, metadata)
-    ids_to_delete = [mem['id'] for mem in memories_to_summarize]
-    database_handler.delete_memories_by_ids(ids_to_delete)
-    database_handler.add_live_log("MEMÓRIA GLOBAL", "Memória secular consolidada e memórias anuais limpas.")
+def consolidate_channel_memories(ctx):
+    """Passe de consolidação da memória hierárquica do canal (inclui dias perdidos enquanto dormia), em segundo plano."""
+    if ctx.state == 'ASLEEP': return
+    database_handler.add_live_log("SUMARIZAÇÃO GLOBAL", f"{log_prefix(ctx)}Verificando memórias para consolidação.")
+    memory_consolidator.run_in_background(ctx.memory_scope, log_prefix(ctx), current_key=datetime.now(TIMEZONE).date())
 
 def run_scheduler():
     logging.info("Agendador de memória e tarefas iniciado.")
     database_handler.add_live_log("STATUS", "Agendador iniciado.")
     schedule.every(2).minutes.do(send_heartbeat)
-    schedule.every().day.at("00:15", str(TIMEZONE)).do(consolidate_daily_memories)
-    schedule.every().monday.at("01:00", str(TIMEZONE)).do(consolidate_weekly_memories)
-    schedule.every().day.at("01:30", str(TIMEZONE)).do(consolidate_monthly_memories)
-    schedule.every().day.at("02:00", str(TIMEZONE)).do(consolidate_yearly_memories)
-    schedule.every().day.at("02:30", str(TIMEZONE)).do(consolidate_secular_memories)
+    schedule.every(database_handler.PERMISSION_CACHE_TTL_SECONDS).seconds.do(database_handler.refresh_user_permissions)
+    # Uma única thread atende todos os canais; cada canal tem seus próprios jobs de consolidação.
+    for ctx in CHANNELS.values():
+        schedule.every().day.at("00:15", str(TIMEZONE)).do(consolidate_channel_memories, ctx)
     schedule.every().day.at("03:00", str(TIMEZONE)).do(database_handler.delete_old_logs)
     while True:
         schedule.run_pending()
         time.sleep(1)
 
-def consolidate_daily_memories():
-    if BOT_STATE == 'ASLEEP': return
-    database_handler.add_live_log("SUMARIZAÇÃO GLOBAL", "Verificando memórias 'transfer' para consolidação diária.")
-    today = datetime.now(TIMEZONE).date()
-    yesterday = today - timedelta(days=1)
-    start_of_yesterday = TIMEZONE.localize(datetime.combine(yesterday, datetime.min.time()))
-    end_of_yesterday = TIMEZONE.localize(datetime.combine(yesterday, datetime.max.time()))
-    memories_to_consolidate = database_handler.get_memories_for_consolidation("transfer", start_of_yesterday, end_of_yesterday)
-    if not memories_to_consolidate:
-        database_handler.add_live_log("STATUS", "Nenhuma memória 'transfer' para consolidar hoje.")
-        return
-    database_handler.add_live_log("SUMARIZAÇÃO GLOBAL", f"{len(memories_to_consolidate)} memórias 'transfer' encontradas. Sumarizando...")
-    full_text = "\n\n".join([mem['summary'] for mem in memories_to_consolidate])
-    daily_summary = gemini_handler.summarize_global_chat(f"Resuma os seguintes eventos do dia {yesterday.strftime('%d/%m/%Y')}:\n{full_text}")
-    metadata = {"date": yesterday.isoformat()}
-    database_handler.save_hierarchical_memory("daily", daily_summary, metadata)
-    ids_to_delete = [mem['id'] for mem in memories_to_consolidate]
-    database_handler.delete_memories_by_ids(ids_to_delete)
-    database_handler.add_live_log("MEMÓRIA GLOBAL", "Memória diária consolidada.")
+def publish_status():
+    """Registra no canal local (status_channel) o que o painel mostra ao vivo e abre o socket."""
+    status_channel.provide('canais', lambda: {ctx.name: {'estado': ctx.state, 'memoria_curta': len(ctx.short_term_memory), 'buffer_global': len(ctx.global_chat_buffer)}
+                                              for ctx in CHANNELS.values()})
+    for name, source in (('perguntas', ask_pool), ('saida', outbound_queue), ('contexto', context_fetcher),
+                         ('arquivista', conversation_archiver), ('sumarizacao_global', global_summary_queue)):
+        status_channel.provide(name, source.stats)
+    status_channel.provide('logs', database_handler.get_live_log_stats)
+    status_channel.on_command('invalidate_user_permission', database_handler.invalidate_user_permission)
+    if status_channel.start_status_server(): logging.info(f"Canal de status em {status_channel.STATUS_SOCKET_PATH}")
 
 def send_heartbeat():
-    database_handler.update_bot_status(f"Online ({BOT_STATE})")
+    database_handler.update_bot_status(f"Online ({describe_channel_states()})")
 
-def send_chat_message(sock, message):
+def describe_channel_states() -> str:
+    if len(CHANNELS) == 1: return next(iter(CHANNELS.values())).state
+    return ", ".join(f"#{ctx.name}: {ctx.state}" for ctx in CHANNELS.values())
+
+def log_prefix(ctx) -> str:
+    return f"[#{ctx.name}] " if len(CHANNELS) > 1 else ""
+
+def send_chat_message(ctx, message):
+    """Enfileira a mensagem para o canal na fila de saída e retorna imediatamente."""
+    if not message or not message.strip(): return
     try:
-        if '\n' in message: messages_to_send = message.split('\n')
-        else: messages_to_send = [message]
-        for line in messages_to_send:
-            clean_line = line.strip()
-            if not clean_line: continue
-            sock.send(f"PRIVMSG #{TTV_CHANNEL} :{clean_line}\n".encode('utf-8'))
-            database_handler.add_live_log("CHAT", f"BOT > {clean_line}")
-            time.sleep(1.2)
+        if not outbound_queue.send_chat(ctx.name, message):
+            database_handler.add_live_log("ERRO", f"{log_prefix(ctx)}Fila de saída cheia. Mensagem descartada: {message[:80]}")
     except Exception as e:
         database_handler.add_live_log("ERRO", f"Erro ao enviar msg: {e}")
 
-def summarize_and_clear_global_buffer():
-    global global_chat_buffer
-    if not global_chat_buffer: return
-    database_handler.add_live_log("SUMARIZAÇÃO GLOBAL", f"Sumarizando buffer global com {len(global_chat_buffer)} mensagens.")
-    transcript = "\n".join(f"[{msg['timestamp'].strftime('%H:%M')}] {msg['user']}: {msg['content']}" for msg in global_chat_buffer)
+def route_outbound_line(line):
+    """Entrega uma linha 'PRIVMSG #canal :...' à conexão IRC responsável pelo canal."""
+    channel = line.split(' ', 2)[1].lstrip('#')
+    connection_by_channel[channel].send_line(line)
+
+def log_sent_chat_message(text):
+    database_handler.add_live_log("CHAT", f"BOT > {text}")
+
+def summarize_and_clear_global_buffer(ctx):
+    """Sela o buffer global (o chat continua num buffer novo) e entrega o transcrito para sumarização em segundo plano."""
+    if not ctx.global_chat_buffer: return
+    sealed, ctx.global_chat_buffer = ctx.global_chat_buffer, []
+    transcript, compaction = compact_transcript(sealed)
+    metrics.inc('global_transcript_tokens_total', compaction['tokens_before'], kind='bruto')
+    metrics.inc('global_transcript_tokens_total', compaction['tokens_after'], kind='compactado')
+    database_handler.add_live_log("SUMARIZAÇÃO GLOBAL", f"{log_prefix(ctx)}Buffer global com {len(sealed)} mensagens enviado para sumarização "
+                                  f"({compaction['lines']} linhas, ~{compaction['tokens_before']} → ~{compaction['tokens_after']} tokens).")
+    global_summary_queue.submit({'label': log_prefix(ctx), 'messages': len(sealed), 'transcript': transcript, 'metadata': ctx.memory_metadata(),
+                                 'sealed_at': sealed[-1]['timestamp'].isoformat()})
+
+def summarize_global_transcript(transcript):
     summary = gemini_handler.summarize_global_chat(transcript)
-    database_handler.save_hierarchical_memory("transfer", summary)
-    global_chat_buffer = []
-    database_handler.add_live_log("STATUS", "Buffer global sumarizado e limpo.")
+    return None if summary.startswith("Erro") else summary
+
+def summarize_single_conversation(history):
+    summary = gemini_handler.summarize_conversation(history)
+    return None if summary.startswith("Erro") else summary
+
+def cleanup_inactive_memory(ctx, archive_all: bool = False):
+    """Tira da memória de curto prazo os usuários cujo prazo venceu e manda as conversas para o arquivista.
 
-def cleanup_inactive_memory():
-    if BOT_STATE == 'ASLEEP': return
-    now = datetime.now()
-    inactive_users = [user for user, data in list(short_term_memory.items()) if now - data['last_interaction'] > timedelta(minutes=MEMORY_EXPIRATION_MINUTES)]
-    for user in inactive_users:
-        database_handler.add_live_log("MEMÓRIA PESSOAL", f"Usuário {user} inativo. Sumarizando memória.")
-        user_memory = short_term_memory.pop(user)
-        summary = gemini_handler.summarize_conversation(user_memory['history'])
-        database_handler.save_long_term_memory(user, summary)
+    Com `archive_all` (desligamento) manda todas, vencidas ou não, em qualquer estado.
+    """
+    if ctx.state == 'ASLEEP' and not archive_all: return
+    with ctx.short_term_memory_lock:
+        users = list(ctx.short_term_memory) if archive_all else ctx.short_term_expiry.pop_expired(time.monotonic())
+        for user in users: ctx.short_term_expiry.discard(user)
+        inactive_memories = [(user, ctx.short_term_memory.pop(user)) for user in users if user in ctx.short_term_memory]
+    for user, user_memory in inactive_memories:
+        database_handler.add_live_log("MEMÓRIA PESSOAL", f"{log_prefix(ctx)}Usuário {user} inativo. Memória enviada para sumarização.")
+        conversation_archiver.submit(user, user_memory['history'])
 
-def process_message(sock, raw_message):
-    global BOT_STATE
+def run_channel_maintenance(ctx):
+    """Tarefas periódicas de um canal (memória pessoal expirada e sumarização do buffer global)."""
+    if ctx.state != 'AWAKE': return
+    now = time.time()
+    cleanup_inactive_memory(ctx)
+    if len(ctx.global_chat_buffer) >= ctx.global_buffer_max_messages or now - ctx.last_global_summary > (ctx.global_buffer_max_minutes * 60):
+        summarize_and_clear_global_buffer(ctx); ctx.last_global_summary = now
 
+def process_message(raw_message):
     try:
         if "PRIVMSG" not in raw_message: return
         source, _, message_body = raw_message.partition('PRIVMSG')
         user_info = source.split('!')[0][1:]
-        message_content = message_body.split(':', 1)[1].strip()
+        target, _, message_content = message_body.partition(':')
+        ctx = CHANNELS.get(target.strip().lstrip('#').lower())
+        if ctx is None: return
+        message_content = message_content.strip()
         if user_info.lower() == BOT_NICK: return
         
         user_permission = database_handler.get_user_permission(user_info)
         msg_lower = message_content.lower()
         
-        if BOT_STATE == 'ASLEEP':
+        if ctx.state == 'ASLEEP':
             if user_info.lower() == 'streamelements' and 'a mãe ta oooooooooon!' in msg_lower:
-                BOT_STATE = 'AWAKE'
-                database_handler.add_live_log("STATUS", "Bot ATIVADO pelo anúncio de live.")
-                send_chat_message(sock, "Alerta de live detectado. AI_Yuh ativada e pronta para interagir!")
+                ctx.state = 'AWAKE'
+                database_handler.add_live_log("STATUS", f"{log_prefix(ctx)}Bot ATIVADO pelo anúncio de live.")
+                send_chat_message(ctx, "Alerta de live detectado. AI_Yuh ativada e pronta para interagir!")
+                consolidate_channel_memories(ctx)
                 return
             
             if msg_lower == '!awake' and user_permission == 'master':
-                BOT_STATE = 'AWAKE'
-                database_handler.add_live_log("STATUS", f"Bot ATIVADO manualmente por {user_info}.")
-                send_chat_message(sock, f"Entendido, {user_info}. Ativando sistemas. AI_Yuh está online.")
+                ctx.state = 'AWAKE'
+                database_handler.add_live_log("STATUS", f"{log_prefix(ctx)}Bot ATIVADO manualmente por {user_info}.")
+                send_chat_message(ctx, f"Entendido, {user_info}. Ativando sistemas. AI_Yuh está online.")
+                consolidate_channel_memories(ctx)
                 return
             
             return
 
-        elif BOT_STATE == 'AWAKE':
+        elif ctx.state == 'AWAKE':
             if msg_lower == '!sleep' and user_permission == 'master':
-                BOT_STATE = 'ASLEEP'
-                database_handler.add_live_log("STATUS", f"Bot DESATIVADO manualmente por {user_info}.")
-                send_chat_message(sock, "Entendido. Desativando sistemas e entrando em modo de baixo consumo.")
+                ctx.state = 'ASLEEP'
+                database_handler.add_live_log("STATUS", f"{log_prefix(ctx)}Bot DESATIVADO manualmente por {user_info}.")
+                send_chat_message(ctx, "Entendido. Desativando sistemas e entrando em modo de baixo consumo.")
                 return
 
             if user_permission in ['blacklist', 'bot']:
                 return 
             
-            database_handler.add_live_log("CHAT", f"{user_info}: {message_content}")
-            global_chat_buffer.append({"user": user_info, "content": message_content, "timestamp": datetime.now(TIMEZONE)})
+            database_handler.add_live_log("CHAT", f"{log_prefix(ctx)}{user_info}: {message_content}")
+            ctx.global_chat_buffer.append({"user": user_info, "content": message_content, "timestamp": datetime.now(TIMEZONE)})
             
             learn_command = "!learn "
             if msg_lower.startswith(learn_command):
                 if user_permission == 'master':
                     fact = message_content[len(learn_command):].strip()
                     if fact and database_handler.add_lorebook_entry(fact, user_info):
-                        global LOREBOOK
-                        LOREBOOK = database_handler.get_current_lorebook()
-                        send_chat_message(sock, f"@{user_info} Entendido. Adicionei o fato à minha base de conhecimento.")
-                    else: send_chat_message(sock, f"@{user_info} Tive um problema para aprender isso.")
-                else: send_chat_message(sock, f"Desculpe @{user_info}, apenas mestres podem me ensinar.")
+                        send_chat_message(ctx, f"@{user_info} Entendido. Adicionei o fato à minha base de conhecimento.")
+                    else: send_chat_message(ctx, f"@{user_info} Tive um problema para aprender isso.")
+                else: send_chat_message(ctx, f"Desculpe @{user_info}, apenas mestres podem me ensinar.")
                 return
 
             activation_ask = "!ask "; activation_mention = f"@{BOT_NICK} "
@@ -232,91 +230,186 @@ def process_message(sock, raw_message):
             elif msg_lower.startswith(activation_mention): is_activated=True; question=message_content[len(activation_mention):].strip()
 
             if is_activated and question:
-                current_lorebook = database_handler.get_current_lorebook()
-                long_term_memories = database_handler.search_long_term_memory(user_info)
-                hierarchical_memories = database_handler.search_hierarchical_memory()
-                user_memory = short_term_memory.get(user_info, {"history": []})
-                
-                debug_string = (
-                    f"Usuário: '{user_info}' | Pergunta: '{question[:50]}...'\n"
-                    f"Contextos: Lorebook ({len(current_lorebook)}), Mem. Pessoal ({len(long_term_memories)}), Mem. Global ({len(hierarchical_memories)})"
-                )
-                database_handler.update_bot_debug_status(debug_string)
-                
-                final_response = gemini_handler.generate_interactive_response(
-                    question, user_memory['history'], BOT_SETTINGS, current_lorebook, long_term_memories, hierarchical_memories
-                )
-                
-                send_chat_message(sock, f"@{user_info} {final_response}")
-                
-                user_memory['history'].append({'role': 'user', 'parts': [question]})
-                user_memory['history'].append({'role': 'model', 'parts': [final_response]})
-                user_memory['last_interaction'] = datetime.now()
-                if len(user_memory['history']) > MAX_HISTORY_LENGTH * 2:
-                    user_memory['history'] = user_memory['history'][-MAX_HISTORY_LENGTH*2:]
-                short_term_memory[user_info] = user_memory
+                # A pergunta vai para o pool; o leitor do IRC volta imediatamente para o socket.
+                if not ask_pool.submit(f"{ctx.name}:{user_info}", handle_question, ctx, user_info, question):
+                    database_handler.add_live_log("ERRO", f"{log_prefix(ctx)}Fila de perguntas cheia. Pergunta de {user_info} descartada. {ask_pool.stats()}")
+                    send_chat_message(ctx, f"@{user_info} Estou com muitas perguntas agora, tente de novo em instantes.")
                 
     except Exception as e:
         database_handler.add_live_log("ERRO", f"Erro em process_message: {e}")
         logging.error(f"Erro em process_message: {e}", exc_info=True)
 
-def listen_for_messages(sock):
-    buffer = ""; last_cleanup = time.time(); last_global_summary = time.time()
+def build_context_budget(ctx, history, lorebook, long_term_memories, hierarchical_memories):
+    """Registra as fontes de contexto em ordem de prioridade, cada uma do item mais para o menos valioso."""
+    budget = ContextBudget(int(ctx.settings.get('context_token_budget') or DEFAULT_CONTEXT_TOKEN_BUDGET), ctx.settings.get('context_budget_shares'))
+    budget.add('lorebook', lorebook, truncate=truncate_text)
+    # Histórico em pares pergunta/resposta, do mais recente para o mais antigo; pares nunca são cortados.
+    pairs = [history[i:i + 2] for i in range(0, len(history), 2)][::-1]
+    budget.add('history', pairs, text=lambda pair: " ".join(str(turn['parts'][0]) for turn in pair))
+    budget.add('personal', long_term_memories, truncate=truncate_text)
+    budget.add('global', hierarchical_memories, text=lambda mem: mem.get('summary') or "",
+               truncate=lambda mem, max_tokens: dict(mem, summary=truncate_text(mem.get('summary') or "", max_tokens)))
+    return budget
+
+def handle_question(ctx, user_info, question):
+    """Executada no pool de perguntas: busca contexto, consulta a IA e responde no chat."""
+    started = time.perf_counter()
+    try:
+        # Os fatos fixados já vão no prefixo estável do prompt (gemini_handler.build_prompt_prefix).
+        lorebook_args = (question, int(ctx.settings.get('lorebook_top_k', 8)), int(ctx.settings.get('lorebook_max_chars', 1500)))
+        context, context_status = context_fetcher.fetch({
+            'lorebook': (lambda: database_handler.search_lorebook(*lorebook_args, include_pinned=False), CONTEXT_TIMEOUT_LOREBOOK, ('lorebook', question), []),
+            'personal': (lambda: database_handler.search_long_term_memory(user_info), CONTEXT_TIMEOUT_PERSONAL, ('personal', user_info), []),
+            'global': (lambda: database_handler.search_hierarchical_memory(channel=ctx.memory_scope), CONTEXT_TIMEOUT_GLOBAL, ('global', ctx.memory_scope), []),
+        })
+        current_lorebook, long_term_memories, hierarchical_memories = context['lorebook'], context['personal'], context['global']
+        metrics.observe('stage_seconds', time.perf_counter() - started, stage='ask_context')
+        # O prazo é renovado já aqui para o usuário não expirar (e ser arquivado) enquanto a pergunta é respondida.
+        with ctx.short_term_memory_lock:
+            user_history = list(ctx.short_term_memory.get(user_info, {"history": []})['history'])
+            ctx.short_term_expiry.touch(user_info, time.monotonic() + ctx.memory_expiration_minutes * 60)
+        
+        # Respostas em cache só valem para o mesmo canal, lorebook e memórias globais. Quem tem
+        # histórico de curto prazo recebe sempre uma resposta nova (conversa personalizada).
+        context_version = (ctx.name, database_handler.get_lorebook_version(), hash(tuple(mem.get('summary') for mem in hierarchical_memories)))
+        cached_response = answer_cache.get(question, context_version) if not user_history else None
+        # Com respostas em stream (gemini_handler.STREAM_RESPONSES) as frases já vão saindo aqui.
+        streamed_parts = []
+        def send_streamed_part(text):
+            if not streamed_parts: metrics.observe('stage_seconds', time.perf_counter() - started, stage='ask_first_text')
+            send_chat_message(ctx, text if streamed_parts else f"@{user_info} {text}"); streamed_parts.append(text)
+        
+        budget = build_context_budget(ctx, user_history, current_lorebook, long_term_memories, hierarchical_memories)
+        selected = budget.assemble()
+        
+        debug_string = (
+            f"{log_prefix(ctx)}Usuário: '{user_info}' | Pergunta: '{question[:50]}...'\n"
+            f"Contextos: {budget.summary()}\n"
+            f"Busca de contexto: {context_status}\n"
+            f"Cache de respostas: {'ACERTO' if cached_response is not None else 'ERRO'} {answer_cache.stats()}"
+        )
+        database_handler.post_bot_debug_status(debug_string)
+        
+        if cached_response is not None:
+            database_handler.add_live_log("IA PENSANDO", f"Resposta reaproveitada do cache para: '{question}'")
+            final_response = cached_response
+            metrics.inc('asks_total', source='cache')
+        else:
+            history = [turn for pair in reversed(selected['history']) for turn in pair]
+            final_response = gemini_handler.generate_interactive_response(
+                question, history, ctx.settings, selected['lorebook'], selected['personal'], selected['global'], on_text=send_streamed_part
+            )
+            # Só respostas sem memórias pessoais no prompt podem ser servidas a outros usuários.
+            if not user_history and not long_term_memories and final_response not in gemini_handler.FALLBACK_RESPONSES:
+                answer_cache.put(question, context_version, final_response)
+            metrics.inc('asks_total', source='model')
+        
+        if not streamed_parts: send_streamed_part(final_response)
+        metrics.observe('stage_seconds', time.perf_counter() - started, stage='ask_total')
+        
+        with ctx.short_term_memory_lock:
+            user_memory = ctx.short_term_memory.setdefault(user_info, {"history": []})
+            user_memory['history'].append({'role': 'user', 'parts': [question]})
+            user_memory['history'].append({'role': 'model', 'parts': [final_response]})
+            user_memory['last_interaction'] = datetime.now()
+            if len(user_memory['history']) > MAX_HISTORY_LENGTH * 2:
+                user_memory['history'] = user_memory['history'][-MAX_HISTORY_LENGTH*2:]
+            ctx.short_term_expiry.touch(user_info, time.monotonic() + ctx.memory_expiration_minutes * 60)
+    
+    except Exception as e:
+        database_handler.add_live_log("ERRO", f"Erro em handle_question: {e}")
+        logging.error(f"Erro em handle_question: {e}", exc_info=True)
+
+def listen_for_messages(lines: queue.Queue):
     while True:
         try:
-            now = time.time()
-            if BOT_STATE == 'AWAKE' and now - last_cleanup > 60:
-                cleanup_inactive_memory(); last_cleanup = now
-            if BOT_STATE == 'AWAKE' and (len(global_chat_buffer) >= GLOBAL_BUFFER_MAX_MESSAGES or now - last_global_summary > (GLOBAL_BUFFER_MAX_MINUTES * 60)):
-                summarize_and_clear_global_buffer(); last_global_summary = now
+            for ctx in CHANNELS.values(): run_channel_maintenance(ctx)
             
-            buffer += sock.recv(4096).decode('utf-8', errors='ignore')
-            messages = buffer.split('\r\n'); buffer = messages.pop()
-            for raw_message in messages:
-                if not raw_message: continue
-                if raw_message.startswith('PING'):
-                    sock.send("PONG :tmi.twitch.tv\r\n".encode('utf-8'))
-                    continue
-                process_message(sock, raw_message)
-        except socket.timeout: continue
+            # PING/PONG, RECONNECT e reconexões ficam a cargo das conexões; aqui só chegam as demais linhas.
+            try: raw_message = lines.get(timeout=1.0)
+            except queue.Empty: continue
+            with metrics.timer('stage_seconds', stage='process_message'): process_message(raw_message)
         except Exception as e:
             database_handler.add_live_log("ERRO", f"Erro no loop de escuta: {e}")
             logging.error(f"Erro no loop de escuta: {e}")
-            time.sleep(15)
+            time.sleep(1)
+
+def setup_channels(channels: list[str], settings: dict):
+    """Cria os contextos de canal e distribui os canais entre conexões IRC (CHANNELS_PER_CONNECTION por conexão)."""
+    multi_channel = len(channels) > 1
+    for name in channels:
+        CHANNELS[name] = ChannelContext(name, settings, memory_scope=name if multi_channel else None)
+    for start in range(0, len(channels), CHANNELS_PER_CONNECTION):
+        shard = channels[start:start + CHANNELS_PER_CONNECTION]
+        connection = TwitchIRCConnection(
+            HOST, PORT, BOT_NICK, TTV_TOKEN, shard, IRC_USE_TLS, inbound=inbound_lines,
+            on_event=lambda message: database_handler.add_live_log("STATUS", message)
+        )
+        irc_connections.append(connection)
+        for name in shard: connection_by_channel[name] = connection
 
 def main():
-    global BOT_SETTINGS, LOREBOOK, BOT_STATE
-    BOT_SETTINGS, LOREBOOK = database_handler.load_initial_data()
+    global BOT_SETTINGS, ask_pool, outbound_queue, conversation_archiver, global_summary_queue, memory_consolidator
+    if not TTV_CHANNELS:
+        logging.critical("Nenhum canal configurado (TTV_CHANNEL/TTV_CHANNELS)."); return
+    BOT_SETTINGS, _ = database_handler.load_initial_data()
     if not BOT_SETTINGS:
         logging.critical("Não foi possível carregar as configs do bot."); return
     gemini_handler.load_models_from_settings(BOT_SETTINGS)
     if not gemini_handler.GEMINI_ENABLED or not database_handler.DB_ENABLED:
         logging.critical("Módulos essenciais falharam."); return
     
+    setup_channels(TTV_CHANNELS, BOT_SETTINGS)
+    if metrics.start_metrics_server(): logging.info(f"Métricas em http://{metrics.METRICS_HOST}:{metrics.METRICS_PORT}/metrics")
     scheduler_thread = threading.Thread(target=run_scheduler, name="SchedulerThread", daemon=True)
     scheduler_thread.start()
-    
-    sock = socket.socket()
-    sock.settimeout(60.0)
+    ask_pool = KeyedWorkerPool("AskWorker", ASK_WORKERS, ASK_QUEUE_MAX)
+    outbound_queue = OutboundChatQueue(route_outbound_line, CHAT_RATE_PROFILE, on_sent=log_sent_chat_message)
+    conversation_archiver = ConversationArchiver(
+        gemini_handler.summarize_conversations, database_handler.save_long_term_memories, summarize_single_conversation,
+        MEMORY_SUMMARY_BATCH_SIZE, MEMORY_SUMMARY_MAX_WAIT_SECONDS, on_event=lambda message: database_handler.add_live_log("MEMÓRIA PESSOAL", message)
+    )
+    global_summary_queue = GlobalSummaryQueue(
+        summarize_global_transcript, lambda summary, metadata: database_handler.save_hierarchical_memory("transfer", summary, metadata),
+        GLOBAL_SUMMARY_JOURNAL or None, GLOBAL_SUMMARY_MAX_PENDING, GLOBAL_SUMMARY_MAX_ATTEMPTS, GLOBAL_SUMMARY_RETRY_SECONDS,
+        on_event=lambda message: database_handler.add_live_log("SUMARIZAÇÃO GLOBAL", message)
+    )
+    memory_consolidator = ConsolidationEngine(
+        build_levels(TIMEZONE), lambda level, scope: database_handler.get_memories_for_consolidation(level, channel=scope),
+        database_handler.save_hierarchical_memory, database_handler.delete_memories_by_ids, summarize_global_transcript,
+        CONSOLIDATION_WORKERS, CONSOLIDATION_CHUNK_CHARS, on_event=lambda message: database_handler.add_live_log("MEMÓRIA GLOBAL", message)
+    )
+    publish_status()
     try:
-        database_handler.add_live_log("STATUS", "Conectando ao IRC da Twitch...")
-        sock.connect((HOST, PORT))
-        sock.send(f"PASS {TTV_TOKEN}\n".encode('utf-8'))
-        sock.send(f"NICK {BOT_NICK}\n".encode('utf-8'))
-        sock.send(f"JOIN #{TTV_CHANNEL}\n".encode('utf-8'))
-        database_handler.add_live_log("STATUS", "Conectado. Entrando em modo de baixo consumo.")
-        time.sleep(2)
-        BOT_STATE = 'ASLEEP'
-        database_handler.update_bot_status(f"Online ({BOT_STATE})")
-        send_chat_message(sock, f"AI_Yuh (v3.5.2-stable) em modo de espera.")
-        listen_for_messages(sock)
+        database_handler.add_live_log("STATUS", f"Conectando ao IRC da Twitch ({len(CHANNELS)} canal(is), {len(irc_connections)} conexão(ões))...")
+        for connection in irc_connections: connection.start()
+        if not all(connection.wait_connected(timeout=30) for connection in irc_connections):
+            database_handler.add_live_log("ERRO", "IRC ainda não conectou; seguindo e aguardando a reconexão automática.")
+        database_handler.add_live_log("STATUS", "Entrando em modo de baixo consumo.")
+        database_handler.update_bot_status(f"Online ({describe_channel_states()})")
+        for ctx in CHANNELS.values(): send_chat_message(ctx, f"AI_Yuh (v3.5.2-stable) em modo de espera.")
+        listen_for_messages(inbound_lines)
     except Exception as e:
         database_handler.add_live_log("ERRO", f"Erro fatal na conexão: {e}")
         logging.critical(f"Erro fatal na conexão: {e}", exc_info=True)
     finally:
-        database_handler.add_live_log("STATUS", "Desligando...")
+        database_handler.add_live_log("STATUS", f"Desligando... Pool de perguntas: {ask_pool.stats()} | Contexto: {context_fetcher.stats()}")
+        ask_pool.shutdown()
+        context_fetcher.shutdown()
+        # Conversas ainda na memória de curto prazo viram memória pessoal antes de sair.
+        for ctx in CHANNELS.values(): cleanup_inactive_memory(ctx, archive_all=True)
+        if not conversation_archiver.flush(ARCHIVER_SHUTDOWN_TIMEOUT_SECONDS):
+            database_handler.add_live_log("ERRO", f"Arquivista não terminou em {ARCHIVER_SHUTDOWN_TIMEOUT_SECONDS:.0f}s; conversas pendentes serão perdidas.")
+        conversation_archiver.close(timeout=5)
+        global_summary_queue.close()
+        memory_consolidator.shutdown()
+        database_handler.add_live_log("STATUS", f"Arquivista: {conversation_archiver.stats()} | Sumarização global: {global_summary_queue.stats()}")
+        database_handler.add_live_log("STATUS", f"Fila de saída: {outbound_queue.stats()} | IRC: {[c.stats() for c in irc_connections]}")
+        outbound_queue.close()
+        for connection in irc_connections: connection.stop()
         database_handler.update_bot_status("Offline")
-        sock.close()
+        status_channel.stop_status_server()
+        database_handler.flush_live_logs()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
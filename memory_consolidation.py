@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import metrics
+
+class ConsolidationLevel:
+    """Uma linha da tabela de consolidação: memórias `source` viram uma memória `target`.
+
+    Os grupos são formados por `group_key(memória)` (ex.: dia local em que o buffer foi selado; só grupos
+    com chave diferente da atual estão fechados) ou, sem ela, em blocos de `group_size`
+    memórias na ordem de criação (só blocos completos). `format_item` monta o texto de cada
+    memória no prompt e `metadata(grupo)` os metadados da memória gerada.
+    """
+
+    def __init__(self, source: str, target: str, prompt: str, format_item, metadata, group_size: int = None, group_key=None):
+        self.source, self.target, self.prompt = source, target, prompt
+        self.format_item, self.metadata = format_item, metadata
+        self.group_size, self.group_key = group_size, group_key
+
+def _meta(memory: dict) -> dict:
+    return memory.get('metadata') or {}
+
+def _format_date(value: str) -> str:
+    try: return datetime.fromisoformat(value).strftime('%A, %d/%m/%Y')
+    except (TypeError, ValueError): return str(value)
+
+def _year_of(memory: dict):
+    value = str(_meta(memory).get('start_date') or _meta(memory).get('month') or '')
+    digits = value[:4] if value[:4].isdigit() else value[-4:]
+    return int(digits) if digits.isdigit() else None
+
+def build_levels(timezone) -> list:
+    """Tabela padrão: transfer → daily (por dia) → weekly (7) → monthly (4) → yearly (12) → century (100)."""
+    def local_date(memory):
+        # Dia em que o buffer foi selado, não o do salvamento: um lote que ficou na fila de
+        # retentativas ou no diário até depois da meia-noite continua no dia em que aconteceu.
+        return datetime.fromisoformat(_meta(memory).get('sealed_at') or memory['created_at']).astimezone(timezone).date()
+    return [
+        ConsolidationLevel(
+            "transfer", "daily", "Resuma os seguintes eventos do dia {label}:",
+            lambda mem: mem['summary'],
+            lambda group, key: {"date": key.isoformat()},
+            group_key=local_date),
+        ConsolidationLevel(
+            "daily", "weekly", "Resuma os eventos mais importantes da semana a seguir:",
+            lambda mem: f"Eventos de {_format_date(_meta(mem).get('date'))}:\n{mem['summary']}" if _meta(mem).get('date') else mem['summary'],
+            lambda group, key: {"start_date": _meta(group[0]).get('date'), "end_date": _meta(group[-1]).get('date')},
+            group_size=7),
+        ConsolidationLevel(
+            "weekly", "monthly", "Resuma os eventos mais importantes do mês a seguir:",
+            lambda mem: f"Resumo da semana de {_meta(mem)['start_date']} a {_meta(mem).get('end_date')}:\n{mem['summary']}" if _meta(mem).get('start_date') else mem['summary'],
+            lambda group, key: {"month": datetime.fromisoformat(_meta(group[0])['start_date']).strftime('%B de %Y') if _meta(group[0]).get('start_date') else None,
+                                "start_date": _meta(group[0]).get('start_date')},
+            group_size=4),
+        ConsolidationLevel(
+            "monthly", "yearly", "Resuma os eventos mais importantes do ano a seguir:",
+            lambda mem: f"Resumo de {_meta(mem)['month']}:\n{mem['summary']}" if _meta(mem).get('month') else mem['summary'],
+            lambda group, key: {"year": _year_of(group[0]) or datetime.now(timezone).year - 1},
+            group_size=12),
+        ConsolidationLevel(
+            "yearly", "century", "Resuma os eventos mais importantes do século a seguir:",
+            lambda mem: f"Resumo do ano {_meta(mem)['year']}:\n{mem['summary']}" if _meta(mem).get('year') else mem['summary'],
+            lambda group, key: {"start_year": _meta(group[0]).get('year'), "end_year": _meta(group[-1]).get('year')},
+            group_size=100),
+    ]
+
+class ConsolidationEngine:
+    """Consolida a memória hierárquica seguindo uma tabela de níveis, com map-reduce em partes.
+
+    Um passe percorre os níveis em ordem e fecha todos os grupos prontos de cada um (dias
+    ou blocos perdidos enquanto o bot dormia entram no mesmo passe, e o que sai de um nível
+    já conta para o seguinte). O texto de um grupo é cortado em partes de até `chunk_chars`
+    caracteres, resumidas em paralelo; os resumos parciais são juntados de novo em partes
+    até sobrar um só (parciais grandes demais para encolher são cortados, nunca se manda
+    mais que uma parte por chamada).
+
+    Checkpoint: a memória gerada leva em `metadata['source_ids']` os ids de origem e é
+    gravada antes de apagar as origens. Se o processo cair entre as duas etapas, o passe
+    seguinte só apaga as origens já cobertas, sem resumir de novo. Grupos cujo resumo falha
+    ficam intactos para o próximo passe.
+
+    Funções injetadas: `fetch(nível, canal) -> [memórias]`, `save(nível, resumo, metadata) -> bool`,
+    `delete(ids)`, `summarize(prompt) -> resumo ou None`.
+    """
+
+    def __init__(self, levels: list, fetch, save, delete, summarize, max_workers: int = 4,
+                 chunk_chars: int = 12000, on_event=None):
+        self.levels = levels
+        self._fetch, self._save, self._delete, self._summarize = fetch, save, delete, summarize
+        self.chunk_chars = chunk_chars
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="consolidation")
+        self._on_event = on_event or (lambda message: None)
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def run_in_background(self, scope=None, prefix: str = "", current_key=None) -> bool:
+        """Dispara um passe numa thread própria; ignora se já houver um passe do mesmo escopo rodando."""
+        with self._lock:
+            if scope in self._running: return False
+            self._running.add(scope)
+        def run():
+            try: self.run(scope, prefix, current_key)
+            except Exception as e: logging.error(f"Erro na consolidação de memórias: {e}", exc_info=True)
+            finally:
+                with self._lock: self._running.discard(scope)
+        threading.Thread(target=run, name="ConsolidationPass", daemon=True).start()
+        return True
+
+    def run(self, scope=None, prefix: str = "", current_key=None) -> dict:
+        """Um passe completo. `current_key` é a chave do grupo ainda aberto (ex.: hoje). Retorna memórias geradas por nível."""
+        created = {}
+        for level in self.levels:
+            count = self._consolidate_level(level, scope, prefix, current_key)
+            if count: created[level.target] = count
+        return created
+
+    def _consolidate_level(self, level: ConsolidationLevel, scope, prefix: str, current_key) -> int:
+        sources = self._fetch(level.source, scope)
+        if not sources: return 0
+        covered = {i for mem in self._fetch(level.target, scope) for i in (_meta(mem).get('source_ids') or [])}
+        already_done = [mem['id'] for mem in sources if mem['id'] in covered]
+        if already_done:
+            self._delete(already_done)
+            self._on_event(f"{prefix}{len(already_done)} memória(s) '{level.source}' já consolidadas em '{level.target}' foram limpas.")
+        groups = self._groups(level, [mem for mem in sources if mem['id'] not in covered], current_key)
+        if not groups: return 0
+        self._on_event(f"{prefix}{len(groups)} grupo(s) de memórias '{level.source}' para consolidar em '{level.target}'.")
+        created = 0
+        for key, group in groups:
+            label = key.strftime('%d/%m/%Y') if hasattr(key, 'strftime') else key
+            summary = self._map_reduce(level.prompt.format(label=label), [level.format_item(mem) for mem in group])
+            if not summary:
+                self._on_event(f"{prefix}Falha ao resumir {len(group)} memória(s) '{level.source}'; ficam para o próximo passe.")
+                metrics.inc('consolidation_total', level=level.target, result='failed'); continue
+            metadata = dict(level.metadata(group, key), source_ids=[mem['id'] for mem in group])
+            if scope: metadata['channel'] = scope
+            if not self._save(level.target, summary, metadata):
+                metrics.inc('consolidation_total', level=level.target, result='failed'); continue
+            self._delete([mem['id'] for mem in group])
+            metrics.inc('consolidation_total', level=level.target, result='saved'); created += 1
+        if created: self._on_event(f"{prefix}{created} memória(s) '{level.target}' consolidada(s).")
+        return created
+
+    @staticmethod
+    def _groups(level: ConsolidationLevel, memories: list, current_key) -> list:
+        if level.group_key:
+            groups = {}
+            for mem in memories:
+                try: key = level.group_key(mem)
+                except (KeyError, TypeError, ValueError): continue
+                groups.setdefault(key, []).append(mem)
+            return [(key, group) for key, group in sorted(groups.items()) if key != current_key]
+        size = level.group_size
+        return [(None, memories[start:start + size]) for start in range(0, len(memories) - size + 1, size)]
+
+    def _chunks(self, texts: list) -> list:
+        chunks, current, length = [], [], 0
+        for text in texts:
+            if current and length + len(text) > self.chunk_chars:
+                chunks.append(current); current, length = [], 0
+            current.append(text); length += len(text) + 2
+        if current: chunks.append(current)
+        return chunks
+
+    def _map_reduce(self, prompt: str, texts: list):
+        chunks = self._chunks(texts)
+        if len(chunks) == 1: return self._summarize(f"{prompt}\n" + "\n\n".join(chunks[0]))
+        total = len(chunks)
+        partials = list(self._executor.map(
+            lambda item: self._summarize(f"{prompt} (parte {item[0]} de {total})\n" + "\n\n".join(item[1])), enumerate(chunks, 1)))
+        if not all(partials): return None
+        reduce_prompt = f"Junte os resumos parciais a seguir num único resumo. {prompt}"
+        # Se os parciais não couberem em menos partes que antes, cada um é cortado em meia parte:
+        # cabem dois por chamada, o número de partes cai pela metade e nenhuma chamada leva mais que `chunk_chars` de texto.
+        if len(self._chunks(partials)) >= total: partials = [partial[:self.chunk_chars // 2 - 2] for partial in partials]
+        return self._map_reduce(reduce_prompt, partials)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Métricas do bot em memória (histogramas de latência por etapa e contadores), expostas em
+# texto Prometheus em /metrics e com p50/p95 já calculados em /metrics.json (usado pelo painel).
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9108))  # 0 desativa o servidor
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PREFIX = "ai_yuh"
+# Limites (s) dos baldes: de alguns ms (cache, memória) a dezenas de s (IA + busca + fila de envio).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # último balde = +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1; self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimativa por interpolação linear dentro do balde (como o histogram_quantile do Prometheus)."""
+        if not self.count: return 0.0
+        rank, seen = q * self.count, 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if i == len(self.buckets): return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+class MetricsRegistry:
+    """Registro thread-safe: `observe`/`inc` custam um lock e poucas somas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (nome, labels ordenados) -> Histogram
+        self._counters = {}    # (nome, labels ordenados) -> valor
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None: histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock: self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        started = time.perf_counter()
+        try: yield
+        finally: self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            histograms = [
+                dict(name=name, labels=dict(labels), count=h.count, sum=round(h.sum, 4),
+                     p50=round(h.quantile(0.5), 4), p95=round(h.quantile(0.95), 4))
+                for (name, labels), h in sorted(self._histograms.items())
+            ]
+            counters = [dict(name=name, labels=dict(labels), value=value) for (name, labels), value in sorted(self._counters.items())]
+        return {"histograms": histograms, "counters": counters}
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {METRICS_PREFIX}_{name} histogram")
+                for (metric, labels), h in sorted(self._histograms.items()):
+                    if metric != name: continue
+                    cumulative = 0
+                    for bound, bucket_count in zip(list(h.buckets) + ["+Inf"], h.counts):
+                        cumulative += bucket_count
+                        lines.append(f"{METRICS_PREFIX}_{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{METRICS_PREFIX}_{name}_sum{_labels(labels)} {h.sum}")
+                    lines.append(f"{METRICS_PREFIX}_{name}_count{_labels(labels)} {h.count}")
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {METRICS_PREFIX}_{name} counter")
+                for (metric, labels), value in sorted(self._counters.items()):
+                    if metric == name: lines.append(f"{METRICS_PREFIX}_{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+def _labels(labels) -> str:
+    if not labels: return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+registry = MetricsRegistry()
+observe, inc, timer = registry.observe, registry.inc, registry.timer
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = registry.render_prometheus().encode('utf-8'), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(registry.snapshot()).encode('utf-8'), "application/json"
+        else:
+            self.send_error(404); return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """Sobe o endpoint de métricas numa thread de fundo. Retorna o servidor, ou None se desativado/falhar."""
+    if not port: return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logging.error(f"Não foi possível abrir o endpoint de métricas em {host}:{port}: {e}"); return None
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+from collections import deque
+
+import metrics
+
+TWITCH_MAX_MESSAGE_LENGTH = 500
+# Limites de envio da Twitch (mensagens por janela de 30 s) e intervalo mínimo entre mensagens.
+RATE_LIMITS = {
+    'normal': {'messages': 20, 'per_seconds': 30.0, 'min_interval': 1.0},
+    'mod': {'messages': 100, 'per_seconds': 30.0, 'min_interval': 0.0},
+}
+
+def split_message(text: str, limit: int = TWITCH_MAX_MESSAGE_LENGTH) -> list[str]:
+    """Quebra `text` em pedaços de até `limit` caracteres, preferindo limites de palavra."""
+    chunks = []
+    text = " ".join(text.split())
+    while len(text) > limit:
+        cut = text.rfind(" ", 0, limit + 1)
+        if cut <= 0: cut = limit
+        chunks.append(text[:cut].strip()); text = text[cut:].strip()
+    if text: chunks.append(text)
+    return chunks
+
+def coalesce_lines(lines: list[str], limit: int = TWITCH_MAX_MESSAGE_LENGTH) -> list[str]:
+    """Junta linhas curtas consecutivas (separadas por espaço) enquanto couberem em `limit`."""
+    messages = []
+    for line in lines:
+        for chunk in split_message(line, limit):
+            if messages and len(messages[-1]) + 1 + len(chunk) <= limit: messages[-1] += " " + chunk
+            else: messages.append(chunk)
+    return messages
+
+class OutboundChatQueue:
+    """Fila de saída do chat com uma única thread escritora e limitador token bucket.
+
+    Quem chama apenas enfileira e retorna; as mensagens saem na ordem de chegada, dentro do
+    limite da Twitch do perfil escolhido. PONG e JOIN não passam por aqui: a conexão
+    (irc_connection) os escreve direto, fora do limite de chat.
+
+    Se `write_line` levanta ConnectionError (conexão do canal caída), a linha volta para a
+    fila e o canal fica parado por `retry_seconds`; os outros canais continuam saindo e a
+    ordem dentro do canal é mantida. A linha é descartada se passar de `max_age_seconds`.
+    """
+
+    def __init__(self, write_line, profile: str = 'normal', max_queue: int = 200, max_age_seconds: float = 120.0, on_sent=None,
+                 retry_seconds: float = 2.0):
+        limits = RATE_LIMITS.get(profile, RATE_LIMITS['normal'])
+        self._write_line = write_line
+        self._on_sent = on_sent
+        self._capacity = float(limits['messages'])
+        self._refill_per_second = limits['messages'] / limits['per_seconds']
+        self._min_interval = limits['min_interval']
+        self._tokens = self._capacity
+        self._last_refill = time.monotonic()
+        self._last_chat_sent = 0.0
+        self._max_queue = max_queue
+        self._max_age = max_age_seconds
+        self._retry_seconds = retry_seconds
+        self._pending = deque()
+        self._blocked_until = {}  # canal -> instante em que volta a tentar
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stats = {"enqueued": 0, "sent": 0, "dropped_full": 0, "dropped_stale": 0, "errors": 0, "retried": 0,
+                       "latency_last": 0.0, "latency_max": 0.0, "latency_total": 0.0}
+        self._thread = threading.Thread(target=self._run, name="OutboundChat", daemon=True)
+        self._thread.start()
+
+    def send_chat(self, channel: str, message: str) -> int:
+        """Divide/agrupa `message` e enfileira as linhas PRIVMSG. Retorna quantas foram aceitas."""
+        accepted = 0
+        for text in coalesce_lines(message.split('\n')):
+            if self._put(channel, f"PRIVMSG #{channel} :{text}", text): accepted += 1
+        return accepted
+
+    def _put(self, channel: str, line: str, text: str) -> bool:
+        with self._cond:
+            if self._closed: return False
+            if len(self._pending) >= self._max_queue:
+                self._stats["dropped_full"] += 1; return False
+            self._pending.append((time.monotonic(), channel, line, text))
+            self._stats["enqueued"] += 1
+            self._cond.notify()
+            return True
+
+    def _refill(self, now: float):
+        self._tokens = min(self._capacity, self._tokens + (now - self._last_refill) * self._refill_per_second)
+        self._last_refill = now
+
+    def _next_item(self):
+        """Bloqueia até haver uma linha liberada pelo limitador. Retorna None ao fechar com a fila vazia."""
+        with self._cond:
+            while True:
+                if not self._pending:
+                    if self._closed: return None
+                    self._cond.wait(); continue
+                now = time.monotonic()
+                # Primeira linha de um canal que não está esperando nova tentativa.
+                index, wake_at = None, None
+                for i, (_, channel, _, _) in enumerate(self._pending):
+                    blocked_until = self._blocked_until.get(channel, 0.0)
+                    if blocked_until <= now: index = i; break
+                    wake_at = blocked_until if wake_at is None else min(wake_at, blocked_until)
+                if index is None:
+                    self._cond.wait(wake_at - now); continue
+                if now - self._pending[index][0] > self._max_age:
+                    del self._pending[index]; self._stats["dropped_stale"] += 1; continue
+                self._refill(now)
+                wait = max(self._min_interval - (now - self._last_chat_sent), 0.0)
+                if self._tokens < 1: wait = max(wait, (1 - self._tokens) / self._refill_per_second)
+                if wait <= 0:
+                    self._tokens -= 1; self._last_chat_sent = now
+                    item = self._pending[index]; del self._pending[index]
+                    return item
+                self._cond.wait(wait)
+
+    def _run(self):
+        while True:
+            item = self._next_item()
+            if item is None: return
+            enqueued_at, channel, line, text = item
+            try:
+                self._write_line(line)
+            except ConnectionError as e:
+                with self._cond:
+                    self._stats["errors"] += 1; self._stats["retried"] += 1
+                    self._blocked_until[channel] = time.monotonic() + self._retry_seconds
+                    self._pending.appendleft(item); self._cond.notify()
+                metrics.inc('outbound_errors_total', kind='retry')
+                logging.warning(f"Linha para #{channel} não enviada ({e}); nova tentativa em {self._retry_seconds:g}s."); continue
+            except Exception as e:
+                metrics.inc('outbound_errors_total', kind='dropped')
+                with self._cond: self._stats["errors"] += 1
+                logging.error(f"Erro ao enviar linha para o IRC: {e}"); continue
+            latency = time.monotonic() - enqueued_at
+            with self._cond:
+                self._stats["sent"] += 1; self._stats["latency_last"] = latency
+                self._stats["latency_total"] += latency
+                self._stats["latency_max"] = max(self._stats["latency_max"], latency)
+            metrics.observe('stage_seconds', latency, stage='outbound_wait')
+            if self._on_sent: self._on_sent(text)
+
+    def stats(self) -> dict:
+        """Contadores da fila, profundidade atual e latência de fila (última, média e máxima, em segundos)."""
+        with self._cond:
+            stats = dict(self._stats, queued=len(self._pending))
+        stats["latency_avg"] = stats.pop("latency_total") / stats["sent"] if stats["sent"] else 0.0
+        return stats
+
+    def close(self, timeout: float = 10.0):
+        """Para de aceitar linhas e aguarda até `timeout` segundos para esvaziar a fila."""
+        with self._cond:
+            self._closed = True; self._cond.notify_all()
+        self._thread.join(timeout)
@@ -1,62 +1,94 @@
 # -*- coding: utf-8 -*-
+import os
 import streamlit as st
 import pandas as pd
+import requests
 from dotenv import load_dotenv
 from datetime import datetime
 
 load_dotenv()
-from database_handler import supabase_client, DB_ENABLED, delete_lorebook_entry, get_live_logs
+from metrics import METRICS_HOST, METRICS_PORT
+from database_handler import storage, DB_ENABLED, add_lorebook_entry, delete_lorebook_entry, get_live_logs, set_user_permission
+from panel_data import IncrementalTable, LiveLogTail
+from status_channel import read_status
+
+PANEL_PAGE_SIZE = int(os.getenv('PANEL_PAGE_SIZE', 100))
+PANEL_LOG_REFRESH_SECONDS = float(os.getenv('PANEL_LOG_REFRESH_SECONDS', 7))
+PANEL_LOG_LINES = int(os.getenv('PANEL_LOG_LINES', 150))
 
 st.set_page_config(page_title="Painel AI_Yuh", page_icon="🤖", layout="wide")
 
 @st.cache_data(ttl=10)
 def get_bot_status():
     try:
-        response = supabase_client.table('bot_status').select("status_value").eq("id", 1).single().execute()
-        return response.data.get('status_value', 'Desconhecido')
+        return storage.get_bot_status(1) or 'Desconhecido'
     except Exception: return "Desconhecido"
 
 @st.cache_data(ttl=10)
 def get_bot_debug_status():
     try:
-        response = supabase_client.table('bot_status').select("status_value").eq("id", 23).single().execute()
-        return response.data.get('status_value', 'Aguardando depuração...')
+        return storage.get_bot_status(23) or 'Aguardando depuração...'
     except Exception: return "Aguardando depuração..."
     
+@st.cache_data(ttl=10)
+def get_bot_metrics():
+    """Snapshot do endpoint de métricas do bot (mesma máquina). None se o bot não estiver respondendo."""
+    try: return requests.get(f"http://{METRICS_HOST}:{METRICS_PORT}/metrics.json", timeout=1).json()
+    except Exception: return None
+
 @st.cache_data(ttl=60)
 def get_settings():
-    try: return supabase_client.table('settings').select("*").limit(1).single().execute().data
+    try: return storage.get_settings()
     except Exception as e: st.error(f"Erro ao carregar configs: {e}"); return None
 
-@st.cache_data(ttl=60)
-def get_users():
-    try: return pd.DataFrame(supabase_client.table('users').select("*").order("twitch_username").execute().data)
-    except Exception as e: st.error(f"Erro ao carregar usuários: {e}"); return pd.DataFrame()
-
-@st.cache_data(ttl=60)
-def get_lorebook():
-    try: return pd.DataFrame(supabase_client.table('lorebook').select("*").order("created_at", desc=True).execute().data)
-    except Exception as e: st.error(f"Erro ao carregar lorebook: {e}"); return pd.DataFrame()
-
-@st.cache_data(ttl=300)
-def get_long_term_memory():
-    try: return pd.DataFrame(supabase_client.table('long_term_memory').select("*").order("created_at", desc=True).limit(100).execute().data)
-    except Exception as e: st.error(f"Erro ao carregar memória pessoal: {e}"); return pd.DataFrame()
-    
-@st.cache_data(ttl=300)
-def get_hierarchical_memory():
-    try: return pd.DataFrame(supabase_client.table('hierarchical_memory').select("*").order("created_at", desc=True).limit(100).execute().data)
-    except Exception as e: st.error(f"Erro ao carregar memória hierárquica: {e}"); return pd.DataFrame()
-
-st.title("🤖 Painel de Controle do AI_Yuh Bot")
-if not DB_ENABLED: st.error("ERRO GRAVE: Não foi possível conectar ao Supabase."); st.stop()
-
-with st.container(border=True):
-    st.subheader("Atividade ao Vivo e Status")
-    
+def table_view(table: str, columns: str, refresh_seconds: float, **options) -> IncrementalTable:
+    """Janela incremental compartilhada entre as sessões do painel (só as colunas que a tela mostra)."""
+    return IncrementalTable(lambda cols, limit, desc, after: storage.list_page(table, cols, limit, desc, after),
+                            columns, PANEL_PAGE_SIZE, refresh_seconds, **options)
+
+@st.cache_resource
+def get_table_views() -> dict:
+    return {
+        'users': table_view('users', "twitch_username, permission_level", 60, key='twitch_username', incremental=False),
+        'lorebook': table_view('lorebook', "id, entry, created_by, created_at", 60),
+        'long_term_memory': table_view('long_term_memory', "id, username, summary, created_at", 300),
+        'hierarchical_memory': table_view('hierarchical_memory', "id, memory_level, summary, metadata, created_at", 300),
+    }
+
+def load_table(name: str) -> pd.DataFrame:
+    try: return get_table_views()[name].refresh()
+    except Exception as e: st.error(f"Erro ao carregar {name}: {e}"); return pd.DataFrame()
+
+def load_more_button(name: str):
+    view = get_table_views()[name]
+    if view.has_more and st.button("Carregar mais", key=f"more_{name}"):
+        try: view.load_more(); st.rerun()
+        except Exception as e: st.error(f"Erro ao carregar mais linhas: {e}")
+
+def invalidate_tables():
+    st.cache_data.clear()
+    for view in get_table_views().values(): view.invalidate()
+
+LOG_GROUPS = {
+    'system': ({'CHAT', 'IA PENSANDO'}, True, True),
+    'ai': ({'IA PENSANDO'}, False, False),
+    'chat': ({'CHAT'}, False, False),
+}
+
+def describe_queues(queues: dict) -> str:
+    channels = queues.get('canais') or {}
+    parts = [f"#{name}: {info['estado']}, {info['memoria_curta']} em memória, buffer {info['buffer_global']}" for name, info in channels.items()]
+    parts += [f"{name}: {stats.get('queued', '?')} na fila" for name, stats in queues.items() if name != 'canais' and isinstance(stats, dict)]
+    return " | ".join(parts)
+
+@st.fragment(run_every=PANEL_LOG_REFRESH_SECONDS)
+def live_activity():
+    """Só este trecho roda a cada PANEL_LOG_REFRESH_SECONDS; o resto do painel não é recarregado."""
+    # Com o bot na mesma máquina, tudo vem do canal local; sem ele, do banco.
+    live = read_status()
     col_status, col_debug = st.columns(2)
     with col_status:
-        bot_status = get_bot_status()
+        bot_status = live.get('status') if live else get_bot_status()
         status_text = bot_status or "Desconhecido"
         status_color = "gray"
         if "AWAKE" in status_text:
@@ -66,35 +98,52 @@ with st.container(border=True):
         elif "Offline" in status_text:
             status_color = "red"
         st.markdown(f"**Status do Bot:** <span style='color:{status_color}; font-weight:bold;'>{status_text}</span>", unsafe_allow_html=True)
+        if live: st.caption(describe_queues(live['queues']))
     
     with col_debug:
-        debug_status = get_bot_debug_status()
-        st.text_area("Última Ação da IA", debug_status, height=100, disabled=True, key="debug_status")
+        debug_status = (live.get('debug') or "Aguardando depuração...") if live else get_bot_debug_status()
+        st.text_area("Última Ação da IA", debug_status, height=100, disabled=True)
 
-    log_entries = get_live_logs(limit=150)
-    
-    system_logs = [log for log in log_entries if log.get('log_type') not in ['CHAT', 'IA PENSANDO']]
-    ai_thinking_logs = [log for log in log_entries if log.get('log_type') == 'IA PENSANDO']
-    chat_logs = [log for log in log_entries if log.get('log_type') == 'CHAT']
+    # Uma cauda por origem: os ids do canal local recomeçam a cada execução do bot.
+    if live: tail_key, fetch = f"live_log_tail_{live['boot_id']}", lambda limit, after_id: (read_status(limit, after_id) or {}).get('events', [])
+    else: tail_key, fetch = "live_log_tail", get_live_logs
+    if tail_key not in st.session_state:
+        st.session_state[tail_key] = LiveLogTail(fetch, LOG_GROUPS, PANEL_LOG_LINES)
+    tail = st.session_state[tail_key]
+    tail.poll()
 
     col1, col2, col3 = st.columns(3)
 
     with col1:
         st.markdown("##### ⚙️ Logs do Sistema")
-        system_content = "\n".join([f"{pd.to_datetime(log['created_at']).tz_convert('America/Sao_Paulo').strftime('%H:%M:%S')} {log['log_type']}: {log['message']}" for log in system_logs])
-        st.text_area("System Logs", system_content, height=300, disabled=True, key="system_logs")
+        st.text_area("System Logs", tail.text('system'), height=300, disabled=True)
 
     with col2:
         st.markdown("##### 🧠 Pensamento da IA")
-        ai_content = "\n".join([f"{pd.to_datetime(log['created_at']).tz_convert('America/Sao_Paulo').strftime('%H:%M:%S')} {log['message']}" for log in ai_thinking_logs])
-        st.text_area("AI Thinking", ai_content, height=300, disabled=True, key="ai_thinking")
+        st.text_area("AI Thinking", tail.text('ai'), height=300, disabled=True)
 
     with col3:
         st.markdown("##### 💬 Chat Processado")
-        chat_content = "\n".join([f"{pd.to_datetime(log['created_at']).tz_convert('America/Sao_Paulo').strftime('%H:%M:%S')} {log['message']}" for log in chat_logs])
-        st.text_area("Chat", chat_content, height=300, disabled=True, key="chat_logs")
+        st.text_area("Chat", tail.text('chat'), height=300, disabled=True)
+
+st.title("🤖 Painel de Controle do AI_Yuh Bot")
+if not DB_ENABLED: st.error("ERRO GRAVE: Não foi possível conectar ao banco de dados."); st.stop()
 
-    st.html("<meta http-equiv='refresh' content='7'>")
+with st.container(border=True):
+    st.subheader("Atividade ao Vivo e Status")
+    live_activity()
+
+with st.expander("📈 Latência por Etapa"):
+    bot_metrics = get_bot_metrics()
+    if not bot_metrics: st.info(f"Métricas indisponíveis (o bot expõe em {METRICS_HOST}:{METRICS_PORT} quando está rodando).")
+    else:
+        stages = [h for h in bot_metrics['histograms'] if h['name'] == 'stage_seconds']
+        if stages:
+            st.dataframe(pd.DataFrame([{"Etapa": h['labels'].get('stage'), "Amostras": h['count'], "p50 (s)": h['p50'], "p95 (s)": h['p95']} for h in stages]), hide_index=True)
+        tokens = {f"{c['labels'].get('model')} / {c['labels'].get('kind')}": c['value'] for c in bot_metrics['counters'] if c['name'] == 'gemini_tokens_total'}
+        if tokens:
+            token_cols = st.columns(len(tokens))
+            for col, (label, value) in zip(token_cols, tokens.items()): col.metric(f"Tokens {label}", f"{int(value):,}".replace(',', '.'))
 
 settings = get_settings()
 if settings:
@@ -116,11 +165,11 @@ if settings:
                 top_k = st.number_input("🎯 Top-K", 1, value=int(settings.get('top_k', 1)), step=1)
             if st.form_submit_button("Salvar Configurações Gerais", type="primary"):
                 try:
-                    supabase_client.table('settings').update({
+                    storage.update_settings(settings['id'], {
                         'personality_prompt': personality, 'lorebook_prompt': lorebook_header,
                         'interaction_model': interaction_model, 'archivist_model': archivist_model,
                         'temperature': temp, 'top_p': top_p, 'top_k': top_k, 'max_output_tokens': max_tokens
-                    }).eq('id', settings['id']).execute()
+                    })
                     st.success("Configurações Gerais salvas!"); st.cache_data.clear(); st.rerun()
                 except Exception as e: st.error(f"Erro: {e}")
 
@@ -132,13 +181,13 @@ if settings:
             with col3: glob_max_min = st.number_input("Gatilho Sumarização (min)", value=int(settings.get('global_buffer_max_minutes', 15)), min_value=1)
             if st.form_submit_button("Salvar Configurações de Memória"):
                 try:
-                    supabase_client.table('settings').update({'memory_expiration_minutes': mem_exp, 'global_buffer_max_messages': glob_max_msg, 'global_buffer_max_minutes': glob_max_min}).eq('id', settings['id']).execute()
+                    storage.update_settings(settings['id'], {'memory_expiration_minutes': mem_exp, 'global_buffer_max_messages': glob_max_msg, 'global_buffer_max_minutes': glob_max_min})
                     st.success("Configurações de Memória salvas!"); st.cache_data.clear()
                 except Exception as e: st.error(f"Erro: {e}")
 
 with st.expander("👥 Gerenciar Usuários"):
-    users_df = get_users()
-    if not users_df.empty: st.dataframe(users_df)
+    users_df = load_table('users')
+    if not users_df.empty: st.dataframe(users_df, hide_index=True); load_more_button('users')
     else: st.info("Nenhum usuário encontrado.")
     st.subheader("Adicionar ou Atualizar Usuário")
     with st.form("user_form", clear_on_submit=True):
@@ -147,13 +196,13 @@ with st.expander("👥 Gerenciar Usuários"):
         if st.form_submit_button("Salvar Usuário"):
             if username:
                 try:
-                    supabase_client.table('users').upsert({'twitch_username': username, 'permission_level': permission}).execute()
-                    st.success(f"Usuário '{username}' salvo como '{permission}'."); st.cache_data.clear(); st.rerun()
+                    set_user_permission(username, permission)
+                    st.success(f"Usuário '{username}' salvo como '{permission}'."); invalidate_tables(); st.rerun()
                 except Exception as e: st.error(f"Erro ao salvar usuário: {e}")
             else: st.warning("O nome de usuário não pode estar vazio.")
 
 with st.expander("📚 Gerenciar Lorebook", expanded=True):
-    lorebook_df = get_lorebook()
+    lorebook_df = load_table('lorebook')
     if not lorebook_df.empty:
         lorebook_df['delete'] = False
         edited_df = st.data_editor(lorebook_df, hide_index=True, column_config={"delete": st.column_config.CheckboxColumn("Apagar?", default=False)})
@@ -161,38 +210,37 @@ with st.expander("📚 Gerenciar Lorebook", expanded=True):
             entries_to_delete = edited_df[edited_df['delete']]
             if not entries_to_delete.empty:
                 for entry_id in entries_to_delete['id']: delete_lorebook_entry(entry_id)
-                st.success(f"{len(entries_to_delete)} entrada(s) deletada(s)!"); st.cache_data.clear(); st.rerun()
+                get_table_views()['lorebook'].drop(entries_to_delete['id'])
+                st.success(f"{len(entries_to_delete)} entrada(s) deletada(s)!"); st.rerun()
             else: st.warning("Nenhuma entrada selecionada para deletar.")
+        load_more_button('lorebook')
     else: st.info("Nenhum fato no Lorebook.")
     st.subheader("Adicionar Novo Fato")
     with st.form("lorebook_form", clear_on_submit=True):
-        entry = st.text_area("Fato a ser lembrado", height=100)
+        entry = st.text_area("Fato a ser lembrado", height=100, help="Comece o fato com [FIXO] para que ele seja enviado à IA em todas as perguntas.")
         author = st.text_input("Autor", value="painel_admin")
         if st.form_submit_button("Adicionar Fato"):
             if entry:
-                try:
-                    supabase_client.table('lorebook').insert({'entry': entry, 'created_by': author}).execute()
-                    st.success("Fato adicionado!"); st.cache_data.clear(); st.rerun()
-                except Exception as e: st.error(f"Erro ao adicionar fato: {e}")
+                if add_lorebook_entry(entry, author):
+                    st.success("Fato adicionado!"); invalidate_tables(); st.rerun()
+                else: st.error("Erro ao adicionar fato. Verifique os logs.")
             else: st.warning("O fato não pode estar vazio.")
 
 with st.expander("🧠 Visualizar Memória Pessoal"):
     st.markdown("Resumos de conversas diretas entre o bot e usuários.")
-    memory_df = get_long_term_memory()
+    memory_df = load_table('long_term_memory')
     if not memory_df.empty:
-        memory_df['created_at'] = pd.to_datetime(memory_df['created_at']).dt.strftime('%Y-%m-%d %H:%M:%S')
-        st.dataframe(memory_df, height=600)
+        st.dataframe(memory_df, height=600, hide_index=True); load_more_button('long_term_memory')
     else: st.info("Nenhuma memória pessoal encontrada.")
 
 with st.expander("🌍 Visualizar Memória Global"):
     st.markdown("Resumos generativos sobre os acontecimentos do chat.")
-    hier_mem_df = get_hierarchical_memory()
+    hier_mem_df = load_table('hierarchical_memory')
     if not hier_mem_df.empty:
-        hier_mem_df['created_at'] = pd.to_datetime(hier_mem_df['created_at']).dt.strftime('%Y-%m-%d %H:%M:%S')
-        st.dataframe(hier_mem_df, height=600)
+        st.dataframe(hier_mem_df, height=600, hide_index=True); load_more_button('hierarchical_memory')
     else: st.info("Nenhuma memória hierárquica encontrada.")
 
 st.sidebar.header("Ações Rápidas")
 if st.sidebar.button("Forçar Recarga do Painel"):
-    st.cache_data.clear()
+    invalidate_tables()
     st.rerun()
\ No newline at end of file
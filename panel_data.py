@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+
+PANEL_TIMEZONE = 'America/Sao_Paulo'
+
+def format_timestamps(values, fmt: str = '%Y-%m-%d %H:%M:%S', timezone: str = PANEL_TIMEZONE) -> pd.Series:
+    """Converte uma coluna de datas ISO (UTC) para texto no fuso do painel, de uma vez só."""
+    return pd.to_datetime(pd.Series(values), utc=True, format='ISO8601').dt.tz_convert(timezone).dt.strftime(fmt)
+
+def _plain(value):
+    """Escalar do pandas/numpy como tipo Python (o sqlite3 não aceita numpy.int64 como parâmetro)."""
+    return value.item() if hasattr(value, 'item') else value
+
+class IncrementalTable:
+    """Janela das linhas mais recentes de uma tabela, carregada por páginas e atualizada aos poucos.
+
+    `fetch_page(colunas, limite, desc, after)` é o storage.list_page da tabela, paginada pela
+    coluna `key`. A primeira carga traz `page_size` linhas; depois, cada `refresh` (no máximo
+    a cada `refresh_seconds`) só busca as linhas com chave maior que a última vista e as junta
+    no DataFrame já formatado. `load_more` pagina para trás a partir da menor chave carregada.
+    Como edições e exclusões feitas fora do painel não aparecem nessa busca, a janela inteira
+    é recarregada a cada `resync_seconds` (o custo continua proporcional ao que está
+    carregado, não à tabela).
+
+    Com `incremental=False` (chave que não cresce com o tempo, ex.: nome de usuário) a
+    janela fica em ordem crescente da chave, `load_more` avança nessa ordem e cada `refresh`
+    recarrega a janela.
+    """
+
+    def __init__(self, fetch_page, columns: str, page_size: int = 100, refresh_seconds: float = 30.0,
+                 resync_seconds: float = 300.0, timestamp_column: str = 'created_at', key: str = 'id', incremental: bool = True):
+        self._fetch_page = fetch_page
+        self.key, self.incremental = key, incremental
+        self.columns, self.page_size = columns, page_size
+        self.refresh_seconds, self.resync_seconds = refresh_seconds, resync_seconds
+        self.timestamp_column = timestamp_column
+        self.frame = pd.DataFrame(columns=[c.strip() for c in columns.split(',')])
+        self.has_more = True
+        self._lock = threading.Lock()
+        self._last_refresh = self._last_resync = float('-inf')
+
+    def _prepare(self, rows: list) -> pd.DataFrame:
+        frame = pd.DataFrame(rows, columns=self.frame.columns)
+        if self.timestamp_column in frame and not frame.empty:
+            frame[self.timestamp_column] = format_timestamps(frame[self.timestamp_column]).values
+        return frame
+
+    def refresh(self) -> pd.DataFrame:
+        """DataFrame atual (cópia), mais recentes primeiro."""
+        with self._lock:
+            now = time.monotonic()
+            resync_seconds = self.resync_seconds if self.incremental else self.refresh_seconds
+            if now - self._last_resync > resync_seconds: self._reload(); self._last_resync = self._last_refresh = now
+            elif now - self._last_refresh > self.refresh_seconds: self._fetch_newer(); self._last_refresh = now
+            return self.frame.copy()
+
+    def _reload(self):
+        limit = max(self.page_size, len(self.frame))
+        rows = self._fetch_page(self.columns, limit, self.incremental, None)
+        self.frame, self.has_more = self._prepare(rows), len(rows) >= limit
+
+    def _fetch_newer(self):
+        if self.frame.empty: self._reload(); return
+        newest, pages = _plain(self.frame[self.key].max()), []
+        while True:
+            rows = self._fetch_page(self.columns, self.page_size, False, newest)
+            if rows: pages.append(self._prepare(rows[::-1])); newest = rows[-1][self.key]
+            if len(rows) < self.page_size: break
+        if pages: self.frame = pd.concat(pages[::-1] + [self.frame], ignore_index=True)
+
+    def load_more(self) -> int:
+        """Carrega a próxima página (linhas mais antigas, ou as próximas chaves sem `incremental`). Retorna quantas vieram."""
+        with self._lock:
+            last = _plain(self.frame[self.key].min() if self.incremental else self.frame[self.key].max()) if not self.frame.empty else None
+            rows = self._fetch_page(self.columns, self.page_size, self.incremental, last)
+            if rows: self.frame = pd.concat([self.frame, self._prepare(rows)], ignore_index=True)
+            self.has_more = len(rows) >= self.page_size
+            return len(rows)
+
+    def drop(self, ids):
+        """Tira do DataFrame linhas apagadas pelo próprio painel (sem recarregar)."""
+        with self._lock: self.frame = self.frame[~self.frame[self.key].isin(list(ids))].reset_index(drop=True)
+
+    def invalidate(self):
+        """Força recarregar a janela no próximo `refresh` (ex.: depois de editar pelo painel)."""
+        with self._lock: self._last_resync = float('-inf')
+
+class LiveLogTail:
+    """Cauda dos live_logs por sessão do painel: cada `poll` busca só as linhas com id maior que o último visto.
+
+    `fetch(limit, after_id)` é o database_handler.get_live_logs. As linhas já formatadas vão
+    para um buffer circular por grupo, com no máximo `max_lines` linhas cada, mais novas
+    primeiro. `groups`: nome -> (log_types, excluir, mostrar o tipo) — com `excluir` o grupo
+    recebe os tipos que NÃO estão em `log_types`. Se vier uma página cheia (o painel ficou
+    para trás), a cauda recomeça das últimas `max_lines` linhas em vez de paginar o atraso.
+    """
+
+    def __init__(self, fetch, groups: dict, max_lines: int = 150):
+        self._fetch, self.groups, self.max_lines = fetch, groups, max_lines
+        self.buffers = {name: deque(maxlen=max_lines) for name in groups}
+        self.last_id = None
+
+    def poll(self) -> int:
+        """Busca e distribui as linhas novas. Retorna quantas chegaram."""
+        rows = self._fetch(self.max_lines, self.last_id)
+        if self.last_id is None: rows = rows[::-1]
+        elif len(rows) >= self.max_lines:
+            for buffer in self.buffers.values(): buffer.clear()
+            rows = self._fetch(self.max_lines, None)[::-1]
+        if not rows: return 0
+        frame = pd.DataFrame(rows, columns=['id', 'log_type', 'message', 'created_at'])
+        frame['time'] = format_timestamps(frame['created_at'], '%H:%M:%S').values
+        frame['line'] = frame['time'] + " " + frame['log_type'].fillna('') + ": " + frame['message'].fillna('')
+        frame['short_line'] = frame['time'] + " " + frame['message'].fillna('')
+        for name, (log_types, exclude, show_type) in self.groups.items():
+            matched = frame[frame['log_type'].isin(log_types) != exclude]
+            self.buffers[name].extendleft(matched['line' if show_type else 'short_line'])
+        self.last_id = int(frame['id'].iloc[-1])
+        return len(frame)
+
+    def text(self, name: str) -> str:
+        return "\n".join(self.buffers[name])
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import datetime
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import google.generativeai as genai
+from google.generativeai import caching
+
+# Um CachedContent é recriado este tanto antes do fim do TTL, para nenhuma pergunta usar um cache apagado.
+CACHE_REFRESH_MARGIN_SECONDS = 120
+
+def is_missing_cache_error(error: Exception) -> bool:
+    """Erro da API por CachedContent inexistente (expirado ou removido do lado do Gemini)."""
+    message = str(error).lower()
+    return 'cachedcontent' in message.replace(' ', '') or ('cache' in message and ('not found' in message or 'expired' in message))
+
+class SystemInstructionBackend:
+    """Envia o prefixo como system_instruction do modelo (funciona com qualquer tamanho de prefixo)."""
+    name = "system_instruction"
+
+    def create(self, model_name: str, prefix: str):
+        return genai.GenerativeModel(model_name=model_name, system_instruction=prefix)
+
+    def release(self, model):
+        pass
+
+    def expires_at(self, model):
+        """Instante (time.monotonic) a partir do qual o modelo deve ser recriado; None se não expira."""
+        return None
+
+class CachedContentBackend(SystemInstructionBackend):
+    """Cria um CachedContent no Gemini para o prefixo; se a API recusar (ex.: prefixo abaixo do
+    mínimo de tokens do cache), cai para system_instruction."""
+    name = "cached_content"
+
+    def __init__(self, ttl_minutes: int = 60):
+        self.ttl = datetime.timedelta(minutes=ttl_minutes)
+        self._cached_contents = {}
+
+    def create(self, model_name: str, prefix: str):
+        try:
+            cached = caching.CachedContent.create(
+                model=model_name if model_name.startswith("models/") else f"models/{model_name}",
+                display_name="ai_yuh_prefix", system_instruction=prefix, ttl=self.ttl
+            )
+            model = genai.GenerativeModel.from_cached_content(cached_content=cached)
+            expires_at = time.monotonic() + max(self.ttl.total_seconds() - CACHE_REFRESH_MARGIN_SECONDS, self.ttl.total_seconds() / 2)
+            self._cached_contents[id(model)] = (cached, expires_at)
+            return model
+        except Exception as e:
+            logging.info(f"Cache de contexto do Gemini indisponível ({e}); usando system_instruction.")
+            return super().create(model_name, prefix)
+
+    def expires_at(self, model):
+        entry = self._cached_contents.get(id(model))
+        return entry[1] if entry else None
+
+    def release(self, model):
+        cached, _ = self._cached_contents.pop(id(model), (None, None))
+        if cached is None: return
+        try: cached.delete()
+        except Exception as e: logging.warning(f"Erro ao remover cache de contexto do Gemini: {e}")
+
+class LocalPrefixBackend:
+    """Substituto local: reproduz o prefixo como o primeiro par de turnos do histórico.
+
+    Não depende de recursos da API, então serve para testes/benchmarks com modelos falsos
+    e para modelos sem suporte a system_instruction. `model_factory(model_name)` cria o modelo base.
+    """
+    name = "local"
+
+    def __init__(self, model_factory=None):
+        self._model_factory = model_factory or (lambda model_name: genai.GenerativeModel(model_name=model_name))
+
+    def create(self, model_name: str, prefix: str):
+        return _PrefixedModel(self._model_factory(model_name), prefix)
+
+    def release(self, model):
+        pass
+
+    def expires_at(self, model):
+        return None
+
+class _PrefixedModel:
+    def __init__(self, model, prefix: str):
+        self._model = model
+        self._prefix_turns = [{'role': 'user', 'parts': [prefix]}, {'role': 'model', 'parts': ["Instruções compreendidas."]}]
+
+    def start_chat(self, history=None, **kwargs):
+        return self._model.start_chat(history=self._prefix_turns + list(history or []), **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+class PromptPrefixCache:
+    """Um modelo de interação pronto por (modelo, prefixo estável), reaproveitado entre perguntas.
+
+    O prefixo (personalidade + regras de ferramentas) só é montado/enviado de novo quando
+    seu conteúdo muda ou o backend diz que o modelo expira (TTL do CachedContent); as
+    entradas menos usadas são liberadas além de `max_entries`.
+    """
+
+    def __init__(self, backend=None, max_entries: int = 8):
+        self.backend = backend or SystemInstructionBackend()
+        self.max_entries = max_entries
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "builds": 0, "expired": 0}
+
+    @staticmethod
+    def version(model_name: str, prefix: str) -> str:
+        return hashlib.sha256(f"{model_name}\x00{prefix}".encode('utf-8')).hexdigest()[:16]
+
+    def get_model(self, model_name: str, prefix: str):
+        key = self.version(model_name, prefix)
+        evicted = []
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None and (entry[1] is None or time.monotonic() < entry[1]):
+                self._models.move_to_end(key); self.stats["hits"] += 1
+                return entry[0]
+            if entry is not None: evicted.append(self._models.pop(key)[0]); self.stats["expired"] += 1
+        model = self.backend.create(model_name, prefix)
+        with self._lock:
+            replaced = self._models.pop(key, None)
+            if replaced is not None: evicted.append(replaced[0])
+            self._models[key] = (model, self.backend.expires_at(model)); self.stats["builds"] += 1
+            while len(self._models) > self.max_entries: evicted.append(self._models.popitem(last=False)[1][0])
+        for old_model in evicted: self.backend.release(old_model)
+        return model
+
+    def invalidate(self, model_name: str, prefix: str):
+        """Descarta o modelo deste prefixo (ex.: a API disse que o cache dele não existe mais)."""
+        with self._lock: entry = self._models.pop(self.version(model_name, prefix), None)
+        if entry is not None: self.backend.release(entry[0])
+
+    def clear(self):
+        with self._lock:
+            models = [model for model, _ in self._models.values()]; self._models.clear()
+        for model in models: self.backend.release(model)
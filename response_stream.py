@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import re
+
+# Marcadores de ferramenta que a IA usa como resposta inicial (ver gemini_handler.SEARCH_INSTRUCTIONS).
+TOOL_TAGS = {"[SEARCH]": "[/SEARCH]", "[READ_URL]": "[/READ_URL]"}
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+def clean_response_text(text: str) -> str:
+    """Remove a marcação que o chat da Twitch não renderiza."""
+    return text.replace('*', '').replace('`', '').strip()
+
+def parse_tool_call(text: str):
+    """Retorna (marcador, argumento) se `text` for uma chamada de ferramenta completa, senão None."""
+    text = text.strip()
+    for open_tag, close_tag in TOOL_TAGS.items():
+        if text.startswith(open_tag) and text.endswith(close_tag):
+            return open_tag, text.split(open_tag)[1].split(close_tag)[0].strip()
+    return None
+
+class SentenceStreamer:
+    """Recebe os pedaços do stream da IA e entrega frases completas para `emit`.
+
+    Enquanto o início da resposta ainda pode ser um marcador de ferramenta nada é
+    entregue; se for mesmo uma chamada de ferramenta, nada sai no chat. A primeira frase
+    sai assim que termina (é ela que o espectador espera); as seguintes são juntadas até
+    `min_chunk_chars` para gastar menos mensagens do limite de envio.
+    """
+
+    def __init__(self, emit, min_chunk_chars: int = 120):
+        self.emit = emit
+        self.min_chunk_chars = min_chunk_chars
+        self.text = ""
+        self.emitted = 0
+        self.is_tool_call = None  # None enquanto o início for ambíguo
+        self._buffer = ""
+        self._pending = ""
+
+    def feed(self, chunk: str):
+        self.text += chunk
+        self._buffer += chunk
+        if self.is_tool_call is None:
+            head = self._buffer.lstrip()
+            if any(tag.startswith(head) for tag in TOOL_TAGS): return
+            self.is_tool_call = any(head.startswith(tag) for tag in TOOL_TAGS)
+        if self.is_tool_call: return
+        sentences = _SENTENCE_END.split(self._buffer)
+        self._buffer = sentences.pop()
+        for sentence in sentences:
+            self._pending = f"{self._pending} {sentence}" if self._pending else sentence
+            if not self.emitted or len(self._pending) >= self.min_chunk_chars: self._flush()
+
+    def finish(self):
+        """Entrega o que sobrou, a menos que a resposta tenha sido uma chamada de ferramenta válida."""
+        if parse_tool_call(self.text): return
+        if self.is_tool_call is False:
+            self._pending = f"{self._pending} {self._buffer}" if self._pending else self._buffer
+        else:
+            self._pending = self.text  # início ambíguo ou marcador incompleto: nada foi entregue ainda
+        self._buffer = ""
+        self._flush()
+
+    def _flush(self):
+        text = clean_response_text(self._pending)
+        self._pending = ""
+        if text:
+            self.emit(text); self.emitted += 1
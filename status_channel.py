@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+
+# Canal local (socket Unix) entre o bot e o painel: estado, filas, última depuração e
+# eventos recentes, lidos pelo painel sem passar pelo banco. O banco fica para o histórico.
+STATUS_SOCKET_PATH = os.getenv('BOT_STATUS_SOCKET', os.path.join(tempfile.gettempdir(), 'ai_yuh_status.sock'))  # vazio desativa
+STATUS_EVENTS_MAX = int(os.getenv('BOT_STATUS_EVENTS_MAX', 500))
+
+class StatusBoard:
+    """Estado publicado pelo bot. `set` e `event` custam um lock; as filas são lidas só quando o painel pede.
+
+    `providers` são funções sem argumento (ex.: ask_pool.stats) chamadas a cada snapshot;
+    `commands` são as ações que o painel pode pedir ao bot (ex.: recarregar uma permissão).
+    Os eventos têm `id` sequencial dentro de uma execução (`boot_id`), no mesmo formato
+    das linhas de live_logs, para o painel pedir só os que ainda não viu.
+    """
+
+    def __init__(self, max_events: int = STATUS_EVENTS_MAX):
+        self.boot_id = uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+        self._values = {}
+        self._providers = {}
+        self._commands = {}
+        self._events = deque(maxlen=max_events)
+        self._seq = 0
+
+    def set(self, key: str, value):
+        with self._lock: self._values[key] = value
+
+    def provide(self, name: str, fn):
+        with self._lock: self._providers[name] = fn
+
+    def on_command(self, name: str, fn):
+        with self._lock: self._commands[name] = fn
+
+    def run_command(self, name: str, args: list) -> dict:
+        with self._lock: fn = self._commands.get(name)
+        if fn is None: return {'ok': False, 'erro': f"comando desconhecido: {name}"}
+        try: fn(*args); return {'ok': True}
+        except Exception as e: return {'ok': False, 'erro': str(e)}
+
+    def event(self, log_type: str, message: str):
+        with self._lock:
+            self._seq += 1
+            self._events.append({'id': self._seq, 'log_type': log_type, 'message': message, 'created_at': datetime.now(timezone.utc).isoformat()})
+
+    def events(self, limit: int = 150, after_id: int = None) -> list:
+        """Mesma convenção de database_handler.get_live_logs: sem `after_id`, os `limit` mais novos primeiro; com ele, os seguintes em ordem."""
+        with self._lock: events = list(self._events)
+        if after_id is None: return events[::-1][:limit]
+        return [e for e in events if e['id'] > after_id][:limit]
+
+    def snapshot(self, events_limit: int = 0, after_id: int = None) -> dict:
+        with self._lock: values, providers = dict(self._values), dict(self._providers)
+        queues = {}
+        for name, fn in providers.items():
+            try: queues[name] = fn()
+            except Exception as e: queues[name] = {"erro": str(e)}
+        snapshot = dict(values, boot_id=self.boot_id, time=time.time(), queues=queues)
+        if events_limit: snapshot['events'] = self.events(events_limit, after_id)
+        return snapshot
+
+board = StatusBoard()
+set_value, event, provide, on_command = board.set, board.event, board.provide, board.on_command
+
+class _StatusHandler(socketserver.StreamRequestHandler):
+    """Protocolo de uma linha: o cliente manda um JSON ({"events": n, "after_id": id}) e recebe o snapshot em JSON.
+
+    Com {"command": nome, "args": [...]} o bot executa o comando registrado e responde {"ok": ...}.
+    """
+
+    def handle(self):
+        try: request = json.loads(self.rfile.readline() or b'{}')
+        except ValueError: request = {}
+        if request.get('command'): response = board.run_command(request['command'], list(request.get('args') or []))
+        else: response = board.snapshot(int(request.get('events') or 0), request.get('after_id'))
+        self.wfile.write(json.dumps(response, ensure_ascii=False, default=str).encode('utf-8') + b"\n")
+
+_server = None
+
+def start_status_server(path: str = STATUS_SOCKET_PATH):
+    """Abre o socket numa thread de fundo. Retorna o servidor, ou None se desativado/indisponível."""
+    global _server
+    if not path or not hasattr(socket, 'AF_UNIX'): return None
+    if read_status(path=path) is not None:
+        logging.error(f"Outro processo já publica status em {path}; canal local desativado."); return None
+    try:
+        if os.path.exists(path): os.remove(path)  # sobra de uma execução anterior
+        server = socketserver.ThreadingUnixStreamServer(path, _StatusHandler)
+    except OSError as e:
+        logging.error(f"Não foi possível abrir o canal de status em {path}: {e}"); return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="status-channel", daemon=True).start()
+    _server = server
+    return server
+
+def stop_status_server():
+    global _server
+    if _server is None: return
+    server, _server = _server, None
+    server.shutdown(); server.server_close()
+    try: os.remove(server.server_address)
+    except OSError: pass
+
+def server_running() -> bool:
+    return _server is not None
+
+def _request(payload: dict, path: str, timeout: float):
+    if not path or not hasattr(socket, 'AF_UNIX') or not os.path.exists(path): return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(path)
+            client.sendall(json.dumps(payload).encode('utf-8') + b"\n")
+            chunks = []
+            while True:
+                chunk = client.recv(65536)
+                if not chunk: break
+                chunks.append(chunk)
+        return json.loads(b"".join(chunks))
+    except (OSError, ValueError):
+        return None
+
+def read_status(events: int = 0, after_id: int = None, path: str = STATUS_SOCKET_PATH, timeout: float = 0.5):
+    """Lado do painel: snapshot do bot pelo socket, ou None se o bot não estiver publicando."""
+    return _request({'events': events, 'after_id': after_id}, path, timeout)
+
+def send_command(name: str, *args, path: str = STATUS_SOCKET_PATH, timeout: float = 2.0) -> bool:
+    """Lado do painel: pede ao bot para executar um comando. False se o bot não estiver ouvindo ou o comando falhar."""
+    response = _request({'command': name, 'args': list(args)}, path, timeout)
+    return bool(response and response.get('ok'))
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+# Backends de armazenamento do database_handler. Os dois expõem os mesmos métodos e
+# devolvem linhas como dicts no formato das tabelas do Supabase.
+
+def _utc_iso(value) -> str:
+    """Datas em ISO UTC, para que a comparação de texto no SQLite siga a ordem cronológica."""
+    if isinstance(value, datetime):
+        return (value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)).isoformat()
+    return value
+
+# Tabelas que o painel pagina (list_page) -> coluna do keyset. Nas de `id` os ids crescem com
+# created_at, então a página segue a ordem cronológica; 'users' é paginada pela chave
+# twitch_username (o upsert do Supabase casa por ela e a tabela não tem `id` garantido).
+PAGED_TABLES = {'users': 'twitch_username', 'lorebook': 'id', 'long_term_memory': 'id', 'hierarchical_memory': 'id', 'live_logs': 'id'}
+
+def _check_page_request(table: str, columns: str):
+    """Tabela e colunas entram no SQL como texto; só aceita nomes conhecidos/simples."""
+    if table not in PAGED_TABLES or not all(c.strip().isidentifier() for c in columns.split(',')):
+        raise ValueError(f"Página inválida: {table} ({columns})")
+
+class SupabaseStorage:
+    """Tabelas do projeto Supabase (cada chamada é uma requisição HTTPS)."""
+    name = "supabase"
+    users_page_size = 1000
+
+    def __init__(self, client):
+        self.client = client
+
+    # --- settings ---
+    def get_settings(self) -> dict:
+        return self.client.table('settings').select("*").limit(1).single().execute().data
+
+    def update_settings(self, settings_id, values: dict):
+        self.client.table('settings').update(values).eq('id', settings_id).execute()
+
+    # --- users ---
+    def list_users(self) -> list:
+        """Tabela inteira em páginas por twitch_username: o PostgREST corta cada resposta em max-rows
+        (1000 por padrão), então só uma página vazia garante que não falta ninguém."""
+        users, last = [], None
+        while True:
+            page = self.list_page('users', "twitch_username, permission_level", self.users_page_size, desc=False, after=last)
+            if not page: return users
+            users += page; last = page[-1]['twitch_username']
+
+    def get_user_permission(self, username: str):
+        try: data = self.client.table('users').select("permission_level").eq("twitch_username", username).single().execute().data
+        except Exception: return None  # .single() sem linha levanta erro
+        return data.get('permission_level') if data else None
+
+    def upsert_user(self, username: str, permission: str):
+        self.client.table('users').upsert({'twitch_username': username, 'permission_level': permission}).execute()
+
+    # --- lorebook ---
+    def lorebook_version(self) -> tuple:
+        response = self.client.table('lorebook').select("id", count="exact").order("id", desc=True).limit(1).execute()
+        return (response.data[0]['id'] if response.data else 0, response.count or 0)
+
+    def lorebook_ids(self) -> set:
+        return {item['id'] for item in self.client.table('lorebook').select("id").execute().data}
+
+    def lorebook_entries(self, ids: list) -> dict:
+        return {item['id']: item['entry'] for item in self.client.table('lorebook').select("id, entry").in_('id', ids).execute().data}
+
+    def insert_lorebook(self, entry: str, user: str) -> list:
+        return self.client.table('lorebook').insert({"entry": entry, "created_by": user}).execute().data or []
+
+    def delete_lorebook(self, entry_id: int):
+        self.client.table('lorebook').delete().eq('id', entry_id).execute()
+
+    # --- memórias ---
+    def insert_long_term_memories(self, rows: list):
+        self.client.table('long_term_memory').insert(rows).execute()
+
+    def search_long_term_memory(self, username: str, limit: int) -> list:
+        return self.client.table('long_term_memory').select("summary").eq("username", username).order("created_at", desc=True).limit(limit).execute().data
+
+    def insert_hierarchical_memory(self, level: str, summary: str, metadata: dict = None):
+        self.client.table('hierarchical_memory').insert({"memory_level": level, "summary": summary, "metadata": metadata}).execute()
+
+    def recent_hierarchical_memories(self, limit: int, channel: str = None) -> list:
+        query = self.client.table('hierarchical_memory').select("summary, metadata")
+        if channel: query = query.eq("metadata->>channel", channel)
+        return query.order("created_at", desc=True).limit(limit).execute().data
+
+    def memories_for_consolidation(self, level: str, start_time=None, end_time=None, channel: str = None) -> list:
+        query = self.client.table('hierarchical_memory').select("id, summary, metadata, created_at").eq("memory_level", level).order("created_at", desc=False)
+        if channel: query = query.eq("metadata->>channel", channel)
+        if start_time and end_time: query = query.gte("created_at", start_time.isoformat()).lte("created_at", end_time.isoformat())
+        return query.execute().data
+
+    def delete_hierarchical_memories(self, ids: list):
+        self.client.table('hierarchical_memory').delete().in_('id', ids).execute()
+
+    # --- status e logs ---
+    def set_bot_status(self, status_id: int, value: str):
+        self.client.table('bot_status').update({"status_value": value}).eq('id', status_id).execute()
+
+    def get_bot_status(self, status_id: int):
+        return self.client.table('bot_status').select("status_value").eq("id", status_id).single().execute().data.get('status_value')
+
+    def insert_live_logs(self, rows: list):
+        self.client.table('live_logs').insert(rows).execute()
+
+    def delete_live_logs_before(self, threshold: datetime):
+        self.client.table('live_logs').delete().lt('created_at', threshold.isoformat()).execute()
+
+    # --- páginas para o painel ---
+    def list_page(self, table: str, columns: str, limit: int, desc: bool = True, after=None) -> list:
+        """Página por keyset na chave da tabela (PAGED_TABLES): até `limit` linhas depois de `after` no sentido da ordem."""
+        _check_page_request(table, columns)
+        key = PAGED_TABLES[table]
+        query = self.client.table(table).select(columns).order(key, desc=desc).limit(limit)
+        if after is not None: query = query.lt(key, after) if desc else query.gt(key, after)
+        return query.execute().data
+
+# Valores iniciais da linha de settings de um banco SQLite novo (editáveis pelo painel).
+SQLITE_DEFAULT_SETTINGS = {
+    'personality_prompt': "", 'lorebook_prompt': "Fatos importantes que você sabe:",
+    'interaction_model': "gemini-1.5-flash-latest", 'archivist_model': "gemini-1.5-flash-latest",
+    'temperature': 0.9, 'top_p': 1.0, 'top_k': 1, 'max_output_tokens': 256,
+    'memory_expiration_minutes': 5, 'global_buffer_max_messages': 40, 'global_buffer_max_minutes': 15,
+}
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, twitch_username TEXT NOT NULL UNIQUE, permission_level TEXT NOT NULL DEFAULT 'normal', created_at TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS lorebook (id INTEGER PRIMARY KEY AUTOINCREMENT, entry TEXT NOT NULL, created_by TEXT, created_at TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS long_term_memory (id INTEGER PRIMARY KEY, username TEXT NOT NULL, summary TEXT NOT NULL, created_at TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_long_term_memory_username_created ON long_term_memory (username, created_at);
+CREATE TABLE IF NOT EXISTS hierarchical_memory (id INTEGER PRIMARY KEY, memory_level TEXT NOT NULL, summary TEXT, metadata TEXT, created_at TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_hierarchical_memory_level_created ON hierarchical_memory (memory_level, created_at);
+CREATE INDEX IF NOT EXISTS idx_hierarchical_memory_created ON hierarchical_memory (created_at);
+CREATE TABLE IF NOT EXISTS bot_status (id INTEGER PRIMARY KEY, status_value TEXT);
+CREATE TABLE IF NOT EXISTS live_logs (id INTEGER PRIMARY KEY, log_type TEXT, message TEXT, created_at TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_live_logs_created ON live_logs (created_at);
+"""
+# users.twitch_username já tem índice pela restrição UNIQUE.
+
+class SqliteStorage:
+    """Banco local em um arquivo SQLite (WAL), para instalações de um só nó e testes.
+
+    Uma conexão compartilhada protegida por lock; consultas parametrizadas (o sqlite3
+    reaproveita os statements preparados) e gravações em lote numa única transação.
+    O painel pode abrir o mesmo arquivo em outro processo (WAL permite leitores concorrentes).
+    """
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, cached_statements=256, timeout=10)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SQLITE_SCHEMA)
+            self._conn.execute("INSERT OR IGNORE INTO settings (id, data) VALUES (1, ?)", (json.dumps(SQLITE_DEFAULT_SETTINGS),))
+            self._conn.executemany("INSERT OR IGNORE INTO bot_status (id, status_value) VALUES (?, ?)", [(1, "Offline"), (23, "")])
+
+    def _query(self, sql: str, params=()) -> list:
+        with self._lock: return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def _write(self, sql: str, params=()):
+        with self._lock, self._conn: return self._conn.execute(sql, params)
+
+    def _write_many(self, sql: str, rows: list):
+        with self._lock, self._conn: self._conn.executemany(sql, rows)
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    @staticmethod
+    def _memory_row(row: dict) -> dict:
+        if 'metadata' in row: row['metadata'] = json.loads(row['metadata']) if row['metadata'] else None
+        return row
+
+    # --- settings ---
+    def get_settings(self) -> dict:
+        row = self._query("SELECT id, data FROM settings ORDER BY id LIMIT 1")[0]
+        return dict(json.loads(row['data']), id=row['id'])
+
+    def update_settings(self, settings_id, values: dict):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT data FROM settings WHERE id = ?", (settings_id,)).fetchone()
+            data = dict(json.loads(row['data']) if row else {}, **values)
+            self._conn.execute("INSERT OR REPLACE INTO settings (id, data) VALUES (?, ?)", (settings_id, json.dumps(data)))
+
+    # --- users ---
+    def list_users(self) -> list:
+        return self._query("SELECT * FROM users ORDER BY twitch_username")
+
+    def get_user_permission(self, username: str):
+        rows = self._query("SELECT permission_level FROM users WHERE twitch_username = ?", (username,))
+        return rows[0]['permission_level'] if rows else None
+
+    def upsert_user(self, username: str, permission: str):
+        self._write("INSERT INTO users (twitch_username, permission_level, created_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (twitch_username) DO UPDATE SET permission_level = excluded.permission_level", (username, permission, self._now()))
+
+    # --- lorebook ---
+    def lorebook_version(self) -> tuple:
+        row = self._query("SELECT COALESCE(MAX(id), 0) AS max_id, COUNT(*) AS total FROM lorebook")[0]
+        return (row['max_id'], row['total'])
+
+    def lorebook_ids(self) -> set:
+        return {row['id'] for row in self._query("SELECT id FROM lorebook")}
+
+    def lorebook_entries(self, ids: list) -> dict:
+        entries = {}
+        for start in range(0, len(ids), 500):  # limite de parâmetros por statement
+            chunk = ids[start:start + 500]
+            rows = self._query(f"SELECT id, entry FROM lorebook WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            entries.update({row['id']: row['entry'] for row in rows})
+        return entries
+
+    def insert_lorebook(self, entry: str, user: str) -> list:
+        cursor = self._write("INSERT INTO lorebook (entry, created_by, created_at) VALUES (?, ?, ?)", (entry, user, self._now()))
+        return [{'id': cursor.lastrowid, 'entry': entry, 'created_by': user}]
+
+    def delete_lorebook(self, entry_id: int):
+        self._write("DELETE FROM lorebook WHERE id = ?", (entry_id,))
+
+    # --- memórias ---
+    def insert_long_term_memories(self, rows: list):
+        now = self._now()
+        self._write_many("INSERT INTO long_term_memory (username, summary, created_at) VALUES (?, ?, ?)",
+                         [(row['username'], row['summary'], row.get('created_at') or now) for row in rows])
+
+    def search_long_term_memory(self, username: str, limit: int) -> list:
+        return self._query("SELECT summary FROM long_term_memory WHERE username = ? ORDER BY created_at DESC LIMIT ?", (username, limit))
+
+    def insert_hierarchical_memory(self, level: str, summary: str, metadata: dict = None):
+        self._write("INSERT INTO hierarchical_memory (memory_level, summary, metadata, created_at) VALUES (?, ?, ?, ?)",
+                    (level, summary, json.dumps(metadata) if metadata is not None else None, self._now()))
+
+    def recent_hierarchical_memories(self, limit: int, channel: str = None) -> list:
+        if channel:
+            rows = self._query("SELECT summary, metadata FROM hierarchical_memory WHERE json_extract(metadata, '$.channel') = ? ORDER BY created_at DESC LIMIT ?", (channel, limit))
+        else:
+            rows = self._query("SELECT summary, metadata FROM hierarchical_memory ORDER BY created_at DESC LIMIT ?", (limit,))
+        return [self._memory_row(row) for row in rows]
+
+    def memories_for_consolidation(self, level: str, start_time=None, end_time=None, channel: str = None) -> list:
+        sql, params = "SELECT id, summary, metadata, created_at FROM hierarchical_memory WHERE memory_level = ?", [level]
+        if channel: sql += " AND json_extract(metadata, '$.channel') = ?"; params.append(channel)
+        if start_time and end_time: sql += " AND created_at >= ? AND created_at <= ?"; params += [_utc_iso(start_time), _utc_iso(end_time)]
+        return [self._memory_row(row) for row in self._query(sql + " ORDER BY created_at ASC", params)]
+
+    def delete_hierarchical_memories(self, ids: list):
+        self._write_many("DELETE FROM hierarchical_memory WHERE id = ?", [(i,) for i in ids])
+
+    # --- status e logs ---
+    def set_bot_status(self, status_id: int, value: str):
+        self._write("INSERT INTO bot_status (id, status_value) VALUES (?, ?) ON CONFLICT (id) DO UPDATE SET status_value = excluded.status_value", (status_id, value))
+
+    def get_bot_status(self, status_id: int):
+        rows = self._query("SELECT status_value FROM bot_status WHERE id = ?", (status_id,))
+        return rows[0]['status_value'] if rows else None
+
+    def insert_live_logs(self, rows: list):
+        self._write_many("INSERT INTO live_logs (log_type, message, created_at) VALUES (?, ?, ?)",
+                         [(row['log_type'], row['message'], _utc_iso(row.get('created_at')) or self._now()) for row in rows])
+
+    def delete_live_logs_before(self, threshold: datetime):
+        self._write("DELETE FROM live_logs WHERE created_at < ?", (_utc_iso(threshold),))
+
+    # --- páginas para o painel ---
+    def list_page(self, table: str, columns: str, limit: int, desc: bool = True, after=None) -> list:
+        _check_page_request(table, columns)
+        key, sql, params = PAGED_TABLES[table], f"SELECT {columns} FROM {table}", []
+        if after is not None: sql += f" WHERE {key} {'<' if desc else '>'} ?"; params.append(after)
+        return [self._memory_row(row) for row in self._query(sql + f" ORDER BY {key} {'DESC' if desc else 'ASC'} LIMIT ?", params + [limit])]
+
+def create_storage(backend: str = None):
+    """Escolhe o backend por STORAGE_BACKEND ('supabase', padrão, ou 'sqlite' em STORAGE_SQLITE_PATH)."""
+    backend = (backend or os.getenv("STORAGE_BACKEND", "supabase")).lower()
+    if backend == "sqlite":
+        return SqliteStorage(os.getenv("STORAGE_SQLITE_PATH", "ai_yuh.db"))
+    if backend != "supabase": raise ValueError(f"STORAGE_BACKEND desconhecido: {backend}")
+    from supabase import create_client
+    url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+    if not url or not key: raise ValueError("Credenciais do Supabase não encontradas")
+    return SupabaseStorage(create_client(url, key))
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+# Os módulos do bot ficam na raiz do repositório (sem pacote).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from answer_cache import AnswerCache, normalize_question
+
+@pytest.mark.parametrize("first, second", [
+    ("qual o jogo?", "quando é o jogo?"),
+    ("qual o jogo?", "como está o jogo?"),
+    ("quem ganhou a partida?", "quando ganhou a partida?"),
+    ("o jogo é bom?", "o jogo não é bom?"),
+])
+def test_different_questions_get_different_keys(first, second):
+    assert normalize_question(first) != normalize_question(second)
+
+def test_normalize_folds_accents_case_and_punctuation():
+    assert normalize_question("Qual é o JOGO?!") == normalize_question("qual e o jogo") == "qual e o jogo"
+
+def test_exact_hit_after_normalization():
+    cache = AnswerCache(similarity_threshold=0)
+    cache.put("Qual é o jogo?", 1, "Elden Ring")
+    assert cache.get("qual e o jogo", 1) == "Elden Ring"
+    assert cache.get("qual e o jogo", 2) is None
+
+@pytest.mark.parametrize("cached, asked", [
+    ("qual o jogo?", "quando é o jogo?"),
+    ("o jogo é muito bom mesmo?", "o jogo não é muito bom mesmo?"),
+    ("qual foi o placar do jogo de 2022", "qual foi o placar do jogo de 2018"),
+    ("o que aconteceu em 1998 no brasil", "o que aconteceu em 1994 no brasil"),
+    ("qual o preco do gta 5", "qual o preco do gta 6"),
+    ("voce gosta de mim", "voce gosta de min"),
+])
+def test_near_match_needs_the_same_content_words_and_numbers(cached, asked):
+    cache = AnswerCache(similarity_threshold=0.5)
+    cache.put(cached, 1, "resposta")
+    assert cache.get(asked, 1) is None
+
+def test_near_match_still_hits_small_variations():
+    cache = AnswerCache(similarity_threshold=0.8)
+    cache.put("qual o jogo de hoje?", 1, "Elden Ring")
+    assert cache.get("qual o jogo de hoje ?? ", 1) == "Elden Ring"
+    assert cache.get("qual é o jogo de hoje?", 1) == "Elden Ring"
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""As mesmas operações contra os dois backends: SQLite num arquivo temporário e Supabase
+com o cliente em memória do benchmark (bench.fake_services)."""
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bench.fake_services import FakeSupabaseClient
+from storage import SqliteStorage, SupabaseStorage
+
+@pytest.fixture(params=["sqlite", "supabase"])
+def storage(request, tmp_path):
+    if request.param == "sqlite": return SqliteStorage(str(tmp_path / "ai_yuh.db"))
+    return SupabaseStorage(FakeSupabaseClient({
+        'settings': [{'id': 1, 'lorebook_prompt': "Fatos:"}],
+        'bot_status': [{'id': 1, 'status_value': 'Offline'}, {'id': 23, 'status_value': ''}],
+    }))
+
+def test_settings(storage):
+    settings_id = storage.get_settings()['id']
+    storage.update_settings(settings_id, {'temperature': 0.5})
+    assert storage.get_settings()['temperature'] == 0.5
+
+def test_users(storage):
+    storage.upsert_user("fulano", "master")
+    storage.upsert_user("ciclano", "normal")
+    storage.upsert_user("fulano", "blacklist")
+    assert storage.get_user_permission("fulano") == "blacklist"
+    assert storage.get_user_permission("ninguem") is None
+    assert [row['twitch_username'] for row in storage.list_users()] == ["ciclano", "fulano"]
+
+def test_list_users_reads_past_the_response_cap():
+    storage = SupabaseStorage(FakeSupabaseClient(max_rows=2))
+    storage.users_page_size = 3  # maior que o limite do servidor: a página curta não indica o fim
+    for name in ("eva", "ana", "dani", "bia", "caio"): storage.upsert_user(name, "master" if name == "eva" else "normal")
+    users = storage.list_users()
+    assert [row['twitch_username'] for row in users] == ["ana", "bia", "caio", "dani", "eva"]
+    assert users[-1]['permission_level'] == "master"
+
+def test_lorebook(storage):
+    assert storage.lorebook_version() == (0, 0)
+    ids = [storage.insert_lorebook(f"fato {i}", "fulano")[0]['id'] for i in range(3)]
+    assert storage.lorebook_version() == (ids[-1], 3)
+    storage.delete_lorebook(ids[1])
+    assert storage.lorebook_ids() == {ids[0], ids[2]}
+    assert storage.lorebook_entries([ids[0], ids[2]]) == {ids[0]: "fato 0", ids[2]: "fato 2"}
+
+def test_long_term_memory(storage):
+    for i in range(3):
+        storage.insert_long_term_memories([{"username": "fulano", "summary": f"resumo {i}"}, {"username": "ciclano", "summary": "outro"}])
+        time.sleep(0.002)  # created_at distinto entre os lotes
+    assert [row['summary'] for row in storage.search_long_term_memory("fulano", 2)] == ["resumo 2", "resumo 1"]
+
+def test_hierarchical_memory(storage):
+    storage.insert_hierarchical_memory("transfer", "a", {"channel": "canal_a"})
+    time.sleep(0.002)
+    storage.insert_hierarchical_memory("transfer", "b", {"channel": "canal_b"})
+    time.sleep(0.002)
+    storage.insert_hierarchical_memory("daily", "c", {"channel": "canal_a", "date": "2026-01-01"})
+    assert [row['summary'] for row in storage.recent_hierarchical_memories(5)] == ["c", "b", "a"]
+    recent = storage.recent_hierarchical_memories(5, "canal_a")
+    assert [row['summary'] for row in recent] == ["c", "a"] and recent[0]['metadata']['date'] == "2026-01-01"
+    pending = storage.memories_for_consolidation("transfer")
+    assert [row['summary'] for row in pending] == ["a", "b"] and all(row['created_at'] for row in pending)
+    assert [row['summary'] for row in storage.memories_for_consolidation("transfer", channel="canal_b")] == ["b"]
+    storage.delete_hierarchical_memories([row['id'] for row in pending])
+    assert storage.memories_for_consolidation("transfer") == []
+
+def test_bot_status(storage):
+    storage.set_bot_status(1, "AWAKE")
+    assert storage.get_bot_status(1) == "AWAKE"
+
+def test_live_logs_and_pages(storage):
+    old = (datetime.now(timezone.utc) - timedelta(days=2)).isoformat()
+    storage.insert_live_logs([{"log_type": "STATUS", "message": "antigo", "created_at": old}])
+    storage.insert_live_logs([{"log_type": "CHAT", "message": f"msg {i}"} for i in range(5)])
+    newest = storage.list_page('live_logs', "id, message", 2)
+    assert [row['message'] for row in newest] == ["msg 4", "msg 3"]
+    older = storage.list_page('live_logs', "id, message", 10, after=newest[-1]['id'])
+    assert [row['message'] for row in older] == ["msg 2", "msg 1", "msg 0", "antigo"]
+    newer = storage.list_page('live_logs', "id, message", 10, desc=False, after=older[1]['id'])
+    assert [row['message'] for row in newer] == ["msg 2", "msg 3", "msg 4"]
+    storage.delete_live_logs_before(datetime.now(timezone.utc) - timedelta(days=1))
+    assert [row['message'] for row in storage.list_page('live_logs', "message", 10)][-1] == "msg 0"
+
+def test_users_page_by_username(storage):
+    for name in ("carla", "ana", "bruno", "dani"): storage.upsert_user(name, "normal")
+    first = storage.list_page('users', "twitch_username, permission_level", 2, desc=False)
+    assert [row['twitch_username'] for row in first] == ["ana", "bruno"]
+    rest = storage.list_page('users', "twitch_username", 10, desc=False, after=first[-1]['twitch_username'])
+    assert [row['twitch_username'] for row in rest] == ["carla", "dani"]
+
+def test_list_page_rejects_unknown_tables_and_columns(storage):
+    with pytest.raises(ValueError): storage.list_page('settings', "id", 10)
+    with pytest.raises(ValueError): storage.list_page('users', "id; DROP TABLE users", 10)
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+
+import pytest
+
+from transcript_compaction import compact_transcript, is_emote
+
+@pytest.mark.parametrize("token", ["LUL", "PogChamp", "monkaS", "catJAM", "peepoGGERS", ":)"])
+def test_known_emote_shapes(token):
+    assert is_emote(token)
+
+@pytest.mark.parametrize("token", ["iPhone", "eSports", "McDonalds", "YouTube", "gta"])
+def test_mixed_case_words_are_not_emotes(token):
+    assert not is_emote(token)
+
+def test_mixed_case_words_stay_in_the_transcript():
+    at = datetime(2026, 1, 1, 20, 0)
+    transcript, _ = compact_transcript([
+        {"user": "fulano", "content": "iPhone", "timestamp": at},
+        {"user": "ciclano", "content": "catJAM catJAM catJAM", "timestamp": at},
+        {"user": "beltrano", "content": "vale a pena trocar de iPhone agora?", "timestamp": at},
+    ])
+    assert "Emotes: catJAM ×3\n" in transcript
+    assert "beltrano: vale a pena trocar de iPhone agora?" in transcript
+    assert "Palavras soltas: iphone" in transcript
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import re
+
+from context_budget import estimate_tokens
+from lorebook_index import fold_text
+
+# Emotes comuns da Twitch/BTTV/7TV; além destes, conta como emote o token feito só de
+# símbolos/emoji ou com o formato prefixo minúsculo + sufixo de 2+ maiúsculas (catJAM, peepoGGERS).
+# Maiúscula no meio sozinha não basta: iPhone e eSports são palavras.
+COMMON_EMOTES = {
+    'lul', 'kekw', 'omegalul', 'pog', 'pogu', 'poggers', 'pogchamp', 'kappa', 'keepo', 'sadge', 'ez', 'lulw',
+    'pepega', 'pepelaugh', 'biblethump', 'residentsleeper', 'wutface', 'notlikethis', 'copium', 'hopium',
+    'monkas', 'monkaw', 'feelsbadman', 'feelsgoodman', 'peepohappy', 'peeposad', 'peepoclap', '4head', 'catjam',
+}
+NEAR_DUPLICATE_SIMILARITY = 0.8
+NEAR_DUPLICATE_MIN_WORDS = 4
+SHORT_MESSAGE_MAX_CHARS = 12
+
+_WORD_RE = re.compile(r"\w+")
+_CHAR_RUN_RE = re.compile(r"(\w)\1{3,}")
+_CAMEL_EMOTE_RE = re.compile(r"^[a-z0-9]+[A-Z][A-Z0-9]+$")
+_SYMBOLS_RE = re.compile(r"^[^\w\s]+$")
+_COUNTED_TOKEN_RE = re.compile(r"(\S+)(?: ×(\d+))?")
+
+def is_emote(token: str) -> bool:
+    return token.lower() in COMMON_EMOTES or bool(_CAMEL_EMOTE_RE.match(token) or _SYMBOLS_RE.match(token))
+
+def squash_repeats(text: str) -> str:
+    """'kkkkkkkk' -> 'kkk' e 'LUL LUL LUL LUL' -> 'LUL ×4'."""
+    tokens, squashed = _CHAR_RUN_RE.sub(r"\1\1\1", text).split(), []
+    for token in tokens:
+        if squashed and squashed[-1][0] == token: squashed[-1][1] += 1
+        else: squashed.append([token, 1])
+    return " ".join(token if count < 3 else f"{token} ×{count}" for token, count in squashed)
+
+def _counted(counts: dict) -> str:
+    return ", ".join(token if count == 1 else f"{token} ×{count}" for token, count in sorted(counts.items(), key=lambda item: -item[1]))
+
+def _users(users: list) -> str:
+    unique = list(dict.fromkeys(users))
+    if len(unique) == 1: return unique[0] if len(users) == 1 else f"{unique[0]} (×{len(users)})"
+    names = ", ".join(unique[:3]) + (f" +{len(unique) - 3}" if len(unique) > 3 else "")
+    return f"{len(unique)} usuários ({names})"
+
+def compact_transcript(messages: list) -> tuple[str, dict]:
+    """Transcrito do buffer global para o arquivista, sem o ruído do chat.
+
+    Mensagens iguais ou quase iguais (copypasta) viram uma linha "N usuários (...): texto"
+    no minuto em que apareceram primeiro; repetições de caracteres e de tokens são
+    encurtadas; mensagens só de emotes e de uma palavra só viram, por minuto, uma linha de
+    contagem. Retorna (transcrito, estatísticas com a estimativa de tokens antes e depois).
+    """
+    minutes, clusters, exact = {}, [], {}
+    for msg in messages:
+        minute = msg['timestamp'].strftime('%H:%M')
+        bucket = minutes.setdefault(minute, {'lines': [], 'emotes': {}, 'words': {}})
+        content = squash_repeats(msg['content'].strip())
+        if not content: continue
+        tokens = content.split()
+        if all(is_emote(token) or token.startswith('×') for token in tokens):
+            for token, count in _COUNTED_TOKEN_RE.findall(content):
+                if not token.startswith('×'): bucket['emotes'][token] = bucket['emotes'].get(token, 0) + int(count or 1)
+            continue
+        words = _WORD_RE.findall(fold_text(" ".join(token for token in tokens if not is_emote(token))))
+        if len(tokens) == 1 and len(content) <= SHORT_MESSAGE_MAX_CHARS:
+            word = fold_text(content); bucket['words'][word] = bucket['words'].get(word, 0) + 1
+            continue
+        key = " ".join(words)
+        cluster = exact.get(key)
+        if cluster is None and len(words) >= NEAR_DUPLICATE_MIN_WORDS:
+            word_set = set(words)
+            cluster = next((c for c in clusters if c['words'] and len(word_set & c['words']) / len(word_set | c['words']) >= NEAR_DUPLICATE_SIMILARITY), None)
+        if cluster is None:
+            cluster = {'text': content, 'users': [], 'words': set(words) if len(words) >= NEAR_DUPLICATE_MIN_WORDS else None}
+            clusters.append(cluster); bucket['lines'].append(cluster)
+        exact.setdefault(key, cluster)
+        cluster['users'].append(msg['user'])
+
+    blocks = []
+    for minute, bucket in minutes.items():
+        lines = [f"{_users(c['users'])}: {c['text']}" for c in bucket['lines']]
+        if bucket['emotes']: lines.append(f"Emotes: {_counted(bucket['emotes'])}")
+        if bucket['words']: lines.append(f"Palavras soltas: {_counted(bucket['words'])}")
+        if lines: blocks.append(f"[{minute}]\n" + "\n".join(lines))
+    transcript = "\n".join(blocks)
+    raw = "\n".join(f"[{msg['timestamp'].strftime('%H:%M')}] {msg['user']}: {msg['content']}" for msg in messages)
+    return transcript, {'messages': len(messages), 'lines': sum(len(block.splitlines()) - 1 for block in blocks),
+                        'tokens_before': estimate_tokens(raw), 'tokens_after': estimate_tokens(transcript)}
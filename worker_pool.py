@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import logging
+import queue
+import threading
+import time
+import zlib
+
+_STOP = object()
+
+class KeyedWorkerPool:
+    """Pool de threads com uma fila limitada por worker.
+
+    Tarefas com a mesma chave (ex.: o nome do usuário) vão sempre para o mesmo worker,
+    então são executadas na ordem em que chegaram, uma de cada vez.
+    """
+
+    def __init__(self, name: str, num_workers: int = 4, max_queue_per_worker: int = 20):
+        self.name = name
+        self._queues = [queue.Queue(maxsize=max_queue_per_worker) for _ in range(max(1, num_workers))]
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "dropped": 0, "active": 0}
+        self._closed = False
+        self._threads = []
+        for i, task_queue in enumerate(self._queues):
+            thread = threading.Thread(target=self._run, args=(task_queue,), name=f"{name}-{i}", daemon=True)
+            thread.start(); self._threads.append(thread)
+
+    def _queue_for(self, key: str) -> queue.Queue:
+        return self._queues[zlib.crc32(key.lower().encode('utf-8')) % len(self._queues)]
+
+    def submit(self, key: str, fn, *args, **kwargs) -> bool:
+        """Enfileira `fn(*args, **kwargs)`. Retorna False se a fila do worker estiver cheia ou o pool fechado."""
+        if self._closed:
+            with self._lock: self._stats["rejected"] += 1
+            return False
+        try:
+            self._queue_for(key).put_nowait((fn, args, kwargs))
+        except queue.Full:
+            with self._lock: self._stats["rejected"] += 1
+            return False
+        with self._lock: self._stats["submitted"] += 1
+        return True
+
+    def _run(self, task_queue: queue.Queue):
+        while True:
+            task = task_queue.get()
+            if task is _STOP: return
+            fn, args, kwargs = task
+            with self._lock: self._stats["active"] += 1
+            try:
+                fn(*args, **kwargs)
+                outcome = "completed"
+            except Exception as e:
+                logging.error(f"Erro em tarefa do pool '{self.name}': {e}", exc_info=True)
+                outcome = "failed"
+            with self._lock:
+                self._stats["active"] -= 1; self._stats[outcome] += 1
+
+    def stats(self) -> dict:
+        """Contadores do pool e profundidade atual das filas (total e da fila mais cheia)."""
+        depths = [q.qsize() for q in self._queues]
+        with self._lock:
+            return dict(self._stats, queued=sum(depths), max_queue_depth=max(depths), workers=len(self._queues))
+
+    def shutdown(self, timeout: float = 10.0):
+        """Para de aceitar tarefas, deixa as filas esvaziarem e aguarda os workers até `timeout` segundos.
+
+        Uma fila que continua cheia até o prazo tem as tarefas pendentes descartadas
+        (contadas em "dropped") para o sinal de parada entrar.
+        """
+        self._closed = True
+        deadline = time.monotonic() + timeout
+        for task_queue in self._queues:
+            try: task_queue.put(_STOP, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                dropped = 0
+                while True:
+                    try: task_queue.get_nowait(); dropped += 1
+                    except queue.Empty: break
+                with self._lock: self._stats["dropped"] += dropped
+                task_queue.put_nowait(_STOP)
+        for thread in self._threads: thread.join(max(0.0, deadline - time.monotonic()))